@@ -0,0 +1,264 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from pydantic import BaseModel
+
+TOPIC_CACHE_DIR = os.getenv("TOPIC_CACHE_DIR", "media/topic_cache")
+TOPIC_CACHE_TTL_SECONDS = int(os.getenv("TOPIC_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+TOPIC_CACHE_MAX_ENTRIES = int(os.getenv("TOPIC_CACHE_MAX_ENTRIES", "2000"))
+TOPIC_CACHE_MEMORY_ENTRIES = int(os.getenv("TOPIC_CACHE_MEMORY_ENTRIES", "256"))
+TOPIC_SIMILARITY_THRESHOLD = float(os.getenv("TOPIC_SIMILARITY_THRESHOLD", "0.8"))
+
+TIERS = ("plan", "code", "video")
+
+# Filler words that don't change what video gets generated
+_STOPWORDS = {
+    "a", "an", "the", "of", "to", "in", "on", "for", "about", "and", "with",
+    "what", "is", "are", "how", "does", "do", "why", "explain", "explanation",
+    "show", "me", "please", "video", "animation", "visualize", "visualise",
+    "teach", "introduction", "intro", "work", "works", "working",
+}
+
+
+def normalize_topic(topic: str) -> List[str]:
+    """Lowercase, drop punctuation and filler words, crude plural stemming; returns sorted tokens"""
+    words = re.findall(r"[a-z0-9]+", topic.lower())
+    tokens = set()
+    for word in words:
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.add(word)
+    return sorted(tokens)
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class TopicCacheEntry(BaseModel):
+    key: str
+    topic: str
+    tokens: List[str]
+    scene_class_name: Optional[str] = None
+    plan: Optional[str] = None
+    code: Optional[str] = None  # Only code that rendered successfully
+    videos: Dict[str, str] = {}  # Render profile name -> uploaded video in Supabase Storage
+    artifacts: Dict[str, Dict[str, str]] = {}  # Render profile name -> poster/sprite/HLS storage keys
+    created_at: float
+    accessed_at: float
+
+
+class TopicCache:
+    """
+    Two-tier (memory LRU + JSON files on disk) cache of plan, code and uploaded video per topic.
+
+    Keys are a hash of the normalized topic plus model name and prompt version, so changing
+    either one naturally invalidates old entries. Lookups that miss the exact key fall back
+    to the most similar cached topic (token Jaccard) above TOPIC_SIMILARITY_THRESHOLD.
+    """
+
+    def __init__(self, model: str, prompt_version: str, directory: str = TOPIC_CACHE_DIR,
+                 ttl_seconds: int = TOPIC_CACHE_TTL_SECONDS, max_entries: int = TOPIC_CACHE_MAX_ENTRIES,
+                 memory_entries: int = TOPIC_CACHE_MEMORY_ENTRIES,
+                 similarity_threshold: float = TOPIC_SIMILARITY_THRESHOLD):
+        self.model = model
+        self.prompt_version = prompt_version
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.similarity_threshold = similarity_threshold
+        self._memory: "OrderedDict[str, TopicCacheEntry]" = OrderedDict()
+        # key -> (token set, last access) for every entry on disk; used for similarity and LRU
+        self._index: Dict[str, Tuple[set, float]] = {}
+        self._lock = threading.Lock()
+        self._stats = {tier: {"hits": 0, "similar_hits": 0, "misses": 0} for tier in TIERS}
+        self._loaded = False
+
+    def make_key(self, tokens: List[str]) -> str:
+        raw = f"{self.model}|{self.prompt_version}|{' '.join(tokens)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # --- Reads ---
+
+    def get_plan(self, topic: str) -> Optional[TopicCacheEntry]:
+        return self._get("plan", topic, lambda entry: entry.plan is not None)
+
+    def get_code(self, topic: str) -> Optional[TopicCacheEntry]:
+        return self._get("code", topic, lambda entry: entry.code is not None)
+
+    def get_video(self, topic: str, profile: str) -> Optional[TopicCacheEntry]:
+        return self._get("video", topic, lambda entry: profile in entry.videos)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "memory_entries": len(self._memory),
+                "tiers": {tier: dict(counts) for tier, counts in self._stats.items()},
+            }
+
+    # --- Writes ---
+
+    def put_plan(self, topic: str, plan: str, scene_class_name: str):
+        # A new plan invalidates code and video generated from the old one
+        self._update(topic, plan=plan, scene_class_name=scene_class_name, code=None, videos={})
+
+    def put_code(self, topic: str, code: str):
+        self._update(topic, code=code)
+
+    def put_video(self, topic: str, storage_key: str, plan: str, code: str, scene_class_name: str, profile: str,
+                  artifacts: Optional[Dict[str, str]] = None):
+        # Stored together so a video hit always comes with the plan and code that made it;
+        # videos of other profiles are only kept if they came from the same code
+        tokens = normalize_topic(topic)
+        key = self.make_key(tokens)
+        now = time.time()
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._load(key)
+            if entry is None or entry.plan != plan or entry.code != code:
+                entry = TopicCacheEntry(key=key, topic=topic, tokens=tokens, scene_class_name=scene_class_name,
+                                        plan=plan, code=code, created_at=now, accessed_at=now)
+            entry.videos = {**entry.videos, profile: storage_key}
+            entry.artifacts = {**entry.artifacts, profile: artifacts or {}}
+            entry.accessed_at = now
+            self._store(entry)
+            self._evict()
+
+    # --- Internals ---
+
+    def _get(self, tier: str, topic: str, has_tier) -> Optional[TopicCacheEntry]:
+        tokens = normalize_topic(topic)
+        key = self.make_key(tokens)
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._load(key)
+            similar = False
+            if entry is None or not has_tier(entry):
+                entry = self._most_similar(set(tokens), has_tier)
+                similar = entry is not None
+
+            if entry is None:
+                self._stats[tier]["misses"] += 1
+                return None
+
+            self._stats[tier]["similar_hits" if similar else "hits"] += 1
+            self._touch(entry)
+            return entry.copy()
+
+    def _update(self, topic: str, **fields):
+        tokens = normalize_topic(topic)
+        key = self.make_key(tokens)
+        now = time.time()
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._load(key)
+            if entry is None:
+                entry = TopicCacheEntry(key=key, topic=topic, tokens=tokens, created_at=now, accessed_at=now)
+            for name, value in fields.items():
+                setattr(entry, name, value)
+            entry.accessed_at = now
+            self._store(entry)
+            self._evict()
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            entry = self._read_file(path)
+            # Entries of other models / prompt versions share the directory; their keys don't match
+            # ours, and they must not come back as similar topics either
+            if entry is not None and entry.key == self.make_key(entry.tokens):
+                # Reads only bump the file mtime, so that is the real last access
+                self._index[entry.key] = (set(entry.tokens), os.path.getmtime(path))
+        self._loaded = True
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_file(self, path: str) -> Optional[TopicCacheEntry]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return TopicCacheEntry(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _expired(self, entry: TopicCacheEntry) -> bool:
+        return time.time() - entry.created_at > self.ttl_seconds
+
+    def _load(self, key: str) -> Optional[TopicCacheEntry]:
+        entry = self._memory.get(key)
+        if entry is None and key in self._index:
+            entry = self._read_file(self._path(key))
+        if entry is None:
+            return None
+        if self._expired(entry):
+            self._remove(key)
+            return None
+        self._remember(entry)
+        return entry
+
+    def _most_similar(self, tokens: set, has_tier) -> Optional[TopicCacheEntry]:
+        candidates = sorted(
+            ((_jaccard(tokens, other), key) for key, (other, _) in self._index.items()),
+            reverse=True
+        )
+        for score, key in candidates:
+            if score < self.similarity_threshold:
+                break
+            entry = self._load(key)
+            if entry is not None and has_tier(entry):
+                return entry
+        return None
+
+    def _remember(self, entry: TopicCacheEntry):
+        self._memory[entry.key] = entry
+        self._memory.move_to_end(entry.key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _touch(self, entry: TopicCacheEntry):
+        entry.accessed_at = time.time()
+        tokens, _ = self._index[entry.key]
+        self._index[entry.key] = (tokens, entry.accessed_at)
+        try:
+            os.utime(self._path(entry.key), None)
+        except OSError:
+            pass
+
+    def _store(self, entry: TopicCacheEntry):
+        tmp_path = self._path(entry.key) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry.dict(), f)
+        os.replace(tmp_path, self._path(entry.key))
+        self._index[entry.key] = (set(entry.tokens), entry.accessed_at)
+        self._remember(entry)
+
+    def _remove(self, key: str):
+        self._memory.pop(key, None)
+        self._index.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        if len(self._index) <= self.max_entries:
+            return
+        by_access = sorted(self._index.items(), key=lambda item: item[1][1])
+        for key, _ in by_access[:len(self._index) - self.max_entries]:
+            self._remove(key)
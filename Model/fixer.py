@@ -0,0 +1,427 @@
+import ast
+import difflib
+import io
+import json
+import os
+import re
+import threading
+import tokenize
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from pydantic import BaseModel
+from Model.validator import get_manim_api_index
+
+# Learned fixes longer than this are too specific to the code they came from to replay
+MAX_LEARNED_FIX_LINES = int(os.getenv("MAX_LEARNED_FIX_LINES", "6"))
+# Lines of code around each traceback frame sent to the LLM
+ERROR_CONTEXT_LINES = 2
+MAX_ERROR_CHARS = 4000
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+EXCEPTION_LINE = re.compile(r"^[\s│|]*((?:[\w]+\.)*\w*(?:Error|Exception)): (.*?)[\s│|]*$")
+DIAGNOSTIC_LINE = re.compile(r"^- (?:line (\d+): )?(.*) \[(\w+)\]$")
+FRAME_PATTERNS = (
+    re.compile(r'File "([^"]+)", line (\d+), in (\S+)'),  # plain tracebacks
+    re.compile(r"([^\s│|]+\.py):(\d+) in (\w+)"),  # rich tracebacks (Manim's default)
+)
+
+# Names from older Manim / ManimGL that models keep producing
+RENAMED_NAMES = {
+    "ShowCreation": "Create",
+    "TextMobject": "Text",
+    "TexMobject": "MathTex",
+    "TexText": "Tex",
+    "FadeInFromDown": "FadeIn",
+    "FadeInFrom": "FadeIn",
+    "FadeOutAndShift": "FadeOut",
+    "CircleIndicate": "Circumscribe",
+    "ShowCreationThenFadeOut": "ShowPassingFlash",
+}
+COLOR_ALIASES = {
+    "LIGHT_BLUE": "BLUE_B", "LIGHT_GREEN": "GREEN_B", "LIGHT_RED": "RED_B", "LIGHT_YELLOW": "YELLOW_B",
+    "LIGHT_PURPLE": "PURPLE_B", "DARK_GREEN": "GREEN_E", "DARK_RED": "RED_E", "DARK_PURPLE": "PURPLE_E",
+    "LIGHT_GREY": "LIGHT_GRAY", "DARK_GREY": "DARK_GRAY", "CYAN": "TEAL", "MAGENTA": "PINK",
+    "VIOLET": "PURPLE", "INDIGO": "PURPLE_E", "NAVY": "DARK_BLUE", "LIME": "GREEN_A", "CRIMSON": "RED_E",
+}
+RENAMED_METHODS = {
+    "get_graph": "plot",
+    "get_parametric_curve": "plot_parametric_curve",
+    "scale_in_place": "scale",
+    "rotate_in_place": "rotate",
+}
+TEXT_CLASSES = ("Text", "MarkupText", "Tex", "MathTex", "Paragraph")
+# (callable, keyword) -> new keyword; None as callable matches any call. Checked against each call
+# that passes the keyword; calls without an entry drop it
+RENAMED_KWARGS = {
+    **{(name, keyword): "font_size" for name in TEXT_CLASSES for keyword in ("size", "text_size")},
+    (None, "fill_color_opacity"): "fill_opacity",
+}
+
+
+class FixResult(BaseModel):
+    code: str
+    signatures: List[str]
+    sources: List[str]  # rule:<name> / learned
+
+
+def _clean(text: str) -> str:
+    return ANSI_ESCAPE.sub("", text)
+
+
+def normalize_error(message: str) -> str:
+    """Error text without the parts that vary between otherwise identical failures"""
+    message = _clean(message).strip()
+    message = re.sub(r"0x[0-9a-fA-F]+", "<addr>", message)
+    message = re.sub(r"(?<![\w'])-?\d+(?:\.\d+)?(?![\w'])", "<n>", message)
+    message = re.sub(r"(/[^\s'\"]+)+\.py", "<file>", message)
+    return re.sub(r"\s+", " ", message)
+
+
+def _is_diagnostics(error: str) -> bool:
+    return error.startswith("Static validation failed")
+
+
+def error_signatures(error: str) -> List[str]:
+    """Normalized signatures of the errors in a Manim stderr or a validator report"""
+    if not error:
+        return []
+    if _is_diagnostics(error):
+        return [normalize_error(m.group(2)) for m in map(DIAGNOSTIC_LINE.match, error.splitlines()[1:]) if m]
+    exception = None
+    for line in _clean(error).splitlines():
+        match = EXCEPTION_LINE.match(line)
+        if match:
+            exception = f"{match.group(1).split('.')[-1]}: {match.group(2)}"
+    return [normalize_error(exception)] if exception else []
+
+
+def code_frames(error: str, scene_class_name: str) -> List[Tuple[int, str]]:
+    """(line, function) of the traceback frames inside the generated scene file, outermost first"""
+    frames = []
+    for line in _clean(error).splitlines():
+        for pattern in FRAME_PATTERNS:
+            match = pattern.search(line)
+            if match and os.path.basename(match.group(1)).startswith(scene_class_name):
+                frames.append((int(match.group(2)), match.group(3)))
+    return frames
+
+
+def _code_excerpt(code: str, line_numbers: List[int]) -> str:
+    lines = code.splitlines()
+    wanted = sorted({
+        n for line in line_numbers
+        for n in range(line - ERROR_CONTEXT_LINES, line + ERROR_CONTEXT_LINES + 1)
+        if 1 <= n <= len(lines)
+    })
+    excerpt, previous = [], None
+    for n in wanted:
+        if previous is not None and n != previous + 1:
+            excerpt.append("    ...")
+        marker = ">>" if n in line_numbers else "  "
+        excerpt.append(f"{marker} {n:4d} | {lines[n - 1]}")
+        previous = n
+    return "\n".join(excerpt)
+
+
+def trim_error_message(error: str, code: str, scene_class_name: str) -> str:
+    """
+    The part of a failed render's stderr the LLM needs: the exception, the frames in
+    the generated code and those code lines, instead of the whole log with progress bars.
+    """
+    if _is_diagnostics(error):
+        lines = [int(m.group(1)) for m in map(DIAGNOSTIC_LINE.match, error.splitlines()) if m and m.group(1)]
+        return error if not lines else f"{error}\n\nRelevant code:\n{_code_excerpt(code, lines)}"
+
+    exceptions = [line.strip(" │|") for line in _clean(error).splitlines() if EXCEPTION_LINE.match(line)]
+    frames = code_frames(error, scene_class_name)
+    if not exceptions:
+        # Not a Python traceback (e.g. LaTeX or ffmpeg failure): keep the tail without progress bars
+        tail = [line for line in _clean(error).splitlines() if line.strip() and "%|" not in line]
+        return "\n".join(tail[-30:])[-MAX_ERROR_CHARS:]
+
+    parts = [exceptions[-1]]
+    if frames:
+        parts.append("Traceback frames in the scene code:")
+        parts.extend(f"  line {line}, in {function}" for line, function in frames)
+        parts.append("Relevant code:")
+        parts.append(_code_excerpt(code, [line for line, _ in frames]))
+    return "\n".join(parts)[-MAX_ERROR_CHARS:]
+
+
+def _replace_tokens(code: str, old: str, new: str, attribute: bool) -> str:
+    """Rename NAME tokens (attribute=True: only after a '.'), leaving strings and comments alone"""
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(code).readline))
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        return code
+    lines = code.splitlines(keepends=True)
+    edits = []
+    for i, token in enumerate(tokens):
+        if token.type != tokenize.NAME or token.string != old:
+            continue
+        after_dot = i > 0 and tokens[i - 1].type == tokenize.OP and tokens[i - 1].string == "."
+        if after_dot == attribute:
+            edits.append(token.start)
+    for row, col in reversed(edits):
+        line = lines[row - 1]
+        lines[row - 1] = line[:col] + new + line[col + len(old):]
+    return "".join(lines)
+
+
+def _call_name(node: ast.Call) -> Optional[str]:
+    func = node.func
+    return func.id if isinstance(func, ast.Name) else func.attr if isinstance(func, ast.Attribute) else None
+
+
+def _edit_keywords(code: str, keyword: str, new_keyword: Callable[[Optional[str]], Optional[str]],
+                   func: Optional[str] = None, lines: Optional[Set[int]] = None) -> str:
+    """
+    Rename a keyword argument in matching calls to new_keyword(callee name), or drop it
+    where that returns None
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code
+    lines_text = code.splitlines(keepends=True)
+    offsets = [0]
+    for line in lines_text:
+        offsets.append(offsets[-1] + len(line))
+
+    def offset(lineno, col):
+        # ast columns are UTF-8 byte offsets
+        return offsets[lineno - 1] + len(lines_text[lineno - 1].encode()[:col].decode(errors="ignore"))
+
+    edits = []  # (start, end, replacement) in character offsets
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or (func is not None and _call_name(node) != func):
+            continue
+        if lines is not None and not set(range(node.lineno, node.end_lineno + 1)) & lines:
+            continue
+        arguments = sorted(list(node.args) + list(node.keywords), key=lambda n: (n.lineno, n.col_offset))
+        for index, kw in enumerate(arguments):
+            if not isinstance(kw, ast.keyword) or kw.arg != keyword:
+                continue
+            start, end = offset(kw.lineno, kw.col_offset), offset(kw.end_lineno, kw.end_col_offset)
+            renamed = new_keyword(_call_name(node))
+            if renamed is not None:
+                edits.append((start, start + len(keyword), renamed))
+            elif index > 0:
+                previous = arguments[index - 1]
+                edits.append((offset(previous.end_lineno, previous.end_col_offset), end, ""))
+            elif index + 1 < len(arguments):
+                following = arguments[index + 1]
+                edits.append((start, offset(following.lineno, following.col_offset), ""))
+            else:
+                edits.append((start, end, ""))
+    for start, end, replacement in sorted(edits, reverse=True):
+        code = code[:start] + replacement + code[end:]
+    return code
+
+
+def _fix_name_error(code: str, match: re.Match, scene_class_name: str, frame_lines: Set[int]) -> Optional[str]:
+    name = match.group(1)
+    replacement = RENAMED_NAMES.get(name) or COLOR_ALIASES.get(name)
+    if replacement is None:
+        index = get_manim_api_index()
+        candidates = (index.colors if name.isupper() else index.exports) if index is not None else []
+        close = difflib.get_close_matches(name, candidates, n=1, cutoff=0.8)
+        replacement = close[0] if close else None
+    return _replace_tokens(code, name, replacement, attribute=False) if replacement else None
+
+
+def _fix_unexpected_kwarg(code: str, match: re.Match, scene_class_name: str, frame_lines: Set[int]) -> Optional[str]:
+    func, keyword = match.group(1).split(".")[0], match.group(2)
+
+    def renamed(callee: Optional[str]) -> Optional[str]:
+        # Per call, so Text(size=...) is renamed while Circle(size=...) in the same code loses it
+        return RENAMED_KWARGS.get((callee, keyword)) or RENAMED_KWARGS.get((None, keyword))
+
+    # Base-class errors (e.g. Mobject.__init__) name the class that rejected it, not the one called
+    fixed = _edit_keywords(code, keyword, renamed, func=func)
+    if fixed == code and frame_lines:
+        fixed = _edit_keywords(code, keyword, renamed, lines=frame_lines)
+    return fixed
+
+
+def _fix_missing_attribute(code: str, match: re.Match, scene_class_name: str, frame_lines: Set[int]) -> Optional[str]:
+    replacement = RENAMED_METHODS.get(match.group(1))
+    return _replace_tokens(code, match.group(1), replacement, attribute=True) if replacement else None
+
+
+def _fix_class_name(code: str, match: re.Match, scene_class_name: str, frame_lines: Set[int]) -> Optional[str]:
+    found = [name.strip() for name in match.group(1).split(",")]
+    if len(found) != 1 or found[0] == "none":
+        return None
+    return _replace_tokens(code, found[0], scene_class_name, attribute=False)
+
+
+def _fix_camera_scene(code: str, match: re.Match, scene_class_name: str, frame_lines: Set[int]) -> Optional[str]:
+    fixed = re.sub(rf"^(\s*class\s+{re.escape(scene_class_name)}\s*\(\s*)Scene(\s*\))", rf"\g<1>{match.group(1)}\g<2>",
+                   code, count=1, flags=re.MULTILINE)
+    return fixed if fixed != code else None
+
+
+# (name, pattern on the signature, fix)
+FIX_RULES = [
+    ("renamed_name", re.compile(r"NameError: name '(\w+)' is not defined"), _fix_name_error),
+    ("unexpected_kwarg", re.compile(r"TypeError: ([\w.]+)\(\) got an unexpected keyword argument '(\w+)'"),
+     _fix_unexpected_kwarg),
+    ("renamed_method", re.compile(r"AttributeError: '\w+' object has no attribute '(\w+)'"), _fix_missing_attribute),
+    ("class_name", re.compile(r"The scene class must be named '\w+'; classes found: (.+)"), _fix_class_name),
+    ("camera_scene", re.compile(r"needs the class to inherit from (\w+)"), _fix_camera_scene),
+]
+
+
+def _diff_replacements(before: str, after: str) -> Optional[List[List[str]]]:
+    """Line substitutions turning before into after, if the change is small enough to replay"""
+    old_lines, new_lines = before.splitlines(), after.splitlines()
+    stripped_old = [line.strip() for line in old_lines]
+    replacements = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if op == "equal":
+            continue
+        # Inserted lines have nothing to anchor on in other code
+        if op == "insert" or (op == "replace" and i2 - i1 != j2 - j1):
+            return None
+        for k in range(i1, i2):
+            old = stripped_old[k]
+            if not old or stripped_old.count(old) > 1:
+                return None
+            replacements.append([old, new_lines[j1 + k - i1].strip() if op == "replace" else ""])
+    if not replacements or len(replacements) > MAX_LEARNED_FIX_LINES:
+        return None
+    return replacements
+
+
+def apply_replacements(code: str, replacements: List[List[str]]) -> Optional[str]:
+    lines = code.splitlines(keepends=True)
+    stripped = [line.strip() for line in lines]
+    for old, new in replacements:
+        if stripped.count(old) != 1:
+            return None
+        index = stripped.index(old)
+        line = lines[index]
+        indent = line[:len(line) - len(line.lstrip())]
+        ending = "\n" if line.endswith("\n") else ""
+        lines[index] = f"{indent}{new}{ending}" if new else ""
+        stripped[index] = None
+    return "".join(lines)
+
+
+class FixLibrary:
+    """
+    Rule-based fixes plus LLM fixes learned per error signature (persisted in error_fixes).
+
+    Learned fixes are stored as line substitutions and only replayed when every line
+    they replace exists verbatim (ignoring indentation) in the new code.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._learned: Optional[Dict[str, List[List[str]]]] = None
+        self.counts = {"rule": 0, "learned": 0, "llm": 0, "learned_saved": 0}
+
+    def _session(self):
+        from database import SessionLocal
+        return SessionLocal()
+
+    def _load(self) -> Dict[str, List[List[str]]]:
+        with self._lock:
+            if self._learned is None:
+                self._learned = {}
+                try:
+                    from auth.dbmodel import ErrorFix
+                    db = self._session()
+                    try:
+                        for fix in db.query(ErrorFix).filter(ErrorFix.failures <= ErrorFix.hits + 1):
+                            self._learned[fix.signature] = json.loads(fix.replacements)
+                    finally:
+                        db.close()
+                except Exception as e:
+                    print(f" Could not load learned error fixes: {e}")
+            return self._learned
+
+    def apply(self, code: str, error: str, scene_class_name: str, skip: Set[str] = frozenset()) -> Optional[FixResult]:
+        """Fix every recognised error signature locally; None when nothing applied"""
+        learned = self._load()
+        frame_lines = {line for line, _ in code_frames(error, scene_class_name)}
+        fixed, signatures, sources = code, [], []
+        for signature in error_signatures(error):
+            if signature in skip:
+                continue
+            attempt, source = None, None
+            if signature in learned:
+                attempt, source = apply_replacements(fixed, learned[signature]), "learned"
+            if attempt is None or attempt == fixed:
+                for name, pattern, rule in FIX_RULES:
+                    match = pattern.search(signature)
+                    if match:
+                        attempt, source = rule(fixed, match, scene_class_name, frame_lines), f"rule:{name}"
+                        break
+            if attempt is not None and attempt != fixed:
+                fixed = attempt
+                signatures.append(signature)
+                sources.append(source)
+                self.counts["learned" if source == "learned" else "rule"] += 1
+        if not signatures:
+            return None
+        return FixResult(code=fixed, signatures=signatures, sources=sources)
+
+    def record_llm_fix(self, error: str, before: str, after: str, new_error: Optional[str]):
+        """Remember an LLM fix once the next attempt shows it resolved its error"""
+        self.counts["llm"] += 1
+        remaining = set(error_signatures(new_error or ""))
+        signatures = [s for s in error_signatures(error) if s not in remaining]
+        # Only single-error fixes are attributable to their signature
+        if len(signatures) != 1 or len(error_signatures(error)) != 1:
+            return
+        replacements = _diff_replacements(before, after)
+        if replacements is None:
+            return
+        signature = signatures[0]
+        self._load()[signature] = replacements
+        self.counts["learned_saved"] += 1
+        self._persist(signature, replacements=replacements)
+
+    def record_outcome(self, fix: FixResult, new_error: Optional[str]):
+        """Count hits/failures of the learned fixes used in fix"""
+        remaining = set(error_signatures(new_error or ""))
+        for signature, source in zip(fix.signatures, fix.sources):
+            if source == "learned":
+                self._persist(signature, resolved=signature not in remaining)
+
+    def _persist(self, signature: str, replacements: Optional[List[List[str]]] = None,
+                 resolved: Optional[bool] = None):
+        try:
+            from auth.dbmodel import ErrorFix
+            db = self._session()
+            try:
+                fix = db.query(ErrorFix).filter(ErrorFix.signature == signature).first()
+                if fix is None:
+                    if replacements is None:
+                        return
+                    fix = ErrorFix(signature=signature, replacements=json.dumps(replacements), hits=0, failures=0)
+                    db.add(fix)
+                elif replacements is not None:
+                    fix.replacements = json.dumps(replacements)
+                    fix.failures = 0
+                if resolved is not None:
+                    if resolved:
+                        fix.hits += 1
+                    else:
+                        fix.failures += 1
+                        if fix.failures > fix.hits + 1:
+                            self._load().pop(signature, None)
+                    fix.last_used_at = datetime.utcnow()
+                db.commit()
+            finally:
+                db.close()
+        except Exception as e:
+            print(f" Could not save error fix: {e}")
+
+    def stats(self) -> dict:
+        return {**self.counts, "learned_signatures": len(self._learned or {})}
+
+
+fix_library = FixLibrary()
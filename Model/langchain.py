@@ -1,24 +1,48 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
 from pydantic import Field , BaseModel
-from typing import  TypedDict, Optional, Dict, List, Any
+from typing import  TypedDict, Optional, Dict, List, Any, Callable
 import subprocess
 import textwrap 
-from langchain_core.prompts import PromptTemplate
-from langchain.schema.messages import SystemMessage, HumanMessage
-from langchain.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from dotenv import load_dotenv
 import os
 
-geminikey = os.getenv("GOOGLE_GEMINI_KEY")
+from Model.cache import TopicCache
+from Model.llm import GEMINI_MODEL, LLM_BACKEND, get_structured_model
 
 load_dotenv()
 
+# Bump whenever one of the prompts below changes so cached plans/code are not reused
+PROMPT_VERSION = "1"
+
+# Responses from the offline fake backend must never be served as real cache hits
+topic_cache = TopicCache(model=GEMINI_MODEL if LLM_BACKEND == "gemini" else LLM_BACKEND,
+                         prompt_version=PROMPT_VERSION)
+
+class LazyChatPrompt:
+    """
+    ChatPromptTemplate built on first use: LangChain is only imported when the first
+    prompt is formatted, not when the app (or a worker process) starts.
+    """
+
+    def __init__(self, messages: list):
+        self.messages = messages
+        self._template = None
+
+    @property
+    def template(self):
+        if self._template is None:
+            from langchain.prompts import ChatPromptTemplate
+            self._template = ChatPromptTemplate.from_messages(self.messages)
+        return self._template
+
+    def format_messages(self, **kwargs):
+        return self.template.format_messages(**kwargs)
+
+
 class ScenePlan(BaseModel):
     scene : str = Field(description="Detailed plan for the animation")
     scene_class_name : str = Field(description="Name of the scene class")
 
-def plan_scene(prompt:str):
-    system_prompt = """
+PLAN_SYSTEM_PROMPT = """
         You are a manim expert and an excellent teacher who can explain complex
         concepts in a clear and engaging way.
         You'll be working with a manim developer who will write a manim script
@@ -61,32 +85,26 @@ def plan_scene(prompt:str):
         BLUE, RED, GREEN, YELLOW, PURPLE, ORANGE, PINK, WHITE, BLACK, GRAY, GOLD, TEAL
 
     """
-    chat_prompt = ChatPromptTemplate([
-        ('system' , system_prompt),
-        ("human" ,"Plan the scene for the following topic: {topic}")
-    ])
-
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash", 
-        temperature=0.8,
-        google_api_key=geminikey
-    )
-    model = model.with_structured_output(ScenePlan)
 
-    chain = chat_prompt | model
-    
-    response = chain.invoke({"topic" : prompt})
+PLAN_PROMPT = LazyChatPrompt([
+    ('system' , PLAN_SYSTEM_PROMPT),
+    ("human" ,"Plan the scene for the following topic: {topic}")
+])
 
-    return response
+def plan_scene(prompt:str) -> ScenePlan:
+    model = get_structured_model(ScenePlan)
+    return model.invoke(PLAN_PROMPT.format_messages(topic=prompt))
+
+async def aplan_scene(prompt:str) -> ScenePlan:
+    model = get_structured_model(ScenePlan)
+    return await model.ainvoke(PLAN_PROMPT.format_messages(topic=prompt))
 
 class ManimCodeResponse(BaseModel):
     code:str = Field(description="Complete valid Python code for the animation")
     explanation: Optional[str] = Field(None, description="Explanation of the code")
     error_fixes: Optional[List[str]] = Field(None, description="Error fixes if any")
 
-def generate_code(plan:str, scene_class_name:str) -> ManimCodeResponse:
-    """Generate a manim code from the plan"""
-    system_prompt = f"""
+CODE_SYSTEM_PROMPT = """
 You are a Python expert and a professional Manim animation developer.
 
 You will be given a detailed multi-scene visualization plan that includes:
@@ -130,81 +148,385 @@ OUTPUT: A single Python file, with one class and all scenes, ready to run in Man
 
     """
 
-    chat_prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("human", "Generate Manim code from this animation plan:\n\n{plan}")
-    ])
-    messages = chat_prompt.format_messages(plan=plan)
-
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash", 
-        temperature=0.8,
-        google_api_key=geminikey
-    )
-    model = model.with_structured_output(ManimCodeResponse) 
+CODE_PROMPT = LazyChatPrompt([
+    ("system", CODE_SYSTEM_PROMPT),
+    ("human", "Generate Manim code from this animation plan:\n\n{plan}")
+])
 
-    response = model.invoke(messages)
+def generate_code(plan:str, scene_class_name:str) -> ManimCodeResponse:
+    """Generate a manim code from the plan"""
+    model = get_structured_model(ManimCodeResponse)
+    return model.invoke(CODE_PROMPT.format_messages(plan=plan))
 
-    return response
+async def agenerate_code(plan:str, scene_class_name:str) -> ManimCodeResponse:
+    """Async variant of generate_code, for running many generations concurrently"""
+    model = get_structured_model(ManimCodeResponse)
+    return await model.ainvoke(CODE_PROMPT.format_messages(plan=plan))
 
 import os
 import time
-import glob
+import codecs
+import contextvars
+import shutil
 import subprocess
+import tempfile
+import threading
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Optional
 from pydantic import BaseModel, Field
+from Model.sections import SceneSections, split_scene_sections, build_section_program, \
+    section_cache_key, section_cache, concat_videos
+from Model.render_pool import MANIM_WARM_POOL, render_pool
+from Model.progress import ProgressCallback, ManimProgressParser, RenderCancelled, emit
+from Model.validator import validate_manim_code, format_diagnostics
+from Model.fixer import fix_library, error_signatures, trim_error_message
+from Model.profiles import RenderProfile, get_render_profile
+from Model.limits import RESOURCE_ERROR_KINDS, limit_description, limit_process, kill_process_group, \
+    classify_render_failure, limit_message, render_cpu_limit, render_timeout
+from Model.metrics import CORRECTION_ATTEMPTS, CORRECTIONS, RENDER_CPU_SECONDS, RENDER_MAX_RSS_BYTES, span
 
 class ManimExecutionResponse(BaseModel):
     output: str = Field(description="Output of the execution")
     error: Optional[str] = Field(None, description="Error message")
     video_path : Optional[str] = Field(None , description="Path of the file")
+    # validation / render_error / timeout / cpu_limit / memory_limit (see Model/limits.py)
+    error_kind: Optional[str] = Field(None, description="Kind of failure")
+    cpu_seconds: Optional[float] = Field(None, description="CPU time of the render process(es)")
+    max_rss_bytes: Optional[int] = Field(None, description="Peak RSS of the render process(es)")
+
+# Render each "# Scene N" section separately so correction retries reuse unchanged sections
+SECTION_RENDERING = os.getenv("MANIM_SECTION_RENDERING", "1") == "1"
+# Section renders running at once across the process; each is its own Manim process. 1 renders
+# a video's sections one after another.
+SECTION_PARALLELISM = int(os.getenv("MANIM_SECTION_PARALLELISM", str(os.cpu_count() or 1)))
+_section_slots = threading.BoundedSemaphore(max(1, SECTION_PARALLELISM))
+# Finished videos are moved here under a unique name; everything else lives in per-render scratch dirs
+RENDER_OUTPUT_DIR = os.getenv("RENDER_OUTPUT_DIR", "media/renders")
+
+
+def _run_manim(code: str, module_name: str, scene_class_name: str, work_dir: str, profile: RenderProfile,
+               on_progress: Optional[Callable[[int, Optional[str], int], None]] = None,
+               cancel: Optional[threading.Event] = None):
+    """
+    Render scene_class_name inside work_dir; returns (completed process, video path or None).
 
-def execute_manim_code(code: str, scene_class_name: str) -> ManimExecutionResponse:
-    # Save code to a .py file
-    file_path = f"{scene_class_name}.py"
+    Nothing is written outside work_dir, so concurrent renders of the same class name can't
+    see each other's files. The video path comes from Manim, not from globbing for the newest file.
+    Setting `cancel` kills the render and raises RenderCancelled. Renders past the profile's
+    time limits are killed; the result's `error_kind` says which limit was hit.
+    """
+    media_dir = os.path.join(work_dir, "media")
+
+    if MANIM_WARM_POOL:
+        result = render_pool.render(code, module_name, scene_class_name, profile=profile, media_dir=media_dir,
+                                    on_progress=on_progress, cancel=cancel)
+        _record_render_usage(result, "warm_pool")
+        return result, result.video_path
+
+    file_path = os.path.join(work_dir, f"{module_name}.py")
     with open(file_path, "w", encoding="utf-8") as f:
         f.write(code)
 
-    print(f" Saved code to: {os.path.abspath(file_path)}")
-    print(f" Starting Manim rendering...")
+    # Folder-wide manim.cfg next to the input file pins the output location
+    video_dir = os.path.join(work_dir, "out")
+    with open(os.path.join(work_dir, "manim.cfg"), "w", encoding="utf-8") as f:
+        f.write(f"[CLI]\nmedia_dir = {media_dir}\nvideo_dir = {video_dir}\n")
 
-    # Build manim command
+    # Build manim command; no -p, there is no player to preview with on the server
     cmd = [
         "python", "-m", "manim",
-        "-pql",  # Preview mode, low quality
+        *profile.cli_args(),
+        "--media_dir", media_dir,
+        "-o", scene_class_name,
         file_path,
         scene_class_name
     ]
 
-    # Run subprocess with correct encoding
-    start_time = time.time()
-    result = subprocess.run(
+    # Run subprocess; stderr is read as it arrives so Manim's progress bars can be
+    # reported while the render is still running
+    # Own session, so an overrun kills ffmpeg and anything else Manim started along with it
+    process = subprocess.Popen(
         cmd,
-        capture_output=True,
-        text=True,
-        encoding='utf-8',
-        errors='replace'  # Prevent UnicodeDecodeError
+        cwd=work_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
     )
+    limit_process(process.pid, cpu_seconds=render_cpu_limit(profile.limit_scale))
+    stdout_chunks = []
+    stdout_reader = threading.Thread(target=lambda: stdout_chunks.append(process.stdout.read()), daemon=True)
+    stdout_reader.start()
+    finished = threading.Event()
+    watch = {"timed_out": False}
+    threading.Thread(target=_watch_render, args=(process, cancel, finished, watch, render_timeout(profile.limit_scale)),
+                     daemon=True).start()
+
+    # Decode incrementally with errors='replace' to prevent UnicodeDecodeError mid-character
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parser = ManimProgressParser(on_progress) if on_progress is not None else None
+    stderr_chunks = []
+    try:
+        while True:
+            data = process.stderr.read1(4096)
+            chunk = decoder.decode(data, final=not data)
+            stderr_chunks.append(chunk)
+            if parser is not None:
+                parser.feed(chunk)
+            if not data:
+                break
+        if parser is not None:
+            parser.close()
+    except BaseException:
+        # A progress callback aborted the render (e.g. job cancelled)
+        kill_process_group(process.pid)
+        process.wait()
+        raise
+    finally:
+        finished.set()
+    rusage = _wait_with_rusage(process)
+    returncode = process.returncode
+    stdout_reader.join()
+    if cancel is not None and cancel.is_set():
+        raise RenderCancelled()
+    stdout = b"".join(stdout_chunks).decode("utf-8", errors="replace")
+    stderr = "".join(stderr_chunks)
+    error_kind = classify_render_failure(returncode, stderr, timed_out=watch["timed_out"])
+    if error_kind in RESOURCE_ERROR_KINDS:
+        stderr += limit_message(error_kind, profile.limit_scale)
+    result = subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+    result.error_kind = error_kind
+    if rusage is not None:
+        result.cpu_seconds = rusage.ru_utime + rusage.ru_stime
+        result.max_rss_bytes = rusage.ru_maxrss * 1024  # KiB on Linux
+    _record_render_usage(result, "subprocess")
+
+    video_path = os.path.join(video_dir, f"{scene_class_name}.{profile.format}")
+    if result.returncode != 0 or not os.path.exists(video_path):
+        video_path = None
+    return result, video_path
+
+
+def _watch_render(process: subprocess.Popen, cancel: Optional[threading.Event], finished: threading.Event,
+                  watch: dict, timeout: float):
+    """Kill the render's process group on cancel or once it runs past `timeout` seconds"""
+    deadline = time.monotonic() + timeout if timeout else None
+    # Doesn't poll() the process: reaping it here would lose its rusage to this thread
+    while not finished.wait(0.2):
+        if cancel is not None and cancel.is_set():
+            kill_process_group(process.pid)
+            return
+        if deadline is not None and time.monotonic() > deadline:
+            watch["timed_out"] = True
+            kill_process_group(process.pid)
+            return
+
+
+def _wait_with_rusage(process: subprocess.Popen):
+    """Reap the render process and return its resource usage (None if it was already reaped)"""
+    try:
+        _, status, rusage = os.wait4(process.pid, 0)
+    except ChildProcessError:
+        process.wait()
+        return None
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return rusage
+
+
+def _record_render_usage(result, mode: str):
+    cpu_seconds = getattr(result, "cpu_seconds", None)
+    max_rss_bytes = getattr(result, "max_rss_bytes", None)
+    if cpu_seconds is not None:
+        RENDER_CPU_SECONDS.observe(cpu_seconds, mode=mode)
+    if max_rss_bytes is not None:
+        RENDER_MAX_RSS_BYTES.observe(max_rss_bytes, mode=mode)
+
+
+def _keep_render(video_path: str, scene_class_name: str, profile: RenderProfile) -> str:
+    """Move a finished video out of its scratch dir before the dir is removed"""
+    os.makedirs(RENDER_OUTPUT_DIR, exist_ok=True)
+    file_name = f"{scene_class_name}_{profile.name}_{uuid.uuid4().hex[:12]}.{profile.format}"
+    target = os.path.abspath(os.path.join(RENDER_OUTPUT_DIR, file_name))
+    shutil.move(video_path, target)
+    return target
+
+
+def _render_progress(progress: Optional[ProgressCallback], **fields):
+    if progress is None:
+        return None
+    return lambda animation, name, percent: emit(progress, "render", animation=animation,
+                                                 animation_name=name, percent=percent, **fields)
+
+
+def _render_full(code: str, scene_class_name: str, profile: RenderProfile,
+                 progress: Optional[ProgressCallback] = None, attempt: Optional[int] = None,
+                 cancel: Optional[threading.Event] = None) -> ManimExecutionResponse:
+    print(f" Starting Manim rendering...")
+
+    start_time = time.time()
+    with tempfile.TemporaryDirectory(prefix="manim-render-") as work_dir:
+        result, video_path = _run_manim(code, scene_class_name, scene_class_name, work_dir, profile,
+                                        on_progress=_render_progress(progress, attempt=attempt), cancel=cancel)
+        if video_path:
+            video_path = _keep_render(video_path, scene_class_name, profile)
     duration = time.time() - start_time
 
     # Check result
     if result.returncode == 0:
         print(f" Animation completed successfully in {duration:.1f} seconds!")
-
-        # Locate output video
-        video_files = glob.glob(f"media/videos/{scene_class_name}/480p15/*.mp4", recursive=True)
-        if video_files:
-            video_path = max(video_files, key=os.path.getctime)
-            print(f"📽️ Video saved to: {os.path.abspath(video_path)}")
-            print("🎬 Playing animation:")
+        if video_path:
+            print(f"📽️ Video saved to: {video_path}")
         else:
             print(" Render completed but no video file was found.")
-        return ManimExecutionResponse(output=result.stdout , video_path=os.path.abspath(video_path))
+        return ManimExecutionResponse(output=result.stdout , video_path=video_path, **_usage([result]))
     else:
         print(" Animation failed to render.")
         print("\n--- Stdout ---\n", result.stdout)
         print("\n--- Stderr ---\n", result.stderr)
-        return ManimExecutionResponse(output=result.stdout, error=result.stderr)
+        return ManimExecutionResponse(output=result.stdout, error=result.stderr,
+                                      error_kind=getattr(result, "error_kind", None) or "render_error",
+                                      **_usage([result]))
+
+
+def _usage(results: list) -> dict:
+    """CPU time summed and peak RSS over the processes that rendered"""
+    cpu = [r.cpu_seconds for r in results if getattr(r, "cpu_seconds", None) is not None]
+    rss = [r.max_rss_bytes for r in results if getattr(r, "max_rss_bytes", None) is not None]
+    return {"cpu_seconds": sum(cpu) if cpu else None, "max_rss_bytes": max(rss) if rss else None}
+
+
+def _render_section(split: SceneSections, index: int, scene_class_name: str, profile: RenderProfile,
+                    progress: Optional[ProgressCallback], attempt: Optional[int], cancel: threading.Event,
+                    pin_dir: str):
+    """Render one uncached section; returns (completed process, video path pinned in pin_dir or None)"""
+    section_fields = {"attempt": attempt, "section": index + 1, "sections": len(split.sections)}
+    with _section_slots:
+        if cancel.is_set():
+            raise RenderCancelled()
+        print(f" Section {index + 1}/{len(split.sections)}: rendering...")
+        emit(progress, "render", message="Rendering section", **section_fields)
+        with tempfile.TemporaryDirectory(prefix="manim-section-") as work_dir:
+            result, video_path = _run_manim(build_section_program(split, index),
+                                            f"{scene_class_name}_section{index + 1}",
+                                            scene_class_name, work_dir, profile,
+                                            on_progress=_render_progress(progress, **section_fields),
+                                            cancel=cancel)
+            if result.returncode != 0:
+                return result, None
+            return result, section_cache.put(section_cache_key(split, index, profile.key), video_path,
+                                             profile.format, pin_dir=pin_dir)
+
+
+def _render_sections(split: SceneSections, scene_class_name: str, profile: RenderProfile,
+                     progress: Optional[ProgressCallback] = None, attempt: Optional[int] = None,
+                     cancel: Optional[threading.Event] = None) -> Optional[ManimExecutionResponse]:
+    """
+    Render the sections that aren't cached concurrently, then join them.
+
+    Every section program replays the sections before it without rendering them, so sections
+    don't depend on each other's processes. The first failed section stops the others.
+    Returns None when the section videos can't be joined; that's not the code's fault, so
+    the caller renders the scene whole instead.
+    """
+    # Section videos are pinned (linked) here as they are looked up or rendered, so cache
+    # eviction by concurrent renders can't remove them before the join
+    with tempfile.TemporaryDirectory(prefix="manim-join-") as work_dir:
+        start_time = time.time()
+        section_videos = {}
+        uncached = []
+        for index in range(len(split.sections)):
+            cached = section_cache.get(section_cache_key(split, index, profile.key), profile.format, pin_dir=work_dir)
+            if cached is not None:
+                print(f" Section {index + 1}/{len(split.sections)}: reusing cached render")
+                emit(progress, "render", message="Reusing cached section", percent=100, attempt=attempt,
+                     section=index + 1, sections=len(split.sections))
+                if cached:
+                    section_videos[index] = cached
+            else:
+                uncached.append(index)
+
+        # Own event for stopping the siblings of a failed section; the caller's cancel is forwarded to it
+        abort = threading.Event()
+        rendered = {}
+        failed = None
+        error = None
+        executor = ThreadPoolExecutor(max_workers=max(1, min(SECTION_PARALLELISM, len(uncached))),
+                                      thread_name_prefix="section")
+        # Each section runs in a copy of the caller's context, so its spans land in the request's trace
+        pending = {executor.submit(contextvars.copy_context().run, _render_section, split, index, scene_class_name,
+                                   profile, progress, attempt, abort, work_dir):
+                   index for index in uncached}
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                if cancel is not None and cancel.is_set():
+                    abort.set()
+                for future in done:
+                    index = pending.pop(future)
+                    try:
+                        result, video_path = future.result()
+                    except RenderCancelled:
+                        continue
+                    except BaseException as e:
+                        # e.g. a progress callback aborting the job; re-raised once the others stopped
+                        error = error or e
+                        abort.set()
+                        continue
+                    rendered[index] = result
+                    if result.returncode != 0:
+                        print(f" Section {index + 1} failed to render.")
+                        failed = index if failed is None else min(failed, index)
+                        abort.set()
+                    elif video_path:
+                        section_videos[index] = video_path
+        finally:
+            abort.set()
+            executor.shutdown(wait=True)
+        if error is not None:
+            raise error
+        if cancel is not None and cancel.is_set():
+            raise RenderCancelled()
+
+        results = [rendered[index] for index in sorted(rendered)]
+        output = "\n".join(result.stdout for result in results)
+        if failed is not None:
+            result = rendered[failed]
+            print("\n--- Stderr ---\n", result.stderr)
+            return ManimExecutionResponse(output=output, error=result.stderr,
+                                          error_kind=getattr(result, "error_kind", None) or "render_error",
+                                          **_usage(results))
+
+        duration = time.time() - start_time
+        if not section_videos:
+            print(" Render completed but no video file was found.")
+            return ManimExecutionResponse(output=output, **_usage(results))
+
+        joined_path = os.path.join(work_dir, f"{scene_class_name}.{profile.format}")
+        joined = concat_videos([section_videos[index] for index in sorted(section_videos)], joined_path)
+        if joined.returncode != 0:
+            print(f" Failed to join section videos, rendering the scene whole:\n{joined.stderr}")
+            return None
+        video_path = _keep_render(joined_path, scene_class_name, profile)
+
+    print(f" Animation completed successfully in {duration:.1f} seconds "
+          f"({len(uncached)} of {len(split.sections)} sections rendered)!")
+    print(f"📽️ Video saved to: {video_path}")
+    return ManimExecutionResponse(output=output, video_path=video_path, **_usage(results))
+
+
+def execute_manim_code(code: str, scene_class_name: str, progress: Optional[ProgressCallback] = None,
+                       attempt: Optional[int] = None, profile: Optional[RenderProfile] = None,
+                       cancel: Optional[threading.Event] = None) -> ManimExecutionResponse:
+    profile = profile or get_render_profile()
+    split = None
+    if SECTION_RENDERING and shutil.which("ffmpeg"):
+        split = split_scene_sections(code, scene_class_name)
+    with span("render", profile=profile.name, sections=len(split.sections) if split else 0):
+        if split is not None:
+            result = _render_sections(split, scene_class_name, profile, progress, attempt, cancel)
+            if result is not None:
+                return result
+        return _render_full(code, scene_class_name, profile, progress, attempt, cancel)
 
 class ManimErrorCorrectionResponse(BaseModel): 
     fixed_code: str = Field(...,description="The corrected Manim code that should resolve the errors")
@@ -212,19 +534,7 @@ class ManimErrorCorrectionResponse(BaseModel):
     changes_made: List[str] = Field(description="List of specific changes made to fix the code")
 
 
-def correct_manim_errors(code: str,error_message: str):
-    """
-    Analyze Manim errors and generate fixed code.
-
-    Args:
-        code: Original Manim code that produced errors
-        error_message: Error output from the Manim execution
-        scene_class_name: Name of the scene class
-
-    Returns:
-        ManimErrorCorrectionResponse with fixed code and explanation
-    """
-    system_prompt = """
+CORRECTION_SYSTEM_PROMPT = """
     You are an expert Manim developer and debugger. Your task is to fix errors in Manim code.
 
     ANALYZE the error message carefully to identify the root cause of the problem.
@@ -251,9 +561,9 @@ def correct_manim_errors(code: str,error_message: str):
     3. A list of specific changes you made
     """
 
-    chat_prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("human", """Please fix the errors in this Manim code.
+CORRECTION_PROMPT = LazyChatPrompt([
+    ("system", CORRECTION_SYSTEM_PROMPT),
+    ("human", """Please fix the errors in this Manim code.
 
 
             CODE WITH ERRORS:
@@ -267,43 +577,214 @@ def correct_manim_errors(code: str,error_message: str):
             ```
             Please provide a complete fixed version of the code, along with an explanation of what went wrong and how you fixed it.
             """
-        )
-    ])
-    messages = chat_prompt.format_messages(code = code , error_message = error_message)
-
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash", 
-        temperature=0.8,
-        google_api_key=geminikey
     )
-    model = model.with_structured_output(ManimErrorCorrectionResponse) 
+])
+
+
+# Sent instead of a traceback when a render was stopped by one of the limits in Model/limits.py
+RESOURCE_LIMIT_MESSAGE = """The code has no bug to fix, but rendering it was stopped because it exceeded its {limit}.
+Make the scene much cheaper to render while keeping the same explanation: fewer and simpler mobjects,
+coarser 3D surfaces (lower resolution), no long-running or per-frame updaters, shorter run_time and wait calls.
 
-    response = model.invoke(messages)
+Last output before it was stopped:
+{error}"""
 
-    return response
+
+def correct_manim_errors(code: str,error_message: str):
+    """
+    Analyze Manim errors and generate fixed code.
+
+    Args:
+        code: Original Manim code that produced errors
+        error_message: Error output from the Manim execution (ideally trimmed with trim_error_message)
+
+    Returns:
+        ManimErrorCorrectionResponse with fixed code and explanation
+    """
+    model = get_structured_model(ManimErrorCorrectionResponse)
+    return model.invoke(CORRECTION_PROMPT.format_messages(code = code , error_message = error_message))
 
 
-def generate_and_execute_with_correction(prompt: str, max_correction_attempts: int = 3):
-    storyboard_response = plan_scene(prompt)
-    scene_class_name = storyboard_response.scene_class_name
-    print(f" Scene planning complete: {scene_class_name}")
+async def acorrect_manim_errors(code: str,error_message: str):
+    """Async variant of correct_manim_errors"""
+    model = get_structured_model(ManimErrorCorrectionResponse)
+    return await model.ainvoke(CORRECTION_PROMPT.format_messages(code = code , error_message = error_message))
 
-    # Step 2: Generate the code
-    generated_code = generate_code(storyboard_response.scene, scene_class_name)
-    current_code = generated_code.code
-    print(" Initial code generation complete")
+
+def warm_up():
+    """Build the prompt templates and LLM clients ahead of the first request (called after startup)"""
+    for prompt in (PLAN_PROMPT, CODE_PROMPT, CORRECTION_PROMPT):
+        prompt.template
+    for schema in (ScenePlan, ManimCodeResponse, ManimErrorCorrectionResponse):
+        get_structured_model(schema)
+
+
+# Speculative code generation: candidates per request (1 = off) and how many may render at once
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "1"))
+SPECULATIVE_MAX_CANDIDATES = int(os.getenv("SPECULATIVE_MAX_CANDIDATES", "4"))
+SPECULATIVE_MAX_PARALLEL_RENDERS = int(os.getenv("SPECULATIVE_MAX_PARALLEL_RENDERS",
+                                                 str(max(1, (os.cpu_count() or 2) // 2))))
+SPECULATIVE_HEARTBEAT_SECONDS = 5
+
+
+def _validate_and_render(code: str, scene_class_name: str, profile: Optional[RenderProfile] = None,
+                         cancel: Optional[threading.Event] = None) -> ManimExecutionResponse:
+    with span("validate"):
+        diagnostics = validate_manim_code(code, scene_class_name)
+    if diagnostics:
+        return ManimExecutionResponse(output="", error=format_diagnostics(diagnostics), error_kind="validation")
+    return execute_manim_code(code, scene_class_name, profile=profile, cancel=cancel)
+
+
+def _discard_candidate_video(future):
+    # A losing candidate can finish its render before it sees the cancel
+    if future.cancelled() or future.exception() is not None:
+        return
+    _, result = future.result()
+    if result.video_path and os.path.exists(result.video_path):
+        os.remove(result.video_path)
+
+
+def _speculative_round(plan: str, scene_class_name: str, candidates: int, max_parallel_renders: int,
+                       progress: Optional[ProgressCallback] = None, profile: Optional[RenderProfile] = None):
+    """
+    Generate `candidates` programs concurrently and validate/render each as soon as it
+    arrives, at most max_parallel_renders at a time. The first clean render wins and the
+    other candidates are cancelled (their Manim processes killed).
+
+    Returns (code, result) of the winner, else of the first failed candidate for the
+    correction loop, or None when no candidate could even be generated.
+    """
+    cancel = threading.Event()
+    render_slots = threading.BoundedSemaphore(max_parallel_renders)
+
+    def run_candidate(index: int):
+        with span("codegen", candidate=index):
+            generated = generate_code(plan, scene_class_name)
+            if generated is None:
+                raise ValueError("no parseable code")
+            code = generated.code
+        with render_slots:
+            if cancel.is_set():
+                raise RenderCancelled()
+            print(f" Candidate {index + 1}/{candidates}: validating and rendering...")
+            return code, _validate_and_render(code, scene_class_name, profile=profile, cancel=cancel)
+
+    emit(progress, "codegen", message=f"Generating {candidates} code candidates")
+    executor = ThreadPoolExecutor(max_workers=candidates, thread_name_prefix="candidate")
+    # As for sections, each candidate runs in a copy of the caller's context (trace and spans)
+    pending = {executor.submit(contextvars.copy_context().run, run_candidate, index) for index in range(candidates)}
+    winner = fallback = None
+    try:
+        emit(progress, "render", message=f"Rendering up to {candidates} candidates", attempt=0)
+        while pending and winner is None:
+            done, pending = wait(pending, timeout=SPECULATIVE_HEARTBEAT_SECONDS, return_when=FIRST_COMPLETED)
+            if not done:
+                # Keeps job cancellation checks going while nothing reports progress
+                emit(progress, "render", message="Candidates still rendering", attempt=0)
+            for future in done:
+                try:
+                    code, result = future.result()
+                except RenderCancelled:
+                    continue
+                except Exception as e:
+                    print(f" Candidate failed before rendering: {e}")
+                    continue
+                if winner is not None:
+                    _discard_candidate_video(future)
+                elif not result.error:
+                    winner = (code, result)
+                    emit(progress, "render", message="Candidate rendered", attempt=0)
+                elif fallback is None:
+                    fallback = (code, result)
+    finally:
+        cancel.set()
+        for future in pending:
+            future.add_done_callback(_discard_candidate_video)
+        executor.shutdown(wait=False)
+    return winner or fallback
+
+
+def generate_and_execute_with_correction(prompt: str, max_correction_attempts: int = 3,
+                                         progress: Optional[ProgressCallback] = None,
+                                         use_cache: bool = True, profile: Optional[RenderProfile] = None,
+                                         candidates: int = SPECULATIVE_CANDIDATES,
+                                         max_parallel_renders: Optional[int] = None):
+    cached_plan = topic_cache.get_plan(prompt) if use_cache else None
+    if cached_plan is not None:
+        plan, scene_class_name = cached_plan.plan, cached_plan.scene_class_name
+        print(f" Using cached scene plan: {scene_class_name}")
+    else:
+        emit(progress, "planning", message="Planning scenes")
+        with span("planning"):
+            storyboard_response = plan_scene(prompt)
+        if storyboard_response is None:
+            return None
+        plan, scene_class_name = storyboard_response.scene, storyboard_response.scene_class_name
+        print(f" Scene planning complete: {scene_class_name}")
+        if use_cache:
+            topic_cache.put_plan(prompt, plan, scene_class_name)
+
+    # Step 2: Generate the code (with candidates > 1, several at once, rendered in a race)
+    speculative = None
+    cached_code = topic_cache.get_code(prompt) if cached_plan is not None else None
+    if cached_code is not None and cached_code.plan == plan:
+        current_code = cached_code.code
+        print(" Using cached code")
+    elif candidates > 1:
+        with span("speculative", candidates=candidates):
+            speculative = _speculative_round(plan, scene_class_name, candidates,
+                                             max_parallel_renders or SPECULATIVE_MAX_PARALLEL_RENDERS,
+                                             progress=progress, profile=profile)
+    if speculative is not None:
+        current_code = speculative[0]
+    elif cached_code is None or cached_code.plan != plan:
+        emit(progress, "codegen", message="Generating Manim code")
+        with span("codegen"):
+            generated_code = generate_code(plan, scene_class_name)
+        if generated_code is None:
+            return None
+        current_code = generated_code.code
+        print(" Initial code generation complete")
 
     # Step 3: Execute with correction loop
+    local_fix = None  # FixResult applied for this attempt
+    llm_fix = None  # (error, code before) of an LLM correction awaiting its outcome
+    failed_local = set()  # Signatures a local fix didn't resolve; those go to the LLM
     for attempt in range(max_correction_attempts + 1):
         if attempt > 0:
             print(f"\n Correction attempt {attempt}/{max_correction_attempts}...")
 
-        # Execute current code
-        result = execute_manim_code(current_code, scene_class_name)
+        # Catch mistakes that don't need a render to find, then execute current code
+        if attempt == 0 and speculative is not None:
+            # Already validated and rendered in the speculative round
+            result = speculative[1]
+        else:
+            emit(progress, "validate", message="Checking generated code", attempt=attempt)
+            with span("validate", attempt=attempt):
+                diagnostics = validate_manim_code(current_code, scene_class_name)
+            if diagnostics:
+                print(f" Static validation found {len(diagnostics)} problem(s), skipping render")
+                result = ManimExecutionResponse(output="", error=format_diagnostics(diagnostics),
+                                                error_kind="validation")
+            else:
+                emit(progress, "render", message="Rendering animation", attempt=attempt)
+                result = execute_manim_code(current_code, scene_class_name, progress=progress, attempt=attempt,
+                                            profile=profile)
+
+        # Learn from how the previous correction turned out
+        if local_fix is not None:
+            fix_library.record_outcome(local_fix, result.error)
+            failed_local |= set(local_fix.signatures) & set(error_signatures(result.error or ""))
+        if llm_fix is not None:
+            fix_library.record_llm_fix(llm_fix[0], llm_fix[1], current_code, result.error)
+        local_fix = llm_fix = None
 
         # Check if execution succeeded
         if not result.error or "Animation completed successfully" in result.output:
             print(" Animation executed successfully!")
+            if use_cache:
+                topic_cache.put_code(prompt, current_code)
             break
 
         # If we've reached max attempts, exit
@@ -311,21 +792,52 @@ def generate_and_execute_with_correction(prompt: str, max_correction_attempts: i
             print(f" Failed to fix errors after {max_correction_attempts} attempts.")
             break
 
-        # Try to fix the errors
+        if result.error_kind in RESOURCE_ERROR_KINDS:
+            # Nothing to fix line by line: ask for a cheaper scene instead
+            limit = limit_description(result.error_kind, (profile or get_render_profile()).limit_scale)
+            print(f" Render hit its {limit}, asking for a simpler scene...")
+            emit(progress, f"correction {attempt + 1}", message="Simplifying the scene", attempt=attempt + 1)
+            with span("correction", attempt=attempt + 1, error_kind=result.error_kind):
+                correction = correct_manim_errors(current_code, RESOURCE_LIMIT_MESSAGE.format(
+                    limit=limit,
+                    error=trim_error_message(result.error, current_code, scene_class_name)))
+            CORRECTIONS.inc(source="simplify")
+            if correction == None:
+                return None
+            current_code = correction.fixed_code
+            continue
+
+        # Try to fix the errors, locally first (known signatures), then with the LLM
         print("Errors detected, attempting to fix...")
-        correction = correct_manim_errors(current_code, result.error)
+        emit(progress, f"correction {attempt + 1}", message="Fixing render errors", attempt=attempt + 1)
+        with span("local_fix", attempt=attempt + 1):
+            local_fix = fix_library.apply(current_code, result.error, scene_class_name, skip=failed_local)
+        if local_fix is not None:
+            print(f" Applied local fix ({', '.join(local_fix.sources)}) for: {'; '.join(local_fix.signatures)}")
+            for source in local_fix.sources:
+                CORRECTIONS.inc(source=source)
+            current_code = local_fix.code
+            continue
+
+        with span("correction", attempt=attempt + 1):
+            correction = correct_manim_errors(current_code, trim_error_message(result.error, current_code,
+                                                                                 scene_class_name))
+        CORRECTIONS.inc(source="llm")
 
         # Update the code for next attempt
         if correction == None:
             return None
-        
+
+        llm_fix = (result.error, current_code)
         current_code = correction.fixed_code
 
+    CORRECTION_ATTEMPTS.observe(attempt)
+
     # Return results
     return {
         "scene_class_name": scene_class_name,
         "final_code": current_code,
-        "plan": storyboard_response.scene,
+        "plan": plan,
         "execution_result": result,
         "correction_attempts": attempt,
         "video_path" : result.video_path
@@ -0,0 +1,76 @@
+import os
+import resource
+import signal
+from typing import Optional
+
+# Per-render caps. The wall-clock limit is enforced by the caller, CPU and memory through rlimits
+# (inherited by ffmpeg and anything else Manim starts). 0 disables a limit. Time limits are for a
+# medium (720p30) render and scale with the profile's pixel rate (RenderProfile.limit_scale).
+RENDER_TIMEOUT_SECONDS = float(os.getenv("RENDER_TIMEOUT_SECONDS", "300"))
+RENDER_CPU_LIMIT_SECONDS = int(os.getenv("RENDER_CPU_LIMIT_SECONDS", "600"))
+RENDER_MEMORY_LIMIT_MB = int(os.getenv("RENDER_MEMORY_LIMIT_MB", "4096"))
+
+# ManimExecutionResponse.error_kind values; the first three mean "simplify", not "fix a bug"
+RESOURCE_ERROR_KINDS = ("timeout", "cpu_limit", "memory_limit")
+
+
+def render_timeout(scale: float = 1.0) -> float:
+    return RENDER_TIMEOUT_SECONDS * scale
+
+
+def render_cpu_limit(scale: float = 1.0) -> int:
+    return int(RENDER_CPU_LIMIT_SECONDS * scale)
+
+
+def limit_description(error_kind: str, scale: float = 1.0) -> str:
+    if error_kind == "timeout":
+        return f"wall-clock limit of {render_timeout(scale):.0f}s"
+    if error_kind == "cpu_limit":
+        return f"CPU time limit of {render_cpu_limit(scale)}s"
+    return f"memory limit of {RENDER_MEMORY_LIMIT_MB} MB"
+
+
+MEMORY_ERROR_MARKERS = ("MemoryError", "Cannot allocate memory", "std::bad_alloc", "out of memory")
+
+
+def limit_process(pid: int, cpu_seconds: int = RENDER_CPU_LIMIT_SECONDS, memory_mb: int = RENDER_MEMORY_LIMIT_MB):
+    """
+    Cap CPU time and address space of an already started process.
+
+    Set from the parent with prlimit rather than in a preexec_fn, which isn't safe in a
+    threaded server; the window before the caps apply is the interpreter's own startup.
+    """
+    try:
+        if cpu_seconds:
+            # SIGXCPU at the soft limit, SIGKILL a little later if that is ignored
+            resource.prlimit(pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+        if memory_mb:
+            limit = memory_mb * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+    except (AttributeError, ProcessLookupError, ValueError, OSError) as e:
+        # prlimit is Linux only; the wall-clock limit still applies
+        print(f" Could not apply render rlimits: {e}")
+
+
+def kill_process_group(pid: int):
+    """Kill a render started in its own session, including ffmpeg and any other children"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def classify_render_failure(returncode: int, stderr: str, timed_out: bool = False) -> Optional[str]:
+    if timed_out:
+        return "timeout"
+    if returncode == 0:
+        return None
+    if returncode in (-signal.SIGXCPU, 128 + signal.SIGXCPU):
+        return "cpu_limit"
+    if any(marker in (stderr or "") for marker in MEMORY_ERROR_MARKERS):
+        return "memory_limit"
+    return "render_error"
+
+
+def limit_message(error_kind: str, scale: float = 1.0) -> str:
+    return f"\nRenderLimitExceeded: the render exceeded its {limit_description(error_kind, scale)} and was stopped\n"
@@ -0,0 +1,180 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Type
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from Model.metrics import LLM_CALL_SECONDS, LLM_CALLS, LLM_TOKENS, span
+
+load_dotenv()
+
+GEMINI_MODEL = "gemini-2.0-flash"
+LLM_TEMPERATURE = 0.8
+
+# gemini | fake (offline, replays canned or recorded responses)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+FAKE_LLM_RESPONSES = os.getenv("FAKE_LLM_RESPONSES")  # JSON file: {"<schema name>": [response, ...]}
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0"))
+# LLM calls in flight across the process (pipelines, jobs and batches share it); 0 is unlimited
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_SLOT_POLL_SECONDS = 0.05
+
+_llm_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY) if LLM_MAX_CONCURRENCY > 0 else None
+
+_FAKE_CODE = '''from manim import *
+
+class FakeScene(Scene):
+    def construct(self):
+        # Scene 1: Introduction
+        title = Text("Fake backend", font_size=36).to_edge(UP)
+        self.play(Write(title))
+        # Scene 2: Summary
+        circle = Circle(color=BLUE)
+        self.play(Create(circle))
+        self.wait(0.5)
+'''
+
+# Used when FAKE_LLM_RESPONSES is not set
+DEFAULT_FAKE_RESPONSES = {
+    "ScenePlan": [{"scene": "Scene 1: a title. Scene 2: a blue circle.", "scene_class_name": "FakeScene"}],
+    "ManimCodeResponse": [{"code": _FAKE_CODE, "explanation": "Canned response", "error_fixes": []}],
+    "ManimErrorCorrectionResponse": [{"fixed_code": _FAKE_CODE, "explanation": "Canned response", "changes_made": []}],
+}
+
+
+class FakeStructuredModel:
+    """Stand-in for llm.with_structured_output(schema) that replays responses in order, with optional latency"""
+
+    def __init__(self, schema: Type[BaseModel], responses: List[dict], latency: float):
+        self.schema = schema
+        self.latency = latency
+        self._responses = itertools.cycle(responses)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _next(self) -> BaseModel:
+        with self._lock:
+            self.calls += 1
+            return self.schema(**next(self._responses))
+
+    def invoke(self, messages: Any, config: Any = None) -> BaseModel:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._next()
+
+    async def ainvoke(self, messages: Any, config: Any = None) -> BaseModel:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._next()
+
+
+def _gemini_backend(schema: Type[BaseModel]):
+    # Imported here so the fake backend (and app startup) doesn't pay for it
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    model = ChatGoogleGenerativeAI(
+        model=GEMINI_MODEL,
+        temperature=LLM_TEMPERATURE,
+        google_api_key=os.getenv("GOOGLE_GEMINI_KEY")
+    )
+    # include_raw keeps the provider message around for its token usage; InstrumentedModel unwraps it
+    return model.with_structured_output(schema, include_raw=True)
+
+
+def _fake_backend(schema: Type[BaseModel]):
+    responses = DEFAULT_FAKE_RESPONSES
+    if FAKE_LLM_RESPONSES:
+        with open(FAKE_LLM_RESPONSES, "r", encoding="utf-8") as f:
+            responses = json.load(f)
+    return FakeStructuredModel(schema, responses[schema.__name__], FAKE_LLM_LATENCY_SECONDS)
+
+
+class InstrumentedModel:
+    """
+    Wraps a structured-output model: latency, outcome and token usage per call type
+    (the schema name), plus a trace span per call.
+    """
+
+    def __init__(self, model: Any, call: str):
+        self.model = model
+        self.call = call
+
+    def _unwrap(self, result: Any) -> Any:
+        if not (isinstance(result, dict) and "parsed" in result):
+            return result
+        usage = getattr(result.get("raw"), "usage_metadata", None) or {}
+        for kind in ("input_tokens", "output_tokens"):
+            if usage.get(kind):
+                LLM_TOKENS.inc(usage[kind], call=self.call, kind=kind.replace("_tokens", ""))
+        if result.get("parsing_error") is not None or result["parsed"] is None:
+            # Like the plain structured-output model: no result, callers handle None
+            raw = getattr(result.get("raw"), "content", result.get("raw"))
+            print(f" LLM returned no parseable {self.call} ({result.get('parsing_error')}): {str(raw)[:500]}")
+            return None
+        return result["parsed"]
+
+    def invoke(self, messages: Any, config: Any = None) -> Any:
+        if _llm_slots is not None:
+            _llm_slots.acquire()
+        outcome = "error"
+        try:
+            with span("llm", LLM_CALL_SECONDS, call=self.call):
+                result = self._unwrap(self.model.invoke(messages, config))
+            outcome = "ok" if result is not None else "unparsed"
+            return result
+        finally:
+            LLM_CALLS.inc(call=self.call, outcome=outcome)
+            if _llm_slots is not None:
+                _llm_slots.release()
+
+    async def ainvoke(self, messages: Any, config: Any = None) -> Any:
+        # Polled rather than awaited in a thread, so a cancelled caller can't leak a slot
+        while _llm_slots is not None and not _llm_slots.acquire(blocking=False):
+            await asyncio.sleep(LLM_SLOT_POLL_SECONDS)
+        outcome = "error"
+        try:
+            with span("llm", LLM_CALL_SECONDS, call=self.call):
+                result = self._unwrap(await self.model.ainvoke(messages, config))
+            outcome = "ok" if result is not None else "unparsed"
+            return result
+        finally:
+            LLM_CALLS.inc(call=self.call, outcome=outcome)
+            if _llm_slots is not None:
+                _llm_slots.release()
+
+
+LLM_BACKENDS: Dict[str, Callable[[Type[BaseModel]], Any]] = {
+    "gemini": _gemini_backend,
+    "fake": _fake_backend,
+}
+
+_backend = LLM_BACKEND
+
+
+def register_backend(name: str, factory: Callable[[Type[BaseModel]], Any]):
+    LLM_BACKENDS[name] = factory
+
+
+def set_backend(name: str):
+    """Switch backend at runtime (benchmarks, load tests); drops the already-built models"""
+    global _backend
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}")
+    _backend = name
+    get_structured_model.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def get_structured_model(schema: Type[BaseModel]):
+    """
+    Structured-output model for `schema`, built once per process and shared.
+
+    Reusing the same client keeps its HTTP connections alive across calls instead of
+    paying client construction and connection setup on every plan/code/fix request.
+    Both .invoke() and .ainvoke() are safe to call concurrently.
+    """
+    return InstrumentedModel(LLM_BACKENDS[_backend](schema), schema.__name__)
@@ -0,0 +1,250 @@
+import contextvars
+import math
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from pydantic import BaseModel, Field
+
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state):
+                    le = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{le} {count}")
+                labels = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(state[-2])}")
+                lines.append(f"{self.name}_count{labels} {state[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: "OrderedDict[str, _Metric]" = OrderedDict()
+        # Called at scrape time, for values that are read rather than counted (e.g. DB pool usage)
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus text exposition format"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f" Metrics collector failed: {e}")
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram("manim_stage_seconds", "Pipeline stage latency", ["stage"])
+LLM_CALL_SECONDS = registry.histogram("manim_llm_call_seconds", "LLM call latency", ["call"])
+LLM_CALLS = registry.counter("manim_llm_calls_total", "LLM calls", ["call", "outcome"])
+LLM_TOKENS = registry.counter("manim_llm_tokens_total", "LLM tokens reported by the provider", ["call", "kind"])
+CORRECTION_ATTEMPTS = registry.histogram("manim_correction_attempts", "Correction attempts per pipeline run",
+                                         buckets=(0, 1, 2, 3, 4, 5))
+CORRECTIONS = registry.counter("manim_corrections_total", "Corrections applied", ["source"])
+RENDER_CPU_SECONDS = registry.histogram("manim_render_cpu_seconds", "CPU time (user+system) per Manim render",
+                                        ["mode"])
+RENDER_MAX_RSS_BYTES = registry.histogram("manim_render_max_rss_bytes", "Peak RSS of the process that rendered",
+                                          ["mode"], buckets=[2 ** n * 1024 * 1024 for n in range(5, 14)])
+UPLOAD_BYTES = registry.counter("manim_upload_bytes_total", "Bytes uploaded to video storage", ["backend"])
+UPLOAD_THROUGHPUT = registry.histogram("manim_upload_bytes_per_second", "Upload throughput per file", ["backend"],
+                                       buckets=[2 ** n * 1024 * 1024 for n in range(-2, 10)])
+HTTP_REQUEST_SECONDS = registry.histogram("http_request_seconds", "HTTP request latency", ["method", "route", "status"])
+
+
+# --- Tracing ---
+
+class Span(BaseModel):
+    name: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = Field(default_factory=time.time)
+    duration: Optional[float] = None
+    attributes: dict = Field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class Trace(BaseModel):
+    trace_id: str
+    name: str
+    start: float = Field(default_factory=time.time)
+    duration: Optional[float] = None
+    user_id: Optional[int] = None  # Only this user may read the trace
+    spans: List[Span] = Field(default_factory=list)
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+recent_traces: "deque[Trace]" = deque(maxlen=TRACE_BUFFER_SIZE)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+@contextmanager
+def trace(name: str, trace_id: Optional[str] = None, user_id: Optional[int] = None):
+    """Root of a request or job; spans opened inside (same thread/task context) attach to it"""
+    current = Trace(trace_id=trace_id or uuid.uuid4().hex, name=name, user_id=user_id)
+    token = _current_trace.set(current)
+    span_token = _current_span.set(None)
+    started = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(span_token)
+        _current_trace.reset(token)
+        recent_traces.append(current)
+
+
+@contextmanager
+def span(name: str, histogram: Optional[Histogram] = STAGE_SECONDS, **attributes):
+    """
+    Time a block: observed into `histogram` (labelled stage=name by default) and, inside
+    a trace, recorded as a span.
+    """
+    current_trace = _current_trace.get()
+    parent = _current_span.get()
+    current = Span(name=name, span_id=uuid.uuid4().hex[:16], parent_id=parent.span_id if parent else None,
+                   attributes=attributes)
+    token = _current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = e.__class__.__name__
+        raise
+    finally:
+        current.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        if histogram is STAGE_SECONDS:
+            histogram.observe(current.duration, stage=name)
+        elif histogram is not None:
+            histogram.observe(current.duration, **attributes)
+        if current_trace is not None:
+            current_trace.spans.append(current)
+
+
+def set_trace_user(user_id: int):
+    """Owner of the current trace, once known (requests authenticate after their trace starts)"""
+    current = _current_trace.get()
+    if current is not None:
+        current.user_id = user_id
+
+
+def get_trace(trace_id: str, user_id: int) -> Optional[Trace]:
+    """The trace if it is still buffered and belongs to user_id; traces without an owner aren't served"""
+    for item in list(recent_traces):
+        if item.trace_id == trace_id:
+            return item if item.user_id is not None and item.user_id == user_id else None
+    return None
@@ -0,0 +1,160 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import List, Optional
+from pydantic import BaseModel
+
+# Post-render stage: faststart remux, optional HLS, poster frame and sprite sheet (all ffmpeg, no re-encode
+# of the video itself). Runs in its own small process pool so it never holds a render slot.
+POSTPROCESS_ENABLED = os.getenv("POSTPROCESS_ENABLED", "1") == "1"
+POSTPROCESS_WORKERS = int(os.getenv("POSTPROCESS_WORKERS", "2"))
+POSTPROCESS_TIMEOUT_SECONDS = float(os.getenv("POSTPROCESS_TIMEOUT_SECONDS", "120"))
+POSTPROCESS_HLS = os.getenv("POSTPROCESS_HLS", "0") == "1"
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+THUMBNAIL_WIDTH = int(os.getenv("THUMBNAIL_WIDTH", "320"))
+# The sprite sheet is SPRITE_FRAMES evenly spaced frames, SPRITE_COLUMNS per row
+SPRITE_FRAMES = int(os.getenv("SPRITE_FRAMES", "10"))
+SPRITE_COLUMNS = int(os.getenv("SPRITE_COLUMNS", "5"))
+
+# Containers that can be remuxed to faststart / copied into MPEG-TS segments
+H264_CONTAINERS = (".mp4", ".mov")
+
+
+class MediaArtifacts(BaseModel):
+    """Local files produced next to a rendered video; missing entries failed or were disabled"""
+    poster: Optional[str] = None
+    sprite: Optional[str] = None
+    hls_playlist: Optional[str] = None
+    hls_files: List[str] = []  # Playlist and segments
+    faststart: bool = False
+
+
+def _ffmpeg(args: List[str]) -> bool:
+    try:
+        result = subprocess.run(["ffmpeg", "-y", "-loglevel", "error", *args], capture_output=True, text=True,
+                                encoding="utf-8", errors="replace", timeout=POSTPROCESS_TIMEOUT_SECONDS)
+    except subprocess.TimeoutExpired:
+        print(f" ffmpeg timed out: {' '.join(args)}")
+        return False
+    if result.returncode != 0:
+        print(f" ffmpeg failed: {result.stderr.strip()[:500]}")
+    return result.returncode == 0
+
+
+def probe_duration(video_path: str) -> Optional[float]:
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", video_path],
+            capture_output=True, text=True, timeout=30
+        )
+        return float(result.stdout.strip())
+    except (subprocess.TimeoutExpired, ValueError):
+        return None
+
+
+def remux_faststart(video_path: str) -> bool:
+    """Move the moov atom to the front in place, so playback starts before the download finishes"""
+    stem, ext = os.path.splitext(video_path)
+    tmp_path = f"{stem}.faststart{ext}"
+    if not _ffmpeg(["-i", video_path, "-c", "copy", "-map", "0", "-movflags", "+faststart", tmp_path]):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, video_path)
+    return True
+
+
+def extract_poster(video_path: str, duration: Optional[float], output_path: str) -> bool:
+    # Middle of the video: the first frames are usually just the title being written
+    at = (duration or 0) / 2
+    return _ffmpeg(["-ss", f"{at:.2f}", "-i", video_path, "-frames:v", "1",
+                    "-vf", f"scale={THUMBNAIL_WIDTH}:-2", "-q:v", "3", output_path])
+
+
+def build_sprite(video_path: str, duration: Optional[float], output_path: str) -> bool:
+    rows = -(-SPRITE_FRAMES // SPRITE_COLUMNS)
+    fps = SPRITE_FRAMES / duration if duration else 1
+    return _ffmpeg(["-i", video_path, "-frames:v", "1", "-q:v", "4",
+                    "-vf", f"fps={fps:.4f},scale={THUMBNAIL_WIDTH}:-2,tile={SPRITE_COLUMNS}x{rows}", output_path])
+
+
+def segment_hls(video_path: str, output_dir: str) -> List[str]:
+    """Single-rendition VOD playlist of copied (not re-encoded) segments; returns playlist first"""
+    os.makedirs(output_dir, exist_ok=True)
+    playlist = os.path.join(output_dir, "index.m3u8")
+    ok = _ffmpeg(["-i", video_path, "-c", "copy", "-f", "hls", "-hls_time", str(HLS_SEGMENT_SECONDS),
+                  "-hls_playlist_type", "vod", "-hls_segment_filename", os.path.join(output_dir, "segment_%04d.ts"),
+                  playlist])
+    if not ok:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        return []
+    segments = sorted(os.path.join(output_dir, name) for name in os.listdir(output_dir) if name.endswith(".ts"))
+    return [playlist, *segments]
+
+
+def process_video(video_path: str, hls: bool = POSTPROCESS_HLS) -> dict:
+    """Runs in a pool process; every step is optional, a failed one just leaves its artifact out"""
+    stem, ext = os.path.splitext(video_path)
+    artifacts = MediaArtifacts()
+    h264 = ext.lower() in H264_CONTAINERS
+    if h264:
+        artifacts.faststart = remux_faststart(video_path)
+
+    duration = probe_duration(video_path)
+    if extract_poster(video_path, duration, f"{stem}.poster.jpg"):
+        artifacts.poster = f"{stem}.poster.jpg"
+    if build_sprite(video_path, duration, f"{stem}.sprite.jpg"):
+        artifacts.sprite = f"{stem}.sprite.jpg"
+    if hls and h264:
+        artifacts.hls_files = segment_hls(video_path, f"{stem}_hls")
+        artifacts.hls_playlist = artifacts.hls_files[0] if artifacts.hls_files else None
+    return artifacts.dict()
+
+
+class PostProcessor:
+    """Bounded process pool for process_video(), created on first use"""
+
+    def __init__(self, workers: int = POSTPROCESS_WORKERS, timeout: float = POSTPROCESS_TIMEOUT_SECONDS):
+        self.workers = workers
+        self.timeout = timeout
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return POSTPROCESS_ENABLED and shutil.which("ffmpeg") is not None and shutil.which("ffprobe") is not None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn rather than fork: the API process has threads and open connections
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def run(self, video_path: str, hls: bool = POSTPROCESS_HLS) -> MediaArtifacts:
+        """Blocking; returns no artifacts (and leaves the video as rendered) if the stage fails"""
+        if not self.available:
+            return MediaArtifacts()
+        future = self._executor().submit(process_video, video_path, hls)
+        try:
+            # Several ffmpeg calls, each bounded by the timeout
+            return MediaArtifacts(**future.result(timeout=self.timeout * 4))
+        except FutureTimeoutError:
+            print(f" Post-processing of {video_path} timed out")
+        except Exception as e:
+            print(f" Post-processing of {video_path} failed: {e}")
+        return MediaArtifacts()
+
+    def stop(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+postprocessor = PostProcessor()
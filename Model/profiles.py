@@ -0,0 +1,59 @@
+import os
+from typing import Dict, List, Optional
+from pydantic import BaseModel
+
+# Pixels per second of the medium profile, the size the render time limits are set for
+REFERENCE_PIXEL_RATE = 1280 * 720 * 30
+
+
+class RenderProfile(BaseModel):
+    name: str
+    width: int
+    height: int
+    fps: int
+    format: str = "mp4"
+    disable_caching: bool = False  # Manim's own partial-movie cache; pointless for one-off drafts
+
+    @property
+    def key(self) -> str:
+        """Identifies the render output, for cache keys and file names"""
+        return f"{self.name}-{self.width}x{self.height}@{self.fps}-{self.format}"
+
+    @property
+    def limit_scale(self) -> float:
+        """Factor for the render time limits: 1 up to medium, proportionally more for larger renders"""
+        return max(1.0, self.width * self.height * self.fps / REFERENCE_PIXEL_RATE)
+
+    def cli_args(self) -> List[str]:
+        args = ["-r", f"{self.width},{self.height}", "--fps", str(self.fps), "--format", self.format]
+        if self.disable_caching:
+            args.append("--disable_caching")
+        return args
+
+    def config(self) -> dict:
+        """Same settings as cli_args(), as manim config overrides (for the warm render pool)"""
+        return {
+            "pixel_width": self.width,
+            "pixel_height": self.height,
+            "frame_rate": self.fps,
+            "format": self.format,
+            "disable_caching": self.disable_caching,
+        }
+
+
+RENDER_PROFILES: Dict[str, RenderProfile] = {
+    "draft": RenderProfile(name="draft", width=640, height=360, fps=10, disable_caching=True),
+    "low": RenderProfile(name="low", width=854, height=480, fps=15),
+    "medium": RenderProfile(name="medium", width=1280, height=720, fps=30),
+    "high": RenderProfile(name="high", width=1920, height=1080, fps=60),
+    "4k": RenderProfile(name="4k", width=3840, height=2160, fps=60),
+}
+
+DEFAULT_RENDER_PROFILE = os.getenv("RENDER_PROFILE", "low")
+
+
+def get_render_profile(name: Optional[str] = None) -> RenderProfile:
+    name = name or DEFAULT_RENDER_PROFILE
+    if name not in RENDER_PROFILES:
+        raise ValueError(f"Unknown render profile {name!r}; choose one of {', '.join(RENDER_PROFILES)}")
+    return RENDER_PROFILES[name]
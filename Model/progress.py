@@ -0,0 +1,75 @@
+import re
+import time
+from typing import Callable, Optional
+from pydantic import BaseModel, Field
+
+# tqdm progress lines Manim prints to stderr while rendering, e.g.
+# "Animation 3: Create(Circle):  45%|████▌     | 7/15 [00:00<00:00, 30.21it/s]"
+MANIM_PROGRESS = re.compile(r"Animation (\d+)(?:: (.*?))?:\s+(\d{1,3})%")
+
+TERMINAL_STAGES = ("succeeded", "failed", "cancelled")
+
+
+class ProgressEvent(BaseModel):
+    stage: str = Field(description="planning / codegen / validate / render / correction N / postprocess / upload / succeeded / failed / cancelled")
+    message: Optional[str] = None
+    attempt: Optional[int] = None  # Render attempt, 0 for the first render
+    section: Optional[int] = None  # "# Scene N" section being rendered, when rendering per section
+    sections: Optional[int] = None
+    animation: Optional[int] = None  # Manim animation index inside the current render
+    animation_name: Optional[str] = None
+    percent: Optional[int] = None  # Manim's own progress of that animation
+    timestamp: float = Field(default_factory=time.time)
+
+
+ProgressCallback = Callable[[ProgressEvent], None]
+
+
+class RenderCancelled(Exception):
+    """A render was stopped through its cancel event (e.g. a speculative candidate that lost)"""
+    pass
+
+
+def emit(progress: Optional[ProgressCallback], stage: str, **fields):
+    # The callback may raise (e.g. when a queued job gets cancelled) to abort the pipeline
+    if progress is not None:
+        progress(ProgressEvent(stage=stage, **fields))
+
+
+class ManimProgressParser:
+    """
+    Turns chunks of Manim's stderr into (animation, name, percent) callbacks.
+
+    tqdm redraws with carriage returns, so chunks are split on both \\r and \\n, and only
+    changes of at least `step` percent (or a new animation) are reported.
+    """
+
+    def __init__(self, on_progress: Callable[[int, Optional[str], int], None], step: int = 5):
+        self.on_progress = on_progress
+        self.step = step
+        self._buffer = ""
+        self._last = (None, -1)
+
+    def feed(self, chunk: str):
+        self._buffer += chunk
+        *lines, self._buffer = re.split(r"[\r\n]", self._buffer)
+        for line in lines:
+            self._parse(line)
+
+    def close(self):
+        if self._buffer:
+            self._parse(self._buffer)
+            self._buffer = ""
+
+    def _parse(self, line: str):
+        match = MANIM_PROGRESS.search(line)
+        if match is None:
+            return
+        animation, name, percent = int(match.group(1)), match.group(2), int(match.group(3))
+        last_animation, last_percent = self._last
+        if animation == last_animation and percent - last_percent < self.step and percent != 100:
+            return
+        if animation == last_animation and percent == last_percent:
+            return
+        self._last = (animation, percent)
+        self.on_progress(animation, name, percent)
@@ -0,0 +1,297 @@
+import io
+import multiprocessing
+import os
+import queue
+import resource
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Callable, List, Optional
+from Model.progress import ManimProgressParser, RenderCancelled
+from Model.limits import RENDER_CPU_LIMIT_SECONDS, RENDER_MEMORY_LIMIT_MB, RESOURCE_ERROR_KINDS, \
+    classify_render_failure, kill_process_group, limit_message, render_cpu_limit, render_timeout
+from Model.profiles import RenderProfile, get_render_profile
+
+MANIM_WARM_POOL = os.getenv("MANIM_WARM_POOL", "0") == "1"
+WARM_POOL_SIZE = int(os.getenv("MANIM_WARM_POOL_SIZE", str(max(1, (os.cpu_count() or 2) // 2))))
+WARM_POOL_MAX_JOBS = int(os.getenv("MANIM_WARM_POOL_MAX_JOBS", "20"))
+WARM_POOL_MAX_RSS_MB = int(os.getenv("MANIM_WARM_POOL_MAX_RSS_MB", "1500"))
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # Peak rather than current RSS, but good enough to decide on recycling
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _ProgressStream(io.StringIO):
+    """stderr replacement that forwards Manim's progress bars to the parent as they are drawn"""
+
+    def __init__(self, conn):
+        super().__init__()
+        self._parser = ManimProgressParser(
+            lambda animation, name, percent: conn.send({"progress": [animation, name, percent]})
+        )
+
+    def write(self, text):
+        self._parser.feed(text)
+        return super().write(text)
+
+
+def _render_in_worker(job: dict, conn) -> dict:
+    import runpy
+    from manim import tempconfig
+
+    media_dir = job["media_dir"]
+    file_path = os.path.join(media_dir, f"{job['module_name']}.py")
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(job["code"])
+
+    stdout, stderr = io.StringIO(), _ProgressStream(conn)
+    try:
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            # Fresh namespace per job: nothing defined by one scene leaks into the next
+            namespace = runpy.run_path(file_path, run_name=f"__manim_job_{job['module_name']}__")
+            scene_class = namespace.get(job["scene_class_name"])
+            if scene_class is None:
+                raise NameError(f"Scene class {job['scene_class_name']!r} not found in generated code")
+
+            # tempconfig restores the global manim config afterwards, including
+            # anything the generated module changed at import time
+            with tempconfig({
+                **job["config"],
+                "media_dir": media_dir,
+                "input_file": file_path,
+                "preview": False,
+                "write_to_movie": True,
+            }):
+                scene = scene_class()
+                scene.render()
+                movie_file_path = str(scene.renderer.file_writer.movie_file_path)
+        video_path = movie_file_path if os.path.exists(movie_file_path) else None
+        return {"returncode": 0, "stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "video_path": video_path}
+    except BaseException:
+        return {
+            "returncode": 1,
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue() + traceback.format_exc(),
+            "video_path": None,
+        }
+
+
+def _limit_next_job(cpu_seconds: int):
+    # RLIMIT_CPU counts the worker's whole life, so each job gets the budget on top of what was used.
+    # Only the soft limit moves (SIGXCPU kills the worker); an unprivileged process can't raise a lowered hard limit.
+    if not cpu_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + cpu_seconds
+    resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+
+
+def _worker_main(conn, max_jobs: int, max_rss_mb: int):
+    # Own process group, so a kill also takes the ffmpeg processes Manim starts
+    os.setsid()
+    if RENDER_MEMORY_LIMIT_MB:
+        limit = RENDER_MEMORY_LIMIT_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    # Paid once per worker instead of once per render
+    import manim  # noqa: F401
+
+    conn.send({"ready": True})
+    jobs_done = 0
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+
+        _limit_next_job(job.get("cpu_limit_seconds", RENDER_CPU_LIMIT_SECONDS))
+        before = resource.getrusage(resource.RUSAGE_SELF)
+        reply = _render_in_worker(job, conn)
+        after = resource.getrusage(resource.RUSAGE_SELF)
+        reply["cpu_seconds"] = (after.ru_utime + after.ru_stime) - (before.ru_utime + before.ru_stime)
+        # Peak over the worker's lifetime, not just this job
+        reply["max_rss_bytes"] = after.ru_maxrss * 1024
+        jobs_done += 1
+        reply["recycle"] = jobs_done >= max_jobs or _rss_mb() > max_rss_mb
+        conn.send(reply)
+        if reply["recycle"]:
+            return
+
+
+class _Worker:
+    def __init__(self, context, max_jobs: int, max_rss_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main, args=(child_conn, max_jobs, max_rss_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = bool(self.conn.recv().get("ready"))
+        return self.ready
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (OSError, EOFError):
+            pass
+        self.process.join(timeout=2)
+        self.kill()
+        self.conn.close()
+
+    def kill(self):
+        if self.process.is_alive():
+            kill_process_group(self.process.pid)
+            self.process.join()
+
+
+class WarmRenderPool:
+    """
+    Long-lived worker processes that have already imported manim.
+
+    Each job runs the generated module in its own namespace with a temporary media dir,
+    and workers are replaced after WARM_POOL_MAX_JOBS renders or once their RSS grows
+    past WARM_POOL_MAX_RSS_MB.
+    """
+
+    def __init__(self, size: int = WARM_POOL_SIZE, max_jobs: int = WARM_POOL_MAX_JOBS,
+                 max_rss_mb: int = WARM_POOL_MAX_RSS_MB):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        # spawn rather than fork: the API process has threads and open connections
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.RLock()
+        self._started = False
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            for _ in range(self.size):
+                self._idle.put(self._spawn())
+            self._started = True
+        print(f" Started {self.size} warm Manim render workers")
+
+    def stop(self):
+        with self._lock:
+            workers, self._workers = self._workers, []
+            self._started = False
+        for worker in workers:
+            worker.close()
+        self._idle = queue.Queue()
+
+    def render(self, code: str, module_name: str, scene_class_name: str,
+               profile: Optional[RenderProfile] = None, media_dir: Optional[str] = None,
+               on_progress: Optional[Callable[[int, Optional[str], int], None]] = None,
+               cancel: Optional[threading.Event] = None) -> subprocess.CompletedProcess:
+        """
+        Render scene_class_name from code; same result shape as the CLI subprocess.
+
+        The returned video (if any) lives in media_dir (a fresh temporary dir when not given),
+        which the caller owns: its path is on the result as `video_path` and `media_dir`.
+        Jobs past the profile's time limits are killed along with their worker; `error_kind` on
+        the result says which limit (if any) was hit.
+        """
+        profile = profile or get_render_profile()
+        self.start()
+        owns_media_dir = media_dir is None
+        if owns_media_dir:
+            media_dir = tempfile.mkdtemp(prefix="manim-job-")
+        os.makedirs(media_dir, exist_ok=True)
+        worker = self._idle.get()
+        timed_out = False
+        try:
+            worker.wait_ready()
+            worker.conn.send({
+                "code": code,
+                "module_name": module_name,
+                "scene_class_name": scene_class_name,
+                "config": profile.config(),
+                "media_dir": media_dir,
+                "cpu_limit_seconds": render_cpu_limit(profile.limit_scale),
+            })
+            timeout = render_timeout(profile.limit_scale)
+            deadline = time.monotonic() + timeout if timeout else None
+            while True:
+                while not worker.conn.poll(0.2):
+                    if cancel is not None and cancel.is_set():
+                        raise RenderCancelled()
+                    if deadline is not None and time.monotonic() > deadline:
+                        timed_out = True
+                        worker.kill()
+                        raise EOFError()
+                reply = worker.conn.recv()
+                if "progress" not in reply:
+                    break
+                if on_progress is not None:
+                    on_progress(*reply["progress"])
+        except (EOFError, OSError):
+            worker.process.join(timeout=1)
+            exitcode = worker.process.exitcode
+            reply = {"returncode": exitcode if exitcode else 1, "stdout": "", "stderr": "Render worker crashed",
+                     "video_path": None, "recycle": True}
+        except BaseException:
+            # A progress callback or the cancel event aborted the render: the worker is mid-job, so replace it
+            self._replace(worker)
+            raise
+
+        if reply.get("recycle") or not worker.process.is_alive():
+            self._replace(worker)
+        else:
+            self._idle.put(worker)
+
+        stderr = reply["stderr"]
+        error_kind = classify_render_failure(reply["returncode"], stderr, timed_out=timed_out)
+        if error_kind in RESOURCE_ERROR_KINDS:
+            stderr += limit_message(error_kind, profile.limit_scale)
+        result = subprocess.CompletedProcess(
+            args=["warm-pool", module_name, scene_class_name],
+            returncode=reply["returncode"],
+            stdout=reply["stdout"],
+            stderr=stderr,
+        )
+        result.error_kind = error_kind
+        result.video_path = reply["video_path"]
+        result.media_dir = media_dir
+        result.cpu_seconds = reply.get("cpu_seconds")
+        result.max_rss_bytes = reply.get("max_rss_bytes")
+        if result.video_path is None and owns_media_dir:
+            shutil.rmtree(media_dir, ignore_errors=True)
+        return result
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context, self.max_jobs, self.max_rss_mb)
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _replace(self, worker: _Worker):
+        worker.close()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+            started = self._started
+        if started:
+            self._idle.put(self._spawn())
+
+
+render_pool = WarmRenderPool()
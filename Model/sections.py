@@ -0,0 +1,268 @@
+import ast
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import threading
+from typing import List, Optional
+from pydantic import BaseModel
+from Model.limits import RENDER_TIMEOUT_SECONDS
+
+SECTION_CACHE_DIR = os.getenv("SECTION_CACHE_DIR", "media/section_cache")
+SECTION_CACHE_MAX_ENTRIES = int(os.getenv("SECTION_CACHE_MAX_ENTRIES", "500"))
+
+# The code generation prompt asks for "# Scene 1: Introduction" style comments
+SCENE_MARKER = re.compile(r"^(\s*)#\s*Scene\s+\d+\b", re.IGNORECASE)
+
+# Each section replays the ones before it in a fresh process, so objects built from anything that
+# differs per process wouldn't line up at section boundaries. Manim seeds nothing by default;
+# build_section_program() seeds `random` and numpy's global generator itself. Programs reading the
+# clock or OS randomness (matched on the last name, so datetime.datetime.now and a bare now() both
+# count) are rendered whole
+_NONDETERMINISTIC_CALLS = {"now", "utcnow", "today", "time", "time_ns", "perf_counter", "monotonic",
+                           "uuid1", "uuid4", "SystemRandom", "urandom"}
+# Prepended to section 1 so every section program draws the same random numbers
+SECTION_SEED = "__import__('random').seed(0); __import__('numpy').random.seed(0)"
+
+_SIMPLE_STATEMENTS = (
+    ast.Expr, ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Pass,
+    ast.Delete, ast.Import, ast.ImportFrom, ast.Global, ast.Nonlocal,
+)
+
+
+class SceneSections(BaseModel):
+    header: List[str]  # Everything up to and including the construct() signature
+    sections: List[List[str]]  # construct() body split at the "# Scene N" markers
+    footer: List[str]  # Rest of the class and module
+    indent: str
+    prefix_first_statement: bool = False  # Section 1 starts with code instead of a marker
+
+
+def split_scene_sections(code: str, scene_class_name: str) -> Optional[SceneSections]:
+    """
+    Split construct() of scene_class_name into its "# Scene N" sections.
+
+    Returns None when the code can't be split safely (syntax errors, fewer than two
+    top-level markers, a first section that can't carry a next_section() call, or state
+    that can't be replayed identically; see replayable()).
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    if not replayable(tree):
+        return None
+
+    construct = None
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == scene_class_name:
+            for item in node.body:
+                if isinstance(item, ast.FunctionDef) and item.name == "construct":
+                    construct = item
+    if construct is None or not construct.body:
+        return None
+
+    lines = code.splitlines()
+    statements = list(construct.body)
+    if isinstance(statements[0], ast.Expr) and isinstance(statements[0].value, ast.Constant):
+        # Keep a docstring out of the sections
+        body_start = statements[0].end_lineno
+        statements = statements[1:]
+        if not statements:
+            return None
+    else:
+        # Walk back over comments/blank lines between the signature and the first statement
+        body_start = statements[0].lineno - 1
+        while body_start - 1 >= construct.lineno and \
+                (not lines[body_start - 1].strip() or lines[body_start - 1].strip().startswith("#")):
+            body_start -= 1
+    body_end = construct.end_lineno
+    indent = lines[statements[0].lineno - 1][:statements[0].col_offset]
+
+    # Lines that belong to a multi-line statement can't start a section
+    inside_statement = set()
+    for stmt in statements:
+        inside_statement.update(range(stmt.lineno, stmt.end_lineno))
+
+    markers = []
+    for i in range(body_start, body_end):
+        match = SCENE_MARKER.match(lines[i])
+        if match is not None and match.group(1) == indent and i not in inside_statement:
+            markers.append(i)
+    if len(markers) < 2:
+        return None
+
+    # Code before the first marker runs as part of section 1, and then carries the
+    # next_section() call as a "call; statement" prefix on its first line
+    starts = list(markers)
+    prefix_first_statement = statements[0].lineno - 1 < markers[0]
+    if prefix_first_statement:
+        if not isinstance(statements[0], _SIMPLE_STATEMENTS):
+            return None
+        starts[0] = statements[0].lineno - 1
+
+    bounds = starts + [body_end]
+    sections = [lines[bounds[i]:bounds[i + 1]] for i in range(len(starts))]
+
+    return SceneSections(
+        header=lines[:starts[0]],
+        sections=sections,
+        footer=lines[body_end:],
+        indent=indent,
+        prefix_first_statement=prefix_first_statement,
+    )
+
+
+def _dotted_name(node: ast.AST) -> Optional[str]:
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def replayable(tree: ast.AST) -> bool:
+    """False if the program reads the clock or OS randomness, or uses an unseeded numpy Generator (default_rng())"""
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            modules = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module]
+            if "secrets" in modules:
+                return False
+        elif isinstance(node, ast.Call):
+            name = _dotted_name(node.func)
+            if name is None:
+                continue
+            if name.rsplit(".", 1)[-1] in _NONDETERMINISTIC_CALLS:
+                return False
+            if name.endswith("default_rng") and not node.args and not node.keywords:
+                return False
+    return True
+
+
+def build_section_program(split: SceneSections, index: int) -> str:
+    """
+    Program that renders only section `index`.
+
+    Earlier sections still run (with skip_animations=True) so the rendered section starts
+    from the same object state, later sections are dropped. The next_section() call (and,
+    for section 1, SECTION_SEED) is put on the marker line itself so tracebacks keep the
+    line numbers of the original code.
+    """
+    lines = list(split.header)
+    for i in range(index + 1):
+        call = f'self.next_section("section_{i + 1}", skip_animations={i < index})'
+        if i == 0:
+            call = f"{SECTION_SEED}; {call}"
+        section = list(split.sections[i])
+        if i == 0 and split.prefix_first_statement:
+            section[0] = f"{split.indent}{call}; {section[0].strip()}"
+        else:
+            section[0] = f"{split.indent}{call}  {section[0].strip()}"
+        lines.extend(section)
+    lines.extend(split.footer)
+    return "\n".join(lines) + "\n"
+
+
+def section_cache_key(split: SceneSections, index: int, profile_key: str) -> str:
+    # A section's first frame depends on every section before it, so the key is cumulative
+    digest = hashlib.sha256()
+    digest.update(profile_key.encode("utf-8"))
+    digest.update(SECTION_SEED.encode("utf-8"))
+    for part in [split.header, split.footer] + split.sections[:index + 1]:
+        digest.update("\n".join(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SectionCache:
+    """Rendered partial movies per section, stored as <key>.<format> (or <key>.empty for sections without animations)"""
+
+    def __init__(self, directory: str = SECTION_CACHE_DIR, max_entries: int = SECTION_CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key: str, extension: str = "mp4", pin_dir: Optional[str] = None) -> Optional[str]:
+        """
+        Returns the cached movie path, "" for a cached empty section, or None on a miss.
+
+        With pin_dir the movie is linked into that directory before the lock is released and
+        that path is returned, so a concurrent put() can't evict it before the caller uses it.
+        """
+        with self._lock:
+            for path, value in ((self._path(key, extension), None), (self._path(key, "empty"), "")):
+                try:
+                    os.utime(path, None)
+                except FileNotFoundError:
+                    continue
+                if value is not None:
+                    return value
+                return _pin(path, pin_dir) if pin_dir is not None else path
+        return None
+
+    def put(self, key: str, video_path: Optional[str], extension: str = "mp4", pin_dir: Optional[str] = None) -> str:
+        """Caches a section's movie (None for an empty section); pin_dir as for get()"""
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if video_path is None:
+                open(self._path(key, "empty"), "w").close()
+                cached = ""
+            else:
+                cached = self._path(key, extension)
+                shutil.copyfile(video_path, cached + ".tmp")
+                os.replace(cached + ".tmp", cached)
+                if pin_dir is not None:
+                    cached = _pin(cached, pin_dir)
+            self._evict()
+            return cached
+
+    def _path(self, key: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{key}.{extension}")
+
+    def _evict(self):
+        entries = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                   if not name.endswith(".tmp")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _pin(path: str, directory: str) -> str:
+    pinned = os.path.join(directory, os.path.basename(path))
+    try:
+        os.link(path, pinned)
+    except OSError:
+        # Another filesystem
+        shutil.copyfile(path, pinned)
+    return pinned
+
+
+def concat_videos(video_paths: List[str], output_path: str) -> subprocess.CompletedProcess:
+    """Join same-codec MP4s without re-encoding (ffmpeg concat demuxer)"""
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    list_path = output_path + ".txt"
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in video_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy",
+           output_path]
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace",
+                              timeout=RENDER_TIMEOUT_SECONDS or None)
+    except subprocess.TimeoutExpired:
+        return subprocess.CompletedProcess(cmd, 1, "", f"ffmpeg concat timed out after {RENDER_TIMEOUT_SECONDS:.0f}s")
+    finally:
+        os.remove(list_path)
+
+
+section_cache = SectionCache()
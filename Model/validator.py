@@ -0,0 +1,258 @@
+import ast
+import builtins
+import inspect
+import json
+import os
+import threading
+from importlib import metadata
+from typing import Dict, List, Optional, Set
+from pydantic import BaseModel
+
+MANIM_API_INDEX_PATH = os.getenv("MANIM_API_INDEX_PATH", "media/manim_api_index.json")
+
+# Camera calls that only exist on these scene types
+THREE_D_SCENES = {"ThreeDScene", "SpecialThreeDScene"}
+MOVING_CAMERA_SCENES = {"MovingCameraScene", "ZoomedScene"}
+THREE_D_CAMERA_METHODS = {
+    "set_camera_orientation", "begin_ambient_camera_rotation", "stop_ambient_camera_rotation",
+    "move_camera", "add_fixed_in_frame_mobjects", "add_fixed_orientation_mobjects",
+    "begin_3dillusion_camera_rotation", "stop_3dillusion_camera_rotation",
+}
+
+
+class Diagnostic(BaseModel):
+    code: str  # syntax_error / class_name_mismatch / missing_construct / unknown_name / unknown_kwarg / camera_scene_mismatch
+    message: str
+    line: Optional[int] = None
+
+
+class ManimApiIndex(BaseModel):
+    manim_version: str
+    exports: List[str]
+    colors: List[str]
+    # Mobject class -> keyword arguments accepted anywhere along its __init__ chain
+    mobject_kwargs: Dict[str, List[str]]
+
+
+def _installed_manim_version() -> Optional[str]:
+    try:
+        return metadata.version("manim")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def build_manim_api_index() -> ManimApiIndex:
+    """Introspect the installed manim (slow: imports it) into a JSON-serialisable index"""
+    import manim
+    from manim import Mobject, ManimColor
+
+    exports = sorted(name for name in dir(manim) if not name.startswith("_"))
+    colors = [
+        name for name in exports
+        if name.isupper() and isinstance(getattr(manim, name), (ManimColor, str))
+    ]
+
+    mobject_kwargs = {}
+    for name in exports:
+        obj = getattr(manim, name)
+        if not inspect.isclass(obj) or not issubclass(obj, Mobject):
+            continue
+        accepted: Set[str] = set()
+        strict = True
+        for klass in obj.__mro__:
+            if "__init__" not in klass.__dict__ or klass is object:
+                continue
+            try:
+                parameters = inspect.signature(klass.__dict__["__init__"]).parameters.values()
+            except (TypeError, ValueError):
+                strict = False
+                break
+            for parameter in parameters:
+                if parameter.kind in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY):
+                    accepted.add(parameter.name)
+            # Once a class outside manim takes over, we can't tell what it accepts
+            if not klass.__module__.startswith("manim"):
+                strict = False
+        # Mobject.__init__ has no **kwargs, so anything outside the union raises TypeError
+        if strict:
+            mobject_kwargs[name] = sorted(accepted - {"self"})
+
+    return ManimApiIndex(
+        manim_version=_installed_manim_version() or "unknown",
+        exports=exports,
+        colors=colors,
+        mobject_kwargs=mobject_kwargs,
+    )
+
+
+_index_lock = threading.Lock()
+_index_loaded = False
+_index: Optional[ManimApiIndex] = None
+
+
+def get_manim_api_index() -> Optional[ManimApiIndex]:
+    """
+    Index of the installed manim API, built once and cached on disk per manim version.
+
+    Returns None when manim isn't installed in this environment; API checks are skipped then.
+    """
+    global _index, _index_loaded
+    with _index_lock:
+        if _index_loaded:
+            return _index
+        _index_loaded = True
+
+        version = _installed_manim_version()
+        if version is None:
+            return None
+
+        try:
+            with open(MANIM_API_INDEX_PATH, "r", encoding="utf-8") as f:
+                cached = ManimApiIndex(**json.load(f))
+            if cached.manim_version == version:
+                _index = cached
+                return _index
+        except (OSError, ValueError, TypeError):
+            pass
+
+        try:
+            _index = build_manim_api_index()
+        except Exception as e:
+            print(f" Could not build Manim API index: {e}")
+            return None
+
+        os.makedirs(os.path.dirname(MANIM_API_INDEX_PATH) or ".", exist_ok=True)
+        with open(MANIM_API_INDEX_PATH, "w", encoding="utf-8") as f:
+            json.dump(_index.dict(), f)
+        return _index
+
+
+def _defined_names(tree: ast.AST) -> Set[str]:
+    """Every name the module binds anywhere (flow-insensitive, good enough for generated scenes)"""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name != "*":
+                    names.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+    return names
+
+
+def _star_imports_manim(tree: ast.Module) -> bool:
+    return any(
+        isinstance(node, ast.ImportFrom) and node.module == "manim" and any(a.name == "*" for a in node.names)
+        for node in tree.body
+    )
+
+
+def _scene_bases(tree: ast.Module, class_name: str, seen: Optional[Set[str]] = None) -> Set[str]:
+    """Names of the base classes of class_name, following classes defined in the same module"""
+    seen = seen or set()
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    bases = set()
+    node = classes.get(class_name)
+    if node is None or class_name in seen:
+        return bases
+    seen.add(class_name)
+    for base in node.bases:
+        name = base.id if isinstance(base, ast.Name) else base.attr if isinstance(base, ast.Attribute) else None
+        if name is None:
+            continue
+        bases.add(name)
+        bases |= _scene_bases(tree, name, seen)
+    return bases
+
+
+def validate_manim_code(code: str, scene_class_name: str) -> List[Diagnostic]:
+    """Cheap checks for mistakes that would otherwise cost a full render to discover"""
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return [Diagnostic(code="syntax_error", message=f"SyntaxError: {e.msg}", line=e.lineno)]
+
+    diagnostics: List[Diagnostic] = []
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    scene_class = classes.get(scene_class_name)
+    if scene_class is None:
+        found = ", ".join(classes) or "none"
+        return [Diagnostic(
+            code="class_name_mismatch",
+            message=f"The scene class must be named {scene_class_name!r}; classes found: {found}",
+        )]
+    if not any(isinstance(item, ast.FunctionDef) and item.name == "construct" for item in scene_class.body):
+        diagnostics.append(Diagnostic(
+            code="missing_construct",
+            message=f"Class {scene_class_name!r} has no construct(self) method",
+            line=scene_class.lineno,
+        ))
+
+    # Camera APIs that need a specific Scene base class
+    bases = _scene_bases(tree, scene_class_name)
+    for node in ast.walk(scene_class):
+        if not isinstance(node, ast.Attribute):
+            continue
+        is_self = isinstance(node.value, ast.Name) and node.value.id == "self"
+        if is_self and node.attr in THREE_D_CAMERA_METHODS and not bases & THREE_D_SCENES:
+            diagnostics.append(Diagnostic(
+                code="camera_scene_mismatch",
+                message=f"self.{node.attr}() needs the class to inherit from ThreeDScene",
+                line=node.lineno,
+            ))
+        if node.attr == "frame" and isinstance(node.value, ast.Attribute) and node.value.attr == "camera" \
+                and isinstance(node.value.value, ast.Name) and node.value.value.id == "self" \
+                and not bases & MOVING_CAMERA_SCENES:
+            diagnostics.append(Diagnostic(
+                code="camera_scene_mismatch",
+                message="self.camera.frame needs the class to inherit from MovingCameraScene",
+                line=node.lineno,
+            ))
+
+    index = get_manim_api_index()
+    if index is None or not _star_imports_manim(tree):
+        return diagnostics
+
+    local_names = _defined_names(tree)
+    known = local_names | set(dir(builtins)) | set(index.exports)
+    reported = set()
+    for node in ast.walk(tree):
+        # Unknown constants (e.g. colors like LIGHT_BLUE) and unknown classes (e.g. ShowCreation)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in known \
+                and node.id[:1].isupper() and node.id not in reported:
+            reported.add(node.id)
+            if node.id.isupper():
+                message = f"NameError: name {node.id!r} is not defined. Use a Manim color constant such as " \
+                          f"{', '.join(c for c in index.colors[:12])}"
+            else:
+                message = f"NameError: name {node.id!r} is not defined in the installed Manim version"
+            diagnostics.append(Diagnostic(code="unknown_name", message=message, line=node.lineno))
+
+        # Keyword arguments no __init__ in the Mobject's chain accepts (unless the module shadows the class)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in index.mobject_kwargs \
+                and node.func.id not in local_names:
+            accepted = set(index.mobject_kwargs[node.func.id])
+            for keyword in node.keywords:
+                if keyword.arg is not None and keyword.arg not in accepted:
+                    diagnostics.append(Diagnostic(
+                        code="unknown_kwarg",
+                        message=f"TypeError: {node.func.id}() got an unexpected keyword argument {keyword.arg!r}",
+                        line=keyword.value.lineno,
+                    ))
+
+    return diagnostics
+
+
+def format_diagnostics(diagnostics: List[Diagnostic]) -> str:
+    """Render diagnostics like an error log, the shape correct_manim_errors expects"""
+    lines = ["Static validation failed before rendering:"]
+    for diagnostic in diagnostics:
+        location = f"line {diagnostic.line}: " if diagnostic.line else ""
+        lines.append(f"- {location}{diagnostic.message} [{diagnostic.code}]")
+    return "\n".join(lines)
@@ -2,19 +2,22 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from .jwtToken import verify_access_token
 from auth.dbmodel import User as DBUser            # Your actual DB model
-from database import get_db
+from auth.usercache import CurrentUser, user_cache
+from database import get_async_db
+from Model.metrics import set_trace_user
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")  # or your token URL
 
-def get_current_user(
+async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)   # Add DB session
-) -> DBUser:
+    db: AsyncSession = Depends(get_async_db)   # Add DB session; only connects on a cache miss
+) -> CurrentUser:
     payload = verify_access_token(token)
     if payload is None:
         raise HTTPException(
@@ -29,11 +32,28 @@ def get_current_user(
             detail="Invalid token payload",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    user = db.query(DBUser).filter(DBUser.username == username).first()
+
+    user_id = payload.get("uid")
+    # Tokens issued before "uid" was added only carry the username
+    key = ("uid", user_id) if user_id is not None else ("sub", username)
+    cached = user_cache.get(key)
+    if cached is not None:
+        set_trace_user(cached.id)
+        return cached
+
+    if user_id is not None:
+        user = await db.get(DBUser, user_id)
+    else:
+        user = (await db.execute(select(DBUser).where(DBUser.username == username))).scalars().first()
+    # Hand the connection back to the pool; the route opens a new transaction if it needs one
+    await db.close()
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
+    snapshot = CurrentUser(id=user.id, username=user.username)
+    user_cache.put(key, snapshot)
+    set_trace_user(snapshot.id)
+    return snapshot
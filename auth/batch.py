@@ -0,0 +1,142 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from sqlalchemy import select
+from Model.cache import normalize_topic
+from Model.langchain import aplan_scene, topic_cache
+from Model.metrics import registry, span, trace
+from Model.profiles import get_render_profile
+from auth.dbmodel import Video
+from auth.generation import VIDEO_CONTENT, GenerationError, asave_video, render_video, video_to_response
+from auth.storage import StorageError
+from database import AsyncSessionLocal
+
+BATCH_MAX_TOPICS = int(os.getenv("BATCH_MAX_TOPICS", "50"))
+# Batch pipelines rendering at once across all batches on this process; each render is its own
+# Manim process (or warm pool worker), so this is the batch share of the machine's cores. Items
+# beyond it wait on the executor's queue; batches don't go through the request-path governor,
+# whose queue timeout would shed renders that take minutes (and crowd out /auth/generate)
+BATCH_RENDER_WORKERS = int(os.getenv("BATCH_RENDER_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+
+_batch_renders = ThreadPoolExecutor(max_workers=BATCH_RENDER_WORKERS, thread_name_prefix="batch-render")
+# Items keep running after the client disconnects (their videos still get saved); holds references
+_running = set()
+
+BATCH_ITEMS = registry.counter("batch_items_total", "Batch topics by outcome", ["status"])
+
+
+def topic_key(topic: str) -> Tuple[str, ...]:
+    """Topics with the same key make the same video ("the Fourier transform" / "Fourier transforms")"""
+    return tuple(normalize_topic(topic)) or (topic.strip().lower(),)
+
+
+def _item(index: int, topic: str, status: str, video: Optional[dict] = None, error: Optional[str] = None,
+          duplicate_of: Optional[int] = None) -> dict:
+    BATCH_ITEMS.inc(status=status)
+    return {"index": index, "topic": topic, "status": status, "video": video, "error": error,
+            "duplicate_of": duplicate_of}
+
+
+def _line(payload: dict) -> str:
+    return json.dumps(payload, default=str) + "\n"
+
+
+async def _existing_videos(user_id: int, keys: set) -> Dict[Tuple[str, ...], dict]:
+    """The user's newest video per topic key, for the keys in `keys`"""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(Video.id, Video.title).where(Video.user_id == user_id).order_by(Video.created_at.desc())
+        )).all()
+        matches = {}
+        for row in rows:
+            key = topic_key(row.title)
+            if key in keys and key not in matches:
+                matches[key] = row.id
+        if not matches:
+            return {}
+        videos = (await db.execute(
+            select(Video).options(*VIDEO_CONTENT).where(Video.id.in_(list(matches.values())))
+        )).scalars().all()
+        by_id = {video.id: video_to_response(video) for video in videos}
+    return {key: by_id[video_id] for key, video_id in matches.items() if video_id in by_id}
+
+
+async def _generate(index: int, topic: str, user_id: int, options: dict) -> dict:
+    with trace("batch_item", user_id=user_id):
+        try:
+            profile = get_render_profile(options.get("quality"))
+            # Plan on the event loop, where every item's planning runs concurrently (bounded by the
+            # shared LLM slots); the render worker then finds the plan in the topic cache
+            if topic_cache.get_video(topic, profile.name) is None and topic_cache.get_plan(topic) is None:
+                with span("planning"):
+                    plan = await aplan_scene(topic)
+                if plan is None:
+                    raise GenerationError("Scene planning failed")
+                topic_cache.put_plan(topic, plan.scene, plan.scene_class_name)
+
+            render = functools.partial(render_video, topic, user_id, **options)
+            produced = await asyncio.get_running_loop().run_in_executor(
+                _batch_renders, functools.partial(contextvars.copy_context().run, render)
+            )
+            async with AsyncSessionLocal() as db:
+                video = await asave_video(db, user_id, produced)
+                return _item(index, topic, "succeeded", video=video_to_response(video))
+        except (GenerationError, StorageError) as e:
+            return _item(index, topic, "failed", error=str(e))
+        except Exception as e:
+            traceback.print_exc()
+            return _item(index, topic, "failed", error=f"Generation failed: {e}")
+
+
+async def stream_batch(user_id: int, topics: List[str], options: dict) -> AsyncIterator[str]:
+    """
+    NDJSON: an "accepted" line, then one line per topic as its result is known, then a "done" line.
+
+    Topics repeating an earlier one in the batch, or matching one of the user's videos, aren't
+    generated again. The rest plan concurrently and render on the batch workers; a result line
+    carries the topic's index in the request.
+    """
+    first_by_key: Dict[Tuple[str, ...], int] = {}
+    duplicates: Dict[int, List[int]] = {}
+    for index, topic in enumerate(topics):
+        key = topic_key(topic)
+        if key in first_by_key:
+            duplicates.setdefault(first_by_key[key], []).append(index)
+        else:
+            first_by_key[key] = index
+
+    existing = await _existing_videos(user_id, set(first_by_key))
+    yield _line({"event": "accepted", "topics": len(topics), "unique": len(first_by_key),
+                 "existing": len(existing)})
+
+    counts = {"succeeded": 0, "existing": 0, "duplicate": 0, "failed": 0}
+
+    def with_duplicates(result: dict) -> List[dict]:
+        results = [result]
+        for index in duplicates.get(result["index"], []):
+            results.append(_item(index, topics[index], "duplicate", video=result["video"], error=result["error"],
+                                 duplicate_of=result["index"]))
+        for item in results:
+            counts[item["status"]] += 1
+        return results
+
+    tasks = []
+    for key, index in first_by_key.items():
+        if key in existing:
+            for item in with_duplicates(_item(index, topics[index], "existing", video=existing[key])):
+                yield _line(item)
+            continue
+        task = asyncio.create_task(_generate(index, topics[index], user_id, options))
+        _running.add(task)
+        task.add_done_callback(_running.discard)
+        tasks.append(task)
+
+    for next_done in asyncio.as_completed(tasks):
+        for item in with_duplicates(await next_done):
+            yield _line(item)
+    yield _line({"event": "done", **counts})
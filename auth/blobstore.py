@@ -0,0 +1,122 @@
+import hashlib
+import os
+import zlib
+from typing import Dict, Optional, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+# Scene plans and generated code are stored once per distinct text, compressed, in content_blobs.
+# zstd needs the optional `zstandard` package; without it new blobs fall back to zlib. Either
+# codec is recorded per row, so switching never needs a rewrite.
+BLOB_CODEC = os.getenv("BLOB_CODEC", "zstd")
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compress(text: str) -> Tuple[str, bytes]:
+    """(codec, data) for `text`"""
+    raw = text.encode("utf-8")
+    zstd = _zstd() if BLOB_CODEC == "zstd" else None
+    if zstd is not None:
+        return "zstd", zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return "zlib", zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError("Blob is zstd compressed but the zstandard package is not installed")
+        return zstd.ZstdDecompressor().decompress(data).decode("utf-8")
+    if codec == "zlib":
+        return zlib.decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown blob codec {codec!r}")
+
+
+def store_blobs(connection, texts: Dict[str, str]):
+    """Insert the blobs for {hash: text} that don't exist yet; only those get compressed"""
+    from auth.dbmodel import ContentBlob
+    table = ContentBlob.__table__
+    existing = set(connection.execute(select(table.c.hash).where(table.c.hash.in_(list(texts)))).scalars())
+    rows = []
+    for digest, text in texts.items():
+        if digest in existing:
+            continue
+        codec, data = compress(text)
+        rows.append({"hash": digest, "codec": codec, "data": data, "size": len(text.encode("utf-8"))})
+    if not rows:
+        return
+    # Another session can insert the same text between the check and here
+    if connection.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif connection.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        connection.execute(table.insert(), rows)
+        return
+    connection.execute(insert(table).on_conflict_do_nothing(index_elements=["hash"]), rows)
+
+
+class BlobText:
+    """
+    Text attribute kept in content_blobs. The model declares `<name>_hash` (the reference) and
+    `<name>_blob` (a lazy relationship); reading decompresses the blob on first access, assigning
+    stores the text when the session flushes.
+    """
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+        self.hash_attr = f"{name}_hash"
+        self.blob_attr = f"{name}_blob"
+
+    def __get__(self, instance, owner) -> Optional[str]:
+        if instance is None:
+            return self
+        digest = getattr(instance, self.hash_attr)
+        cached = instance.__dict__.get("_blob_texts", {}).get(self.name)
+        if cached is not None and cached[0] == digest:
+            return cached[1]
+        if digest is None:
+            return None
+        blob = getattr(instance, self.blob_attr)
+        text = decompress(blob.codec, blob.data)
+        instance.__dict__.setdefault("_blob_texts", {})[self.name] = (digest, text)
+        return text
+
+    def __set__(self, instance, text: Optional[str]):
+        digest = content_hash(text) if text is not None else None
+        setattr(instance, self.hash_attr, digest)
+        if digest is None:
+            instance.__dict__.get("_blob_texts", {}).pop(self.name, None)
+            return
+        instance.__dict__.setdefault("_blob_texts", {})[self.name] = (digest, text)
+        instance.__dict__.setdefault("_pending_blobs", {})[digest] = text
+
+
+@event.listens_for(Session, "before_flush")
+def _store_pending_blobs(session, flush_context, instances):
+    # Runs for the sync sessions behind AsyncSession too; the blob rows go in before the rows
+    # that reference them, in the same transaction
+    pending = {}
+    for obj in (*session.new, *session.dirty):
+        pending.update(obj.__dict__.get("_pending_blobs", {}))
+    if pending:
+        store_blobs(session.connection(), pending)
+
+
+@event.listens_for(Session, "after_flush")
+def _clear_pending_blobs(session, flush_context):
+    for obj in (*session.new, *session.dirty):
+        obj.__dict__.pop("_pending_blobs", None)
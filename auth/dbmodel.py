@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, LargeBinary, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
+from auth.blobstore import BlobText
 
 class User(Base):
     __tablename__ = "users"
@@ -15,15 +16,82 @@ class User(Base):
     videos = relationship("Video", back_populates="owner")
 
 
+class ContentBlob(Base):
+    """Compressed text shared by every row that references it, keyed by the SHA-256 of the text"""
+    __tablename__ = "content_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    codec = Column(String, nullable=False)  # zstd / zlib
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)  # Uncompressed bytes
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Video(Base):
     __tablename__ = "videos"
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    scene_plan = Column(String)
-    manim_code = Column(String)
+    # Plan and code live in content_blobs; the blobs load on first access of scene_plan / manim_code
+    # (async sessions can't lazy load: query with auth.generation.VIDEO_CONTENT)
+    scene_plan_hash = Column(String(64), ForeignKey("content_blobs.hash"))
+    manim_code_hash = Column(String(64), ForeignKey("content_blobs.hash"))
+    scene_plan_blob = relationship("ContentBlob", foreign_keys=[scene_plan_hash])
+    manim_code_blob = relationship("ContentBlob", foreign_keys=[manim_code_hash])
+    scene_plan = BlobText()
+    manim_code = BlobText()
     video_path = Column(String)
+    quality = Column(String)  # Render profile of the stored video (draft / low / medium / high / 4k)
+    # Storage keys of the post-processing outputs, stored next to video_path (NULL if not produced)
+    poster_path = Column(String)
+    sprite_path = Column(String)
+    hls_path = Column(String)  # index.m3u8; its segments sit next to it
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="videos")
+
+    # Keyset pagination of /myvideos walks (user_id, created_at, id) newest first
+    __table_args__ = (Index("ix_videos_user_created_id", "user_id", "created_at", "id"),)
+
+
+class RenderJob(Base):
+    __tablename__ = "render_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String, nullable=False)
+    # queued -> running -> succeeded / failed / cancelled
+    status = Column(String, nullable=False, default="queued", index=True)
+    # planning / codegen / validate / render / correction N / upload
+    stage = Column(String)
+    error = Column(String)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    # Process rendering a running job, and until when its claim holds without a heartbeat
+    worker_id = Column(String)
+    lease_expires_at = Column(DateTime, index=True)
+    quality = Column(String)  # Render profile; RENDER_PROFILE when not set
+    two_phase = Column(Boolean, nullable=False, default=False)  # Draft first, final quality in the background
+    candidates = Column(Integer)  # Speculative code candidates; SPECULATIVE_CANDIDATES when not set
+    max_parallel_renders = Column(Integer)  # CPU budget for those candidates
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    video_id = Column(Integer, ForeignKey("videos.id"))
+    owner = relationship("User")
+    video = relationship("Video")
+
+
+class ErrorFix(Base):
+    """Code patch that resolved a Manim error signature, replayed before asking the LLM"""
+    __tablename__ = "error_fixes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    signature = Column(String, nullable=False, unique=True, index=True)
+    # JSON list of [old_line, new_line] pairs (stripped of indentation); new_line "" deletes the line
+    replacements = Column(String, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime)
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import threading
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Deque, Dict, List, Tuple
+from Model.progress import ProgressEvent, TERMINAL_STAGES
+
+PROGRESS_HISTORY = 200  # Events replayed to a client that connects late
+PROGRESS_CHANNELS = 1000  # Finished channels kept around for late subscribers
+KEEPALIVE_SECONDS = 15
+
+
+class ProgressBus:
+    """
+    In-process pub/sub of pipeline progress, one channel per render job.
+
+    Render workers publish from their own threads; subscribers are async generators on the
+    FastAPI event loop, so delivery goes through loop.call_soon_threadsafe.
+    """
+
+    def __init__(self, history: int = PROGRESS_HISTORY, channels: int = PROGRESS_CHANNELS):
+        self.history = history
+        self.channels = channels
+        self._lock = threading.Lock()
+        self._history: "OrderedDict[int, Deque[ProgressEvent]]" = OrderedDict()
+        self._subscribers: Dict[int, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def publish(self, channel: int, event: ProgressEvent):
+        with self._lock:
+            events = self._history.get(channel)
+            if events is None:
+                events = self._history[channel] = deque(maxlen=self.history)
+                while len(self._history) > self.channels:
+                    self._history.popitem(last=False)
+            events.append(event)
+            subscribers = list(self._subscribers.get(channel, []))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def has_channel(self, channel: int) -> bool:
+        with self._lock:
+            return channel in self._history
+
+    async def subscribe(self, channel: int) -> AsyncIterator[ProgressEvent]:
+        """Replays the channel history, then yields live events until a terminal stage"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            backlog = list(self._history.get(channel, []))
+            self._subscribers.setdefault(channel, []).append((loop, queue))
+        try:
+            for event in backlog:
+                yield event
+                if event.stage in TERMINAL_STAGES:
+                    return
+            while True:
+                event = await queue.get()
+                yield event
+                if event.stage in TERMINAL_STAGES:
+                    return
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(channel, [])
+                if (loop, queue) in subscribers:
+                    subscribers.remove((loop, queue))
+                if not subscribers:
+                    self._subscribers.pop(channel, None)
+
+
+async def sse_stream(events: AsyncIterator[ProgressEvent]) -> AsyncIterator[str]:
+    """Server-Sent Events framing, with keepalive comments so proxies don't drop idle streams"""
+    iterator = events.__aiter__()
+    next_event = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({next_event}, timeout=KEEPALIVE_SECONDS)
+            if not done:
+                yield ": keepalive\n\n"
+                continue
+            try:
+                event = next_event.result()
+            except StopAsyncIteration:
+                return
+            yield f"event: {event.stage.split(' ')[0]}\ndata: {json.dumps(event.dict())}\n\n"
+            next_event = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        # The subscription generator can only be closed once its pending step has finished
+        next_event.cancel()
+        try:
+            await next_event
+        except (asyncio.CancelledError, StopAsyncIteration, Exception):
+            pass
+        await iterator.aclose()
+
+
+progress_bus = ProgressBus()
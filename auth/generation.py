@@ -0,0 +1,416 @@
+import asyncio
+import base64
+import os
+import shutil
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from Model.langchain import generate_and_execute_with_correction, execute_manim_code, topic_cache, \
+    SPECULATIVE_CANDIDATES
+from Model.limits import RESOURCE_ERROR_KINDS, limit_description
+from Model.profiles import get_render_profile
+from Model.metrics import span, trace
+from Model.postprocess import postprocessor
+from Model.progress import ProgressCallback, emit
+from auth.dbmodel import Video
+from auth.storage import STORAGE_DELETE_LOCAL, StorageError, storage
+from database import SessionLocal
+
+MAX_VIDEO_PAGE_SIZE = 100
+
+# Background final-quality renders for two-phase (draft first) generation
+FINAL_RENDER_WORKERS = int(os.getenv("FINAL_RENDER_WORKERS", "1"))
+_final_renders = ThreadPoolExecutor(max_workers=FINAL_RENDER_WORKERS, thread_name_prefix="final-render")
+
+
+class GenerationError(Exception):
+    """Raised when the pipeline finishes without a usable video"""
+    pass
+
+
+# Eager loads the compressed plan/code blobs, for queries whose rows are serialized with video_to_response()
+VIDEO_CONTENT = (joinedload(Video.scene_plan_blob), joinedload(Video.manim_code_blob))
+
+ARTIFACT_COLUMNS = ("poster_path", "sprite_path", "hls_path")
+ARTIFACT_CONTENT_TYPES = {".jpg": "image/jpeg", ".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+
+def _storage_key(user_id: int, video_path: str) -> str:
+    return f"users/{user_id}/videos/{os.path.basename(video_path)}"
+
+
+def _postprocess(user_id: int, video_path: str) -> Tuple[dict, list]:
+    """
+    Post-render stage (faststart remux in place, poster, sprite, HLS). Returns the artifact
+    storage keys by Video column and the (key, local path) pairs still to upload.
+    """
+    with span("postprocess"):
+        media = postprocessor.run(video_path)
+    base = os.path.splitext(_storage_key(user_id, video_path))[0]
+    keys, files = {}, []
+    if media.poster:
+        keys["poster_path"] = f"{base}.poster.jpg"
+        files.append((keys["poster_path"], media.poster))
+    if media.sprite:
+        keys["sprite_path"] = f"{base}.sprite.jpg"
+        files.append((keys["sprite_path"], media.sprite))
+    if media.hls_playlist:
+        # The playlist refers to its segments by relative name, so they keep theirs
+        keys["hls_path"] = f"{base}_hls/{os.path.basename(media.hls_playlist)}"
+        files.extend((f"{base}_hls/{os.path.basename(path)}", path) for path in media.hls_files)
+    return keys, files
+
+
+def render_video(topic: str, user_id: int, progress: Optional[ProgressCallback] = None,
+                 quality: Optional[str] = None, two_phase: bool = False,
+                 candidates: Optional[int] = None, max_parallel_renders: Optional[int] = None) -> dict:
+    """
+    Run plan -> code -> render; the result still has to go through upload_video().
+
+    Does not touch the database, so callers can run it without holding a session.
+    Topics that were already rendered (or are close paraphrases of one) reuse the
+    uploaded video from the topic cache without any LLM or render work.
+
+    With two_phase, the correction loop runs on cheap draft renders and the draft is
+    returned; saving it then queues the render at `quality` in the background.
+    With candidates > 1, that many programs are generated and raced (see _speculative_round).
+    """
+    profile = get_render_profile(quality)
+    cached = topic_cache.get_video(topic, profile.name)
+    if cached is not None:
+        print(f" Reusing cached video for topic: {cached.topic}")
+        return {
+            "title": topic,
+            "scene_plan": cached.plan,
+            "manim_code": cached.code,
+            "scene_class_name": cached.scene_class_name,
+            "video_path": cached.videos[profile.name],
+            "quality": profile.name,
+            "pending_quality": None,
+            "local_path": None,
+            "artifacts": cached.artifacts.get(profile.name, {}),
+            "artifact_files": [],
+        }
+
+    render_profile = get_render_profile("draft") if two_phase else profile
+    with span("pipeline", quality=render_profile.name):
+        result = generate_and_execute_with_correction(prompt=topic, progress=progress, profile=render_profile,
+                                                      candidates=candidates or SPECULATIVE_CANDIDATES,
+                                                      max_parallel_renders=max_parallel_renders)
+    if result is None:
+        raise GenerationError("Generation failed: no usable plan, code or correction from the model")
+
+    video_path = result.get("video_path")
+    if not video_path or not os.path.exists(video_path):
+        raise GenerationError("Generated video not found")
+    emit(progress, "postprocess", message="Preparing video for streaming")
+    artifacts, artifact_files = _postprocess(user_id, video_path)
+
+    return {
+        "title": topic,
+        "scene_plan": result['plan'],
+        "manim_code": result['final_code'],
+        "scene_class_name": result['scene_class_name'],
+        "video_path": _storage_key(user_id, video_path),
+        "quality": render_profile.name,
+        "pending_quality": profile.name if render_profile is not profile else None,
+        "local_path": video_path,
+        "content_type": f"video/{render_profile.format}",
+        "artifacts": artifacts,
+        "artifact_files": artifact_files,
+    }
+
+
+def _upload_artifacts(produced: dict):
+    """Upload poster/sprite/HLS files; one that fails is dropped, the video is usable without it"""
+    failed = set()
+    for key, path in produced.get("artifact_files", []):
+        try:
+            storage.upload(key, path, ARTIFACT_CONTENT_TYPES.get(os.path.splitext(path)[1], "application/octet-stream"))
+            produced.setdefault("artifact_keys", []).append(key)
+        except StorageError as e:
+            print(f" Skipping artifact {key}: {e}")
+            failed.add(key)
+    artifacts = produced.get("artifacts", {})
+    for column, key in list(artifacts.items()):
+        # A playlist with a missing segment is worse than none
+        prefix = key.rsplit("/", 1)[0] + "/" if column == "hls_path" else key
+        if any(failed_key.startswith(prefix) for failed_key in failed):
+            del artifacts[column]
+    for _, path in produced.get("artifact_files", []):
+        if path.endswith(".m3u8"):
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    produced["artifact_files"] = []
+
+
+def _discard_local_files(produced: dict):
+    """After a failed upload: the render and its artifacts would otherwise stay in RENDER_OUTPUT_DIR"""
+    if not STORAGE_DELETE_LOCAL:
+        return
+    for path in [produced.get("local_path"), *(path for _, path in produced.get("artifact_files", []))]:
+        if not path:
+            continue
+        if path.endswith(".m3u8"):
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _uploaded(produced: dict):
+    produced["local_path"] = None
+    # Drafts are replaced (and deleted) once the final render lands, so they aren't shared
+    if not produced["pending_quality"]:
+        topic_cache.put_video(produced["title"], produced["video_path"], produced["scene_plan"],
+                              produced["manim_code"], produced["scene_class_name"], produced["quality"],
+                              artifacts=produced.get("artifacts"))
+
+
+def upload_video(produced: dict, progress: Optional[ProgressCallback] = None):
+    """Put a fresh render from render_video() into storage (no-op for cache hits)"""
+    if not produced.get("local_path"):
+        return
+    emit(progress, "upload", message="Uploading video")
+    try:
+        storage.upload(produced["video_path"], produced["local_path"], produced["content_type"], cache_hot=True)
+        _upload_artifacts(produced)
+    except BaseException:
+        _discard_local_files(produced)
+        raise
+    _uploaded(produced)
+
+
+async def aupload_video(produced: dict, progress: Optional[ProgressCallback] = None):
+    if not produced.get("local_path"):
+        return
+    emit(progress, "upload", message="Uploading video")
+    try:
+        await storage.aupload(produced["video_path"], produced["local_path"], produced["content_type"],
+                              cache_hot=True)
+        await asyncio.to_thread(_upload_artifacts, produced)
+    except BaseException:
+        _discard_local_files(produced)
+        raise
+    _uploaded(produced)
+
+
+def produce_video(topic: str, user_id: int, progress: Optional[ProgressCallback] = None,
+                  **options) -> dict:
+    """render_video() followed by upload_video(); options as for render_video()"""
+    produced = render_video(topic, user_id, progress=progress, **options)
+    upload_video(produced, progress=progress)
+    return produced
+
+
+def _existing_video_stmt(user_id: int, produced: dict):
+    # A cache hit can point at a video this user already owns
+    return select(Video).options(*VIDEO_CONTENT).where(Video.user_id == user_id,
+                                                       Video.video_path == produced["video_path"])
+
+
+def _new_video(user_id: int, produced: dict) -> Video:
+    return Video(
+        title=produced["title"],
+        scene_plan=produced["scene_plan"],
+        manim_code=produced["manim_code"],
+        video_path=produced["video_path"],  # Store path instead of binary
+        quality=produced.get("quality"),
+        user_id=user_id,
+        **{column: produced.get("artifacts", {}).get(column) for column in ARTIFACT_COLUMNS}
+    )
+
+
+def _apply_artifacts(video: Video, artifacts: dict) -> bool:
+    """Point the row's artifact columns at `artifacts`; True if anything changed"""
+    changed = False
+    for column in ARTIFACT_COLUMNS:
+        if getattr(video, column) != artifacts.get(column):
+            setattr(video, column, artifacts.get(column))
+            changed = True
+    return changed
+
+
+def queue_final_render(video: Video, user_id: int, produced: dict):
+    # The row points at the draft until the final render swaps it in
+    if produced.get("pending_quality"):
+        _final_renders.submit(_render_final, video.id, user_id, produced)
+
+
+def save_video(db: Session, user_id: int, produced: dict) -> Video:
+    upload_video(produced)
+    existing = db.execute(_existing_video_stmt(user_id, produced)).scalars().first()
+    if existing is not None:
+        return existing
+
+    # Store metadata in DB
+    video_record = _new_video(user_id, produced)
+    db.add(video_record)
+    db.commit()
+    db.refresh(video_record)
+    queue_final_render(video_record, user_id, produced)
+    return video_record
+
+
+async def asave_video(db: AsyncSession, user_id: int, produced: dict) -> Video:
+    """
+    save_video() for the async routes. The upload of a fresh render runs while the row
+    is inserted; if the upload fails the row is deleted again and StorageError raised.
+    """
+    upload = asyncio.create_task(aupload_video(produced)) if produced.get("local_path") else None
+    try:
+        existing = (await db.execute(_existing_video_stmt(user_id, produced))).scalars().first()
+        if existing is not None:
+            video_record = existing
+        else:
+            video_record = _new_video(user_id, produced)
+            db.add(video_record)
+            await db.commit()
+            await db.refresh(video_record)
+    except BaseException:
+        if upload is not None:
+            await asyncio.gather(upload, return_exceptions=True)
+        raise
+
+    if upload is not None:
+        try:
+            await upload
+        except Exception:
+            if existing is None:
+                await db.delete(video_record)
+                await db.commit()
+            raise
+        # The row was inserted before the artifacts were uploaded; drop any that didn't make it
+        if existing is None and _apply_artifacts(video_record, produced.get("artifacts", {})):
+            await db.commit()
+    queue_final_render(video_record, user_id, produced)
+    return video_record
+
+
+def _render_final(video_id: int, user_id: int, produced: dict):
+    profile = get_render_profile(produced["pending_quality"])
+    with trace("final_render", user_id=user_id):
+        try:
+            result = execute_manim_code(produced["manim_code"], produced["scene_class_name"], profile=profile)
+            if result.error or not result.video_path:
+                # The code already rendered as the draft, so this is capacity, not a bug to send back
+                # to the model; the time limits already scale with the profile
+                error_kind = getattr(result, "error_kind", None)
+                if error_kind in RESOURCE_ERROR_KINDS:
+                    reason = f"hit its {limit_description(error_kind, profile.limit_scale)}"
+                else:
+                    reason = "failed"
+                print(f" Final {profile.name} render of video {video_id} {reason}, keeping the draft")
+                return
+            file_key = _storage_key(user_id, result.video_path)
+            artifacts, artifact_files = _postprocess(user_id, result.video_path)
+            final = {"artifacts": artifacts, "artifact_files": artifact_files}
+            try:
+                storage.upload(file_key, result.video_path, f"video/{profile.format}", cache_hot=True)
+            except StorageError:
+                _discard_local_files({"local_path": result.video_path, **final})
+                raise
+            _upload_artifacts(final)
+
+            db = SessionLocal()
+            try:
+                video = db.get(Video, video_id)
+                if video is None:
+                    storage.remove([file_key, *final.get("artifact_keys", [])])
+                    return
+                # Everything the draft had in storage, HLS segments included
+                draft_keys = [video.video_path, *produced.get("artifact_keys", [])]
+                video.video_path = file_key
+                video.quality = profile.name
+                _apply_artifacts(video, final["artifacts"])
+                db.commit()
+            finally:
+                db.close()
+
+            storage.remove(draft_keys)
+            topic_cache.put_video(produced["title"], file_key, produced["scene_plan"], produced["manim_code"],
+                                  produced["scene_class_name"], profile.name, artifacts=final["artifacts"])
+            print(f" Video {video_id} swapped to its {profile.name} render")
+        except Exception:
+            traceback.print_exc()
+
+
+def public_video_url(video_path: str) -> str:
+    return storage.public_url(video_path)
+
+
+def _artifact_url(key: Optional[str]) -> Optional[str]:
+    return storage.public_url(key) if key else None
+
+
+def video_to_response(video: Video) -> dict:
+    return {
+        "id": video.id,
+        "title": video.title,
+        "scene_plan": video.scene_plan,
+        "video_url": public_video_url(video.video_path),
+        "manim_code": video.manim_code,
+        "quality": video.quality,
+        "poster_url": _artifact_url(video.poster_path),
+        "sprite_url": _artifact_url(video.sprite_path),
+        "hls_url": _artifact_url(video.hls_path),
+    }
+
+
+def encode_video_cursor(created_at: datetime, video_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{video_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_video_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Raises ValueError for cursors this module didn't produce"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, video_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(video_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+async def list_user_videos(db: AsyncSession, user_id: int, limit: int = 20,
+                           cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of the user's videos, newest first, as summaries without the large text columns.
+
+    Keyset pagination on (created_at, id): each page is an index range scan on
+    ix_videos_user_created_id, however deep the client pages.
+    """
+    limit = max(1, min(limit, MAX_VIDEO_PAGE_SIZE))
+    stmt = select(
+        Video.id, Video.title, Video.quality, Video.created_at, Video.video_path, Video.poster_path
+    ).where(Video.user_id == user_id)
+    if cursor:
+        created_at, video_id = decode_video_cursor(cursor)
+        stmt = stmt.where(or_(
+            Video.created_at < created_at,
+            and_(Video.created_at == created_at, Video.id < video_id)
+        ))
+    stmt = stmt.order_by(Video.created_at.desc(), Video.id.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_video_cursor(rows[-1].created_at, rows[-1].id)
+    items = [
+        {
+            "id": row.id,
+            "title": row.title,
+            "quality": row.quality,
+            "created_at": row.created_at,
+            "video_url": public_video_url(row.video_path),
+            "poster_url": _artifact_url(row.poster_path),
+        }
+        for row in rows
+    ]
+    return items, next_cursor
@@ -0,0 +1,326 @@
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from auth.dbmodel import RenderJob
+from auth.generation import produce_video, save_video
+from auth.events import progress_bus
+from Model.metrics import trace
+from Model.progress import ProgressEvent
+
+RENDER_JOB_WORKERS = int(os.getenv("RENDER_JOB_WORKERS", "2"))
+MAX_ACTIVE_JOBS_PER_USER = int(os.getenv("MAX_ACTIVE_JOBS_PER_USER", "5"))
+MAX_RUNNING_JOBS_PER_USER = int(os.getenv("MAX_RUNNING_JOBS_PER_USER", "1"))
+JOB_POLL_SECONDS = float(os.getenv("RENDER_JOB_POLL_SECONDS", "2"))
+CANCEL_CHECK_SECONDS = 5
+# A running job belongs to the process holding its lease; the holder renews it every
+# JOB_HEARTBEAT_SECONDS, and jobs whose lease ran out (the process died) are queued again
+JOB_LEASE_SECONDS = float(os.getenv("RENDER_JOB_LEASE_SECONDS", "60"))
+JOB_HEARTBEAT_SECONDS = JOB_LEASE_SECONDS / 3
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobLimitExceeded(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobLeaseLost(Exception):
+    """The job's lease expired and it was requeued; another worker owns it now"""
+    pass
+
+
+def submit_job(db: Session, user_id: int, topic: str, quality: Optional[str] = None,
+               two_phase: bool = False, candidates: Optional[int] = None,
+               max_parallel_renders: Optional[int] = None) -> RenderJob:
+    active = db.query(func.count(RenderJob.id)).filter(
+        RenderJob.user_id == user_id,
+        RenderJob.status.in_(ACTIVE_STATUSES)
+    ).scalar()
+    if active >= MAX_ACTIVE_JOBS_PER_USER:
+        raise JobLimitExceeded(f"At most {MAX_ACTIVE_JOBS_PER_USER} active jobs per user")
+
+    job = RenderJob(topic=topic, status="queued", stage="queued", user_id=user_id,
+                    quality=quality, two_phase=two_phase, candidates=candidates,
+                    max_parallel_renders=max_parallel_renders)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    worker_pool.notify()
+    return job
+
+
+def cancel_job(db: Session, job: RenderJob) -> RenderJob:
+    if job.status == "queued":
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+    elif job.status == "running":
+        # Running jobs are stopped by the worker at its next progress check
+        job.cancel_requested = True
+    db.commit()
+    db.refresh(job)
+    if job.status == "cancelled":
+        progress_bus.publish(job.id, ProgressEvent(stage="cancelled"))
+    return job
+
+
+def get_user_job(db: Session, user_id: int, job_id: int) -> Optional[RenderJob]:
+    return db.query(RenderJob).filter(RenderJob.id == job_id, RenderJob.user_id == user_id).first()
+
+
+def list_user_jobs(db: Session, user_id: int, limit: int = 50) -> List[RenderJob]:
+    return (
+        db.query(RenderJob)
+        .filter(RenderJob.user_id == user_id)
+        .order_by(RenderJob.created_at.desc(), RenderJob.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+class RenderWorkerPool:
+    """
+    Fixed-size pool of threads that pull queued jobs from the render_jobs table.
+
+    The table is the queue, so jobs survive restarts: a running job holds a lease that its
+    process keeps renewing, and once a lease expires (that process is gone) the job is put
+    back in the queue. Several processes can share the table without rendering a job twice.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._threads: List[threading.Thread] = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        # Serialises claims inside this process so the per-user running limit holds
+        self._claim_lock = threading.Lock()
+        self._running: Set[int] = set()  # Jobs this process holds the lease of
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        # The heartbeat thread also requeues expired jobs; no database access during startup,
+        # so the app comes up with the database down (and /ready says why)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="render-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        for i in range(self.size):
+            thread = threading.Thread(target=self._worker_loop, name=f"render-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f" Started {self.size} render workers")
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _heartbeat_loop(self):
+        while True:
+            try:
+                self._renew_leases()
+                self._requeue_expired_jobs()
+            except Exception as e:
+                print(f" Render job heartbeat failed: {e}")
+            if self._stopping.wait(JOB_HEARTBEAT_SECONDS):
+                return
+
+    def _renew_leases(self):
+        with self._running_lock:
+            job_ids = list(self._running)
+        if not job_ids:
+            return
+        db = SessionLocal()
+        try:
+            db.query(RenderJob).filter(
+                RenderJob.id.in_(job_ids), RenderJob.status == "running", RenderJob.worker_id == self.worker_id
+            ).update({RenderJob.lease_expires_at: datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)},
+                     synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _requeue_expired_jobs(self):
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            requeued = db.query(RenderJob).filter(
+                RenderJob.status == "running",
+                or_(
+                    RenderJob.lease_expires_at < now,
+                    # Claimed before leases existed
+                    and_(RenderJob.lease_expires_at.is_(None),
+                         RenderJob.started_at < now - timedelta(seconds=JOB_LEASE_SECONDS))
+                )
+            ).update({RenderJob.status: "queued", RenderJob.stage: "queued", RenderJob.worker_id: None,
+                      RenderJob.lease_expires_at: None}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if requeued:
+            print(f" Requeued {requeued} render jobs whose lease expired")
+            self.notify()
+
+    def _owns(self, job: RenderJob) -> bool:
+        return job.status == "running" and job.worker_id == self.worker_id
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            try:
+                job_id = self._claim_next()
+            except Exception:
+                traceback.print_exc()
+                job_id = None
+
+            if job_id is None:
+                self._wakeup.wait(JOB_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+
+            self._run_job(job_id)
+
+    def _claim_next(self) -> Optional[int]:
+        with self._claim_lock:
+            db = SessionLocal()
+            try:
+                busy_users = (
+                    select(RenderJob.user_id)
+                    .where(RenderJob.status == "running")
+                    .group_by(RenderJob.user_id)
+                    .having(func.count(RenderJob.id) >= MAX_RUNNING_JOBS_PER_USER)
+                )
+                job = (
+                    db.query(RenderJob)
+                    .filter(RenderJob.status == "queued", RenderJob.user_id.not_in(busy_users))
+                    .order_by(RenderJob.created_at, RenderJob.id)
+                    .with_for_update(skip_locked=True)
+                    .first()
+                )
+                if job is None:
+                    return None
+
+                job.status = "running"
+                job.stage = "planning"
+                job.started_at = datetime.utcnow()
+                job.worker_id = self.worker_id
+                job.lease_expires_at = job.started_at + timedelta(seconds=JOB_LEASE_SECONDS)
+                db.commit()
+                with self._running_lock:
+                    self._running.add(job.id)
+                return job.id
+            finally:
+                db.close()
+
+    def _on_progress(self, job_id: int, event: ProgressEvent, state: dict):
+        # Stage changes are written to the job row; in between, render percentages only go to
+        # the progress stream and cancellation is polled at most every CANCEL_CHECK_SECONDS
+        stage_changed = event.stage != state.get("stage")
+        if stage_changed or time.monotonic() - state.get("checked_at", 0) > CANCEL_CHECK_SECONDS:
+            db = SessionLocal()
+            try:
+                job = db.get(RenderJob, job_id)
+                if not self._owns(job):
+                    raise JobLeaseLost()
+                if job.cancel_requested:
+                    raise JobCancelled()
+                if stage_changed:
+                    job.stage = event.stage
+                    db.commit()
+            finally:
+                db.close()
+            state["stage"] = event.stage
+            state["checked_at"] = time.monotonic()
+        progress_bus.publish(job_id, event)
+
+    def _finish(self, job_id: int, status: str, error: Optional[str] = None, video_id: Optional[int] = None):
+        db = SessionLocal()
+        try:
+            job = db.get(RenderJob, job_id)
+            if not self._owns(job):
+                print(f" Render job {job_id} was requeued meanwhile, not recording it as {status}")
+                return
+            job.status = status
+            job.error = error
+            job.video_id = video_id
+            job.finished_at = datetime.utcnow()
+            job.lease_expires_at = None
+            db.commit()
+        finally:
+            db.close()
+        progress_bus.publish(job_id, ProgressEvent(stage=status, message=error))
+        # A finished job may unblock another job of the same user
+        self.notify()
+
+    def _run_job(self, job_id: int):
+        db = SessionLocal()
+        try:
+            job = db.get(RenderJob, job_id)
+            topic, user_id = job.topic, job.user_id
+            options = {
+                "quality": job.quality,
+                "two_phase": job.two_phase,
+                "candidates": job.candidates,
+                "max_parallel_renders": job.max_parallel_renders,
+            }
+        finally:
+            db.close()
+
+        with trace("render_job", user_id=user_id):
+            try:
+                state = {"stage": "planning"}
+                produced = produce_video(topic, user_id,
+                                         progress=lambda event: self._on_progress(job_id, event, state),
+                                         **options)
+                self._check_cancelled(job_id)
+
+                db = SessionLocal()
+                try:
+                    video = save_video(db, user_id, produced)
+                    video_id = video.id
+                finally:
+                    db.close()
+                self._finish(job_id, "succeeded", video_id=video_id)
+            except JobLeaseLost:
+                print(f" Render job {job_id} lost its lease, leaving it to its new worker")
+            except JobCancelled:
+                print(f" Render job {job_id} cancelled")
+                self._finish(job_id, "cancelled")
+            except Exception as e:
+                traceback.print_exc()
+                self._finish(job_id, "failed", error=str(e) or e.__class__.__name__)
+            finally:
+                with self._running_lock:
+                    self._running.discard(job_id)
+
+    def _check_cancelled(self, job_id: int):
+        db = SessionLocal()
+        try:
+            job = db.get(RenderJob, job_id)
+            if not self._owns(job):
+                raise JobLeaseLost()
+            if job.cancel_requested:
+                raise JobCancelled()
+        finally:
+            db.close()
+
+
+worker_pool = RenderWorkerPool(RENDER_JOB_WORKERS)
@@ -0,0 +1,217 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Hashable
+from fastapi import Depends, HTTPException, Request, status
+from auth.authmiddleware import get_current_user
+from auth.usercache import CurrentUser
+from Model.metrics import registry
+
+# Token buckets: sustained requests per minute and burst size, per user (per client address for auth)
+RATE_LIMITS = {
+    "generate": (float(os.getenv("RATE_GENERATE_PER_MINUTE", "6")), int(os.getenv("RATE_GENERATE_BURST", "3"))),
+    "jobs": (float(os.getenv("RATE_JOBS_PER_MINUTE", "12")), int(os.getenv("RATE_JOBS_BURST", "5"))),
+    "batch": (float(os.getenv("RATE_BATCH_PER_MINUTE", "1")), int(os.getenv("RATE_BATCH_BURST", "2"))),
+    "auth": (float(os.getenv("RATE_AUTH_PER_MINUTE", "20")), int(os.getenv("RATE_AUTH_BURST", "10"))),
+    "read": (float(os.getenv("RATE_READ_PER_MINUTE", "600")), int(os.getenv("RATE_READ_BURST", "120"))),
+}
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Pipelines running at once across all users on this process, and how many may wait for a slot.
+# Kept well under the threadpool size so cheap sync routes still get threads while renders are saturated.
+GENERATION_MAX_CONCURRENT = int(os.getenv("GENERATION_MAX_CONCURRENT", str(max(1, (os.cpu_count() or 2) // 2))))
+GENERATION_MAX_QUEUE = int(os.getenv("GENERATION_MAX_QUEUE", str(2 * GENERATION_MAX_CONCURRENT)))
+GENERATION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("GENERATION_QUEUE_TIMEOUT_SECONDS", "30"))
+# Retry-After estimate before any generation has finished
+DEFAULT_GENERATION_SECONDS = 60
+
+RATE_LIMITED = registry.counter("rate_limited_total", "Requests rejected by a rate limit", ["budget"])
+LOAD_SHED = registry.counter("generation_load_shed_total", "Generations rejected by the governor", ["reason"])
+GOVERNOR = registry.gauge("generation_governor", "Generation slots in use and requests waiting", ["state"])
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucketLimiter:
+    """One token bucket per key, refilled continuously; least recently used keys are dropped past max_keys"""
+
+    def __init__(self, name: str, per_minute: float, burst: int, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.name = name
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[Hashable, list]" = OrderedDict()  # key -> [tokens, updated_at]
+        self.allowed = 0
+        self.rejected = 0
+
+    def acquire(self, key: Hashable) -> float:
+        """Take a token; returns 0 when allowed, else seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                self.allowed += 1
+                return 0.0
+            self.rejected += 1
+            return (1 - bucket[0]) / self.rate if self.rate > 0 else float(DEFAULT_GENERATION_SECONDS)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "per_minute": self.rate * 60,
+                "burst": self.burst,
+                "keys": len(self._buckets),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+            }
+
+
+class GenerationGovernor:
+    """
+    Admission control for synchronous generations: at most max_concurrent run, up to
+    max_queue wait (for at most queue_timeout seconds), everything else is shed with a
+    Retry-After estimated from recent generation times.
+    """
+
+    def __init__(self, max_concurrent: int = GENERATION_MAX_CONCURRENT, max_queue: int = GENERATION_MAX_QUEUE,
+                 queue_timeout: float = GENERATION_QUEUE_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed = 0
+        self._avg_seconds = None  # Moving average of generation time
+
+    def retry_after(self) -> float:
+        average = self._avg_seconds or DEFAULT_GENERATION_SECONDS
+        # The queue ahead of a retry, plus the retry itself, drains max_concurrent at a time
+        return average * (self.queued + 1) / self.max_concurrent
+
+    def _shed(self, reason: str):
+        self.shed += 1
+        LOAD_SHED.inc(reason=reason)
+        raise Overloaded(self.retry_after(), reason)
+
+    async def _acquire(self) -> bool:
+        """
+        Wait up to queue_timeout for a slot. Not wait_for(): it can swallow a cancellation that
+        arrives as the slot is granted (client gone), and the request would run anyway.
+        """
+        acquire = asyncio.ensure_future(self._slots.acquire())
+        try:
+            done, _ = await asyncio.wait({acquire}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if not acquire.cancel():
+                self._slots.release()
+            raise
+        # A pending acquire that is cancelled hands a slot granted meanwhile to the next waiter
+        return acquire in done or not acquire.cancel()
+
+    @asynccontextmanager
+    async def slot(self):
+        # Counts requests between admission and acquiring a slot as queued, so a burst can't overshoot
+        if self.in_flight + self.queued >= self.max_concurrent + self.max_queue:
+            self._shed("queue_full")
+        self.queued += 1
+        try:
+            acquired = await self._acquire()
+        finally:
+            self.queued -= 1
+        if not acquired:
+            self._shed("queue_timeout")
+
+        self.in_flight += 1
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_seconds = elapsed if self._avg_seconds is None else 0.8 * self._avg_seconds + 0.2 * elapsed
+            self.in_flight -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "slot_utilization": self.in_flight / self.max_concurrent,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_generation_seconds": self._avg_seconds,
+        }
+
+
+limiters: Dict[str, TokenBucketLimiter] = {
+    name: TokenBucketLimiter(name, per_minute, burst) for name, (per_minute, burst) in RATE_LIMITS.items()
+}
+generation_governor = GenerationGovernor()
+
+
+def too_many_requests(retry_after: float, detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def _check(budget: str, key: Hashable):
+    retry_after = limiters[budget].acquire(key)
+    if retry_after:
+        RATE_LIMITED.inc(budget=budget)
+        raise too_many_requests(retry_after, f"Rate limit exceeded for {budget} requests")
+
+
+def user_rate_limit(budget: str):
+    """Dependency: the authenticated user, after taking a token from their `budget` bucket"""
+    async def dependency(current_user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+        _check(budget, current_user.id)
+        return current_user
+    return dependency
+
+
+def client_rate_limit(budget: str):
+    """Dependency for unauthenticated routes: buckets per client address"""
+    async def dependency(request: Request):
+        _check(budget, request.client.host if request.client else "unknown")
+    return dependency
+
+
+def admission_stats() -> dict:
+    return {
+        "governor": generation_governor.stats(),
+        "rate_limits": {name: limiter.stats() for name, limiter in limiters.items()},
+    }
+
+
+def _collect_governor():
+    GOVERNOR.set(generation_governor.in_flight, state="in_flight")
+    GOVERNOR.set(generation_governor.queued, state="queued")
+
+
+registry.add_collector(_collect_governor)
@@ -1,24 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, status , Body
+from fastapi import APIRouter, Depends, HTTPException, status , Body, Request
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta, datetime
 from passlib.context import CryptContext
-from jose import JWTError, jwt
+from jose import jwt
 from auth.authmiddleware import get_current_user
-from fastapi.responses import FileResponse
-from Model.langchain import generate_and_execute_with_correction
+from auth.usercache import CurrentUser, user_cache
+from auth.ratelimit import Overloaded, admission_stats, client_rate_limit, generation_governor, too_many_requests, \
+    user_rate_limit
+from auth.storage import StorageError, storage, hot_videos
+from auth.streaming import video_etag, etag_matches
+from fastapi.responses import FileResponse, StreamingResponse, Response
 import os
-from auth.schemas import UserCreate, Token  , UserLogin , VideoResponse
-from auth.dbmodel import User as DBUser , Video          
-from database import get_db
+from auth.schemas import UserCreate, Token  , UserLogin , VideoResponse, VideoPage, JobResponse
+from auth.dbmodel import User as DBUser , Video , RenderJob
+from database import get_db, get_async_db, AsyncSessionLocal
 from auth.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
-import base64
-from supabase import create_client
-from typing import List
+from auth.generation import render_video, asave_video, video_to_response, list_user_videos, GenerationError, \
+    VIDEO_CONTENT
+from Model.langchain import topic_cache, SPECULATIVE_MAX_CANDIDATES
+from Model.profiles import get_render_profile
+from Model.metrics import get_trace, span
+from Model.progress import ProgressEvent, TERMINAL_STAGES
+from auth.events import progress_bus, sse_stream
+from auth.batch import BATCH_MAX_TOPICS, stream_batch
+from auth.jobs import submit_job, cancel_job, get_user_job, list_user_jobs, JobLimitExceeded
+from typing import List, Optional
 
 router = APIRouter()
 
-supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
-
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -36,109 +48,298 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
 
 # --- Signup Route ---
 
-@router.post("/signup", response_model=Token)
-def signup(user: UserCreate, db: Session = Depends(get_db)):
-    existing_user = db.query(DBUser).filter(DBUser.email == user.email).first()
+@router.post("/signup", response_model=Token, dependencies=[Depends(client_rate_limit("auth"))])
+async def signup(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing_user = (await db.execute(select(DBUser).where(DBUser.email == user.email))).scalars().first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already registered")
 
-    hashed_password = get_password_hash(user.password)
+    # bcrypt is deliberately slow; keep it off the event loop
+    with span("password_hash"):
+        hashed_password = await run_in_threadpool(get_password_hash, user.password)
     new_user = DBUser(
         username=user.username,
         email=user.email,
         hashed_password=hashed_password
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     access_token = create_access_token(
-        data={"sub": new_user.username},
+        data={"sub": new_user.username, "uid": new_user.id},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-@router.post("/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(DBUser).filter(DBUser.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+@router.post("/login", response_model=Token, dependencies=[Depends(client_rate_limit("auth"))])
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = (await db.execute(select(DBUser).where(DBUser.email == user.email))).scalars().first()
+    # Release the connection before the slow password check
+    await db.close()
+    with span("password_hash"):
+        valid = db_user is not None and await run_in_threadpool(verify_password, user.password,
+                                                                db_user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
     access_token = create_access_token(
-        data={"sub": db_user.username},
+        data={"sub": db_user.username, "uid": db_user.id},
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/protected")
-def protected_route(current_user: DBUser = Depends(get_current_user)):
+def protected_route(current_user: CurrentUser = Depends(get_current_user)):
     return {"message": f"Hello, {current_user.username}. Middleware is working!"}
 
 
+def render_options(data: dict):
+    """
+    Optional fields of a generation request: "quality" (render profile name), "two_phase",
+    "candidates" (speculative code candidates) and "max_parallel_renders" (their CPU budget)
+    """
+    quality = data.get("quality")
+    try:
+        get_render_profile(quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    limits = {"candidates": SPECULATIVE_MAX_CANDIDATES, "max_parallel_renders": os.cpu_count() or 1}
+    options = {"quality": quality, "two_phase": bool(data.get("two_phase", False))}
+    for field, limit in limits.items():
+        value = data.get(field)
+        if value is not None and (not isinstance(value, int) or not 1 <= value <= limit):
+            raise HTTPException(status_code=400, detail=f"{field} must be an integer between 1 and {limit}")
+        options[field] = value
+    return options
+
+
 @router.post("/generatetopic", response_model=VideoResponse)
-def generate_topic(
+async def generate_topic(
     data: dict = Body(...),
-    current_user: DBUser = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: CurrentUser = Depends(user_rate_limit("generate"))
 ):
     topic = data.get("topic")
     if not topic:
         raise HTTPException(status_code=400, detail="Missing topic in request body")
+    options = render_options(data)
 
     # Generate video (assuming this creates a temporary file)
-    result = generate_and_execute_with_correction(prompt=topic)
-    video_path = result.get("video_path")
-    
-    if not video_path or not os.path.exists(video_path):
-        raise HTTPException(status_code=404, detail="Generated video not found")
-
-    # Upload to Supabase Storage
-    file_key = f"users/{current_user.id}/videos/{os.path.basename(video_path)}"
-    
-    supabase.storage.from_("videos").upload(file_key, video_path,
-                                            {"content-type" : "video/mp4"})
-    # Store metadata in DB
-    video_record = Video(
-        title=topic,
-        scene_plan=result['plan'],
-        manim_code=result['final_code'],
-        video_path=file_key,  # Store path instead of binary
-        owner=current_user
+    # No DB session is open while the pipeline runs; rendering can take minutes
+    try:
+        async with generation_governor.slot():
+            produced = await run_in_threadpool(render_video, topic, current_user.id, **options)
+    except Overloaded as e:
+        raise too_many_requests(e.retry_after, "Render capacity exhausted, retry later or submit a job")
+    except GenerationError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    async with AsyncSessionLocal() as db:
+        try:
+            with span("save"):
+                video_record = await asave_video(db, current_user.id, produced)
+        except StorageError as e:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
+    return video_to_response(video_record)
+
+
+@router.post("/generatebatch")
+async def generate_batch(
+    data: dict = Body(...),
+    current_user: CurrentUser = Depends(user_rate_limit("batch"))
+):
+    """
+    Generate videos for a list of "topics" (render options as for /generatetopic), streamed
+    back as NDJSON with one line per topic in completion order; see auth.batch.stream_batch
+    """
+    topics = data.get("topics")
+    if not isinstance(topics, list) or not all(isinstance(topic, str) and topic.strip() for topic in topics):
+        raise HTTPException(status_code=400, detail="topics must be a list of non-empty strings")
+    if not 1 <= len(topics) <= BATCH_MAX_TOPICS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {BATCH_MAX_TOPICS} topics per batch")
+    options = render_options(data)
+
+    return StreamingResponse(
+        stream_batch(current_user.id, [topic.strip() for topic in topics], options),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    db.add(video_record)
-    db.commit()
 
-    video_url = supabase.storage.from_("videos").get_public_url(file_key)
 
+@router.get("/cache/stats")
+def topic_cache_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return topic_cache.stats()
+
+
+@router.get("/storage/stats")
+def storage_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return {"backend": storage.name, **storage.stats.snapshot(), "hot_cache": hot_videos.stats()}
+
+
+@router.get("/usercache/stats")
+def user_cache_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return user_cache.stats()
+
+
+@router.get("/admission/stats")
+def admission_control_stats(current_user: CurrentUser = Depends(get_current_user)):
+    return admission_stats()
+
+
+@router.get("/traces/{trace_id}")
+def trace_detail(trace_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    """Spans of one of the user's recent requests or jobs; the id comes from the X-Trace-Id response header"""
+    found = get_trace(trace_id, current_user.id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Trace not found (only recent traces are kept)")
+    return found
+
+
+def job_to_response(job: RenderJob) -> dict:
     return {
-        "title": topic,
-        "scene_plan": result['plan'],
-        "video_url": video_url,
-        "manim_code": result['final_code']
+        "id": job.id,
+        "topic": job.topic,
+        "status": job.status,
+        "quality": job.quality,
+        "two_phase": bool(job.two_phase),
+        "candidates": job.candidates,
+        "max_parallel_renders": job.max_parallel_renders,
+        "stage": job.stage,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "video": video_to_response(job.video) if job.video is not None else None
     }
 
 
-@router.get("/myvideos", response_model=List[VideoResponse])
-def get_user_videos(
-    current_user: DBUser = Depends(get_current_user),
+@router.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_job(
+    data: dict = Body(...),
+    current_user: CurrentUser = Depends(user_rate_limit("jobs")),
+    db: Session = Depends(get_db)
+):
+    topic = data.get("topic")
+    if not topic:
+        raise HTTPException(status_code=400, detail="Missing topic in request body")
+    options = render_options(data)
+
+    try:
+        job = submit_job(db, current_user.id, topic, **options)
+    except JobLimitExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    return job_to_response(job)
+
+
+@router.get("/jobs", response_model=List[JobResponse])
+def get_jobs(
+    current_user: CurrentUser = Depends(user_rate_limit("read")),
+    db: Session = Depends(get_db)
+):
+    return [job_to_response(job) for job in list_user_jobs(db, current_user.id)]
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(
+    job_id: int,
+    current_user: CurrentUser = Depends(user_rate_limit("read")),
+    db: Session = Depends(get_db)
+):
+    job = get_user_job(db, current_user.id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_response(job)
+
+
+@router.get("/jobs/{job_id}/events")
+def stream_job_events(
+    job_id: int,
+    current_user: CurrentUser = Depends(user_rate_limit("read")),
+    db: Session = Depends(get_db)
+):
+    """Server-Sent Events stream of the job's pipeline progress until it finishes"""
+    job = get_user_job(db, current_user.id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if job.status in TERMINAL_STAGES and not progress_bus.has_channel(job_id):
+        # Finished before this process saw it (e.g. after a restart): just report the outcome
+        progress_bus.publish(job_id, ProgressEvent(stage=job.status, message=job.error))
+
+    return StreamingResponse(
+        sse_stream(progress_bus.subscribe(job_id)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+def cancel_user_job(
+    job_id: int,
+    current_user: CurrentUser = Depends(user_rate_limit("read")),
     db: Session = Depends(get_db)
 ):
-    videos = db.query(Video).filter(Video.user_id == current_user.id).all()
-    
-    response = []
-    for video in videos:
-        # Generate signed URL (expires in 1 hour)
-        signed_url = supabase.storage.from_("videos").get_public_url(video.video_path)
-        
-        response.append({
-            "title": video.title,
-            "scene_plan": video.scene_plan,
-            "video_url": signed_url,
-            "manim_code": video.manim_code
-        })
-    
-    return response
+    job = get_user_job(db, current_user.id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_response(cancel_job(db, job))
+
+
+@router.get("/myvideos", response_model=VideoPage)
+async def get_user_videos(
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user: CurrentUser = Depends(user_rate_limit("read")),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        items, next_cursor = await list_user_videos(db, current_user.id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/videos/{video_id}", response_model=VideoResponse)
+async def get_user_video(
+    video_id: int,
+    current_user: CurrentUser = Depends(user_rate_limit("read")),
+    db: AsyncSession = Depends(get_async_db)
+):
+    video = (await db.execute(
+        select(Video).options(*VIDEO_CONTENT).where(Video.id == video_id, Video.user_id == current_user.id)
+    )).scalars().first()
+    if video is None:
+        raise HTTPException(status_code=404, detail="Video not found")
+    return video_to_response(video)
+
+
+
+
+@router.get("/videos/{video_id}/stream")
+async def stream_video(
+    video_id: int,
+    request: Request,
+    current_user: CurrentUser = Depends(user_rate_limit("read")),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """The video file itself, with Range support so players can seek without downloading everything"""
+    video_path = (await db.execute(
+        select(Video.video_path).where(Video.id == video_id, Video.user_id == current_user.id)
+    )).scalar()
+    await db.close()
+    if video_path is None:
+        raise HTTPException(status_code=404, detail="Video not found")
 
+    headers = {"ETag": video_etag(video_path), "Cache-Control": "private, max-age=86400"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
+    try:
+        path = await run_in_threadpool(storage.streaming_path, video_path)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Could not fetch video: {e}")
+    return FileResponse(path, headers=headers, media_type=f"video/{os.path.splitext(video_path)[1][1:] or 'mp4'}")
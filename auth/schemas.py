@@ -16,12 +16,55 @@ class VideoCreate(VideoBase):
 
 class VideoResponse(VideoBase):
     """Response model with URL instead of binary data"""
-    manim_code : str
+    id: Optional[int] = None
+    # None for videos stored before content_blobs until migrations/007_convert_video_blobs.py has run
+    manim_code : Optional[str] = None
     video_url: HttpUrl  # URL to access the video
-    scene_plan : str
+    scene_plan : Optional[str] = None
     title : str
+    quality: Optional[str] = None  # Render profile; "draft" until a two-phase final render lands
+    poster_url: Optional[HttpUrl] = None
+    sprite_url: Optional[HttpUrl] = None  # SPRITE_FRAMES evenly spaced frames, SPRITE_COLUMNS per row
+    hls_url: Optional[HttpUrl] = None
 
 
+    class Config:
+        orm_mode = True
+
+class VideoSummary(BaseModel):
+    """List entry without the large scene_plan / manim_code columns"""
+    id: int
+    title: str
+    quality: Optional[str] = None
+    created_at: Optional[datetime] = None
+    video_url: HttpUrl
+    poster_url: Optional[HttpUrl] = None  # For the grid, so it doesn't have to load whole videos
+
+    class Config:
+        orm_mode = True
+
+class VideoPage(BaseModel):
+    items: List[VideoSummary]
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= for the next page; None on the last page
+
+# --- Render Job Schemas ---
+
+class JobResponse(BaseModel):
+    """Status of a queued /generatetopic render job"""
+    id: int
+    topic: str
+    status: str  # queued / running / succeeded / failed / cancelled
+    quality: Optional[str] = None
+    two_phase: bool = False
+    candidates: Optional[int] = None
+    max_parallel_renders: Optional[int] = None
+    stage: Optional[str] = None  # planning / codegen / validate / render / correction N / upload
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    video: Optional[VideoResponse] = None  # Filled in once the job has succeeded
+
     class Config:
         orm_mode = True
 
@@ -0,0 +1,381 @@
+import asyncio
+import base64
+import hashlib
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import quote
+import httpx
+from Model.metrics import UPLOAD_BYTES, UPLOAD_THROUGHPUT, span
+
+# supabase | local
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+STORAGE_BUCKET = os.getenv("STORAGE_BUCKET", "videos")
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", "media/storage")
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:8000/storage")
+
+STORAGE_UPLOAD_RETRIES = int(os.getenv("STORAGE_UPLOAD_RETRIES", "3"))
+# Files above this go through the resumable (TUS) endpoint in STORAGE_CHUNK_MB parts
+STORAGE_RESUMABLE_THRESHOLD_MB = float(os.getenv("STORAGE_RESUMABLE_THRESHOLD_MB", "6"))
+STORAGE_CHUNK_MB = int(os.getenv("STORAGE_CHUNK_MB", "6"))  # Supabase requires 6 MB TUS chunks
+# Delete the local render once it is safely in storage (it moves to the hot cache instead when that is on)
+STORAGE_DELETE_LOCAL = os.getenv("STORAGE_DELETE_LOCAL", "1") == "1"
+
+# On-disk LRU of recently rendered / watched videos served by /auth/videos/{id}/stream
+HOT_VIDEO_CACHE_DIR = os.getenv("HOT_VIDEO_CACHE_DIR", "media/hot_videos")
+HOT_VIDEO_CACHE_MB = int(os.getenv("HOT_VIDEO_CACHE_MB", "2048"))  # 0 disables the cache
+
+
+class StorageError(Exception):
+    pass
+
+
+class UploadStats:
+    """Counters behind /auth/storage/stats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.failures = 0
+        self.retries = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def record(self, size: int, seconds: float, retries: int, ok: bool):
+        with self._lock:
+            self.retries += retries
+            if ok:
+                self.uploads += 1
+                self.bytes += size
+                self.seconds += seconds
+            else:
+                self.failures += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "uploads": self.uploads,
+                "failures": self.failures,
+                "retries": self.retries,
+                "bytes": self.bytes,
+                "seconds": round(self.seconds, 3),
+                "throughput_mb_per_s": round(self.bytes / self.seconds / 1e6, 3) if self.seconds else 0.0,
+            }
+
+
+class HotVideoCache:
+    """
+    Size-bounded LRU of videos on local disk, keyed by storage key.
+
+    Files are named by a hash of the key and are immutable once written (storage keys
+    are unique per render), so readers can stream them without holding the lock.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest() + os.path.splitext(key)[1])
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def adopt(self, key: str, path: str):
+        """Move a local file (e.g. a just-uploaded render) into the cache"""
+        os.makedirs(self.directory, exist_ok=True)
+        os.replace(path, self._path(key))
+        self._evict()
+
+    def fetch(self, key: str, backend: "StorageBackend") -> str:
+        """Cached path for key, downloading it from the backend on a miss"""
+        path = self.get(key)
+        if path is not None:
+            self.hits += 1
+            return path
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+        # Concurrent misses for the same video download it once
+        with fetch_lock:
+            path = self.get(key)
+            if path is None:
+                self.misses += 1
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(key)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                try:
+                    backend.download(key, tmp)
+                    os.replace(tmp, path)
+                finally:
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+                self._evict()
+            else:
+                self.hits += 1
+        with self._lock:
+            self._fetch_locks.pop(key, None)
+        return path
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                # Unlinking is safe for responses still streaming the file
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+hot_videos = HotVideoCache(HOT_VIDEO_CACHE_DIR, HOT_VIDEO_CACHE_MB * 1024 * 1024)
+
+
+class StorageBackend:
+    """
+    Where rendered videos live. Subclasses implement _put / download / remove / public_url;
+    upload() adds retries, throughput metrics and cleanup of the local file.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.stats = UploadStats()
+
+    def _put(self, key: str, path: str, content_type: str, resume: dict):
+        """
+        Store path under key. `resume` is kept across the retries of one upload, for backends
+        that can continue a partial upload instead of starting over.
+        """
+        raise NotImplementedError
+
+    def download(self, key: str, path: str):
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Path of the stored file if this backend keeps it on local disk"""
+        return None
+
+    def remove(self, keys: List[str]):
+        raise NotImplementedError
+
+    def public_url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def streaming_path(self, key: str) -> str:
+        """Local file to serve key from: the backend's own copy, else the hot cache"""
+        return self.local_path(key) or hot_videos.fetch(key, self)
+
+    def upload(self, key: str, path: str, content_type: str = "video/mp4", delete_local: Optional[bool] = None,
+               cache_hot: bool = False):
+        """cache_hot moves the local file into the hot cache instead of deleting it (the playable video only)"""
+        size = os.path.getsize(path)
+        started = time.perf_counter()
+        retries = 0
+        resume = {}
+        with span("upload", backend=self.name, bytes=size) as upload_span:
+            while True:
+                try:
+                    self._put(key, path, content_type, resume)
+                    break
+                except Exception as e:
+                    if retries >= STORAGE_UPLOAD_RETRIES:
+                        self.stats.record(size, time.perf_counter() - started, retries, ok=False)
+                        raise StorageError(f"Upload of {key} failed: {e}") from e
+                    retries += 1
+                    print(f" Upload of {key} failed ({e}), retry {retries}/{STORAGE_UPLOAD_RETRIES}")
+                    time.sleep(0.5 * 2 ** (retries - 1))
+            upload_span.attributes["retries"] = retries
+
+        elapsed = time.perf_counter() - started
+        self.stats.record(size, elapsed, retries, ok=True)
+        UPLOAD_BYTES.inc(size, backend=self.name)
+        if elapsed > 0:
+            UPLOAD_THROUGHPUT.observe(size / elapsed, backend=self.name)
+        print(f" Uploaded {key}: {size / 1e6:.1f} MB in {elapsed:.2f}s")
+        if STORAGE_DELETE_LOCAL if delete_local is None else delete_local:
+            try:
+                if cache_hot and hot_videos.enabled and self.local_path(key) is None:
+                    # First views of a fresh render then skip the storage round trip
+                    hot_videos.adopt(key, path)
+                else:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    async def aupload(self, key: str, path: str, content_type: str = "video/mp4",
+                      delete_local: Optional[bool] = None, cache_hot: bool = False):
+        # The clients are blocking; a thread lets the upload overlap with other awaits (e.g. the DB insert)
+        await asyncio.to_thread(self.upload, key, path, content_type, delete_local, cache_hot)
+
+
+class SupabaseStorage(StorageBackend):
+    name = "supabase"
+
+    def __init__(self, url: str, key: str, bucket: str):
+        super().__init__()
+        self.url = (url or "").rstrip("/")
+        self.key = key
+        self.bucket = bucket
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created on first use rather than at import time
+        with self._client_lock:
+            if self._client is None:
+                from supabase import create_client
+                self._client = create_client(self.url, self.key)
+            return self._client
+
+    def _put(self, key: str, path: str, content_type: str, resume: dict):
+        if os.path.getsize(path) > STORAGE_RESUMABLE_THRESHOLD_MB * 1024 * 1024:
+            self._put_resumable(key, path, content_type, resume)
+        else:
+            self.client.storage.from_(self.bucket).upload(key, path, {"content-type": content_type, "upsert": "true"})
+
+    def _put_resumable(self, key: str, path: str, content_type: str, resume: dict):
+        """
+        TUS upload in STORAGE_CHUNK_MB chunks. The upload URL is kept in `resume`, so when
+        upload() retries after a failed chunk it continues from the offset the server reports
+        instead of restarting the whole file.
+
+        Supabase's TUS endpoint has no concatenation extension, so chunks of one file go
+        in order; parallelism comes from concurrent uploads of different files.
+        """
+        size = os.path.getsize(path)
+        chunk_size = STORAGE_CHUNK_MB * 1024 * 1024
+        headers = {"Authorization": f"Bearer {self.key}", "apikey": self.key, "Tus-Resumable": "1.0.0"}
+
+        def b64(value: str) -> str:
+            return base64.b64encode(value.encode()).decode()
+
+        with httpx.Client(timeout=60) as http:
+            location, offset = resume.get("location"), 0
+            if location is not None:
+                head = http.head(location, headers=headers)
+                if head.is_success:
+                    offset = int(head.headers["Upload-Offset"])
+                else:
+                    location = None  # Expired or unknown upload, start a new one
+            if location is None:
+                created = http.post(f"{self.url}/storage/v1/upload/resumable", headers={
+                    **headers,
+                    "Upload-Length": str(size),
+                    "Upload-Metadata": f"bucketName {b64(self.bucket)},objectName {b64(key)},contentType {b64(content_type)}",
+                    "x-upsert": "true",
+                })
+                created.raise_for_status()
+                location = resume["location"] = created.headers["Location"]
+
+            with open(path, "rb") as f:
+                while offset < size:
+                    f.seek(offset)
+                    response = http.patch(location, content=f.read(chunk_size), headers={
+                        **headers,
+                        "Upload-Offset": str(offset),
+                        "Content-Type": "application/offset+octet-stream",
+                    })
+                    response.raise_for_status()
+                    offset = int(response.headers["Upload-Offset"])
+
+    def download(self, key: str, path: str):
+        # Streamed to disk so large renders aren't held in memory
+        with httpx.stream("GET", self.public_url(key), timeout=60) as response:
+            response.raise_for_status()
+            with open(path, "wb") as f:
+                for chunk in response.iter_bytes(1024 * 1024):
+                    f.write(chunk)
+
+    def remove(self, keys: List[str]):
+        self.client.storage.from_(self.bucket).remove(keys)
+
+    def public_url(self, key: str) -> str:
+        # Same URL get_public_url() returns, built without a client call per row
+        return f"{self.url}/storage/v1/object/public/{self.bucket}/{quote(key)}"
+
+
+class LocalStorage(StorageBackend):
+    """Filesystem stand-in for tests, benchmarks and offline development"""
+
+    name = "local"
+
+    def __init__(self, root: str, base_url: str):
+        super().__init__()
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def path_for(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise StorageError(f"Invalid storage key {key!r}")
+        return path
+
+    def _put(self, key: str, path: str, content_type: str, resume: dict):
+        target = self.path_for(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Copied next to the target and renamed, so readers never see a partial file
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+
+    def download(self, key: str, path: str):
+        shutil.copyfile(self.path_for(key), path)
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self.path_for(key)
+        return path if os.path.exists(path) else None
+
+    def remove(self, keys: List[str]):
+        for key in keys:
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+
+    def public_url(self, key: str) -> str:
+        return f"{self.base_url}/{quote(key)}"
+
+
+def create_storage(name: str = STORAGE_BACKEND) -> StorageBackend:
+    if name == "supabase":
+        return SupabaseStorage(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"), STORAGE_BUCKET)
+    if name == "local":
+        return LocalStorage(LOCAL_STORAGE_DIR, LOCAL_STORAGE_URL)
+    raise ValueError(f"Unknown storage backend {name!r}")
+
+
+storage = create_storage()
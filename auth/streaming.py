@@ -0,0 +1,13 @@
+import hashlib
+
+
+def video_etag(storage_key: str) -> str:
+    # Storage keys are unique per render and never rewritten, so the key identifies the bytes
+    return f'"{hashlib.sha256(storage_key.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in candidates or f"W/{etag}" in candidates
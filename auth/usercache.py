@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+from pydantic import BaseModel
+from sqlalchemy import event
+from auth.dbmodel import User as DBUser
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+
+class CurrentUser(BaseModel):
+    """What authenticated routes get from get_current_user: enough to scope queries, no ORM state"""
+    id: int
+    username: str
+
+
+class UserCache:
+    """
+    Size-bounded TTL cache from verified token claims to CurrentUser snapshots.
+
+    Per process only; the TTL bounds how long another process' user changes can go unseen.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (user, expires_at)
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[0]
+            self._misses += 1
+            return None
+
+    def put(self, key: Hashable, user: CurrentUser):
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in [k for k, (user, _) in self._entries.items() if user.id == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "db_queries_saved": self._hits,
+            }
+
+
+user_cache = UserCache(USER_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES)
+
+
+@event.listens_for(DBUser, "after_update")
+@event.listens_for(DBUser, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    user_cache.invalidate_user(target.id)
@@ -0,0 +1,383 @@
+"""
+End-to-end benchmark of the FastAPI app from main.py, run in-process against a throwaway
+SQLite database, the fake LLM backend (replaying recorded plan/code/fix responses) and
+local storage.
+
+    python -m benchmarks.api_benchmark --output run.json
+    python -m benchmarks.api_benchmark --llm-latency 0.5 --baseline run.json --max-regression 0.2
+
+Scenarios:
+    auth      signup and login (dominated by the bcrypt cost)
+    myvideos  first page and a full cursor walk at several library sizes
+    generate  /generatetopic at several concurrency levels
+    render    the fixed scenes from benchmarks/sample_scenes.py, without the API around them
+              (--section-parallelism N renders their "# Scene" sections N at a time)
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.sample_scenes import SAMPLE_SCENES
+
+SCENARIOS = ["auth", "myvideos", "generate", "render"]
+# Rate limits and admission control sized so the benchmark measures the pipeline, not 429s
+BENCHMARK_RATE_LIMIT = "1000000"
+BENCHMARK_GENERATION_CONCURRENCY = "64"
+# Shed responses (rate limited / overloaded); counted apart from errors and not timed
+REJECTED_STATUSES = (429, 503)
+# Compared against the baseline; higher is worse for latencies, lower is worse for throughput
+LATENCY_KEYS = ("p50", "p95", "p99")
+THROUGHPUT_KEYS = ("throughput_per_s",)
+
+
+def configure_environment(work_dir: str, scene: str, llm_latency: float, responses: str = None,
+                          section_parallelism: int = 0):
+    """Must run before anything from the app is imported: those modules read their config at import time"""
+    if responses is None:
+        responses = os.path.join(work_dir, "fake_responses.json")
+        with open(responses, "w", encoding="utf-8") as f:
+            json.dump({
+                "ScenePlan": [{"scene": f"Benchmark plan for {scene}", "scene_class_name": scene}],
+                "ManimCodeResponse": [{"code": SAMPLE_SCENES[scene], "explanation": "Benchmark", "error_fixes": []}],
+                "ManimErrorCorrectionResponse": [{"fixed_code": SAMPLE_SCENES[scene], "explanation": "Benchmark",
+                                                  "changes_made": []}],
+            }, f)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'benchmark.db')}",
+        "ASYNC_DATABASE_URL": "",
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_RESPONSES": responses,
+        "FAKE_LLM_LATENCY_SECONDS": str(llm_latency),
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_DIR": os.path.join(work_dir, "storage"),
+        "HOT_VIDEO_CACHE_DIR": os.path.join(work_dir, "hot_videos"),
+        "RENDER_OUTPUT_DIR": os.path.join(work_dir, "renders"),
+        "TOPIC_CACHE_DIR": os.path.join(work_dir, "topic_cache"),
+        "SECTION_CACHE_DIR": os.path.join(work_dir, "section_cache"),
+        # Every request renders: no paraphrase hits, no section reuse between identical programs
+        "TOPIC_SIMILARITY_THRESHOLD": "2",
+        "MANIM_SECTION_RENDERING": "1" if section_parallelism else "0",
+        "MANIM_SECTION_PARALLELISM": str(section_parallelism or 1),
+        "GENERATION_MAX_CONCURRENT": BENCHMARK_GENERATION_CONCURRENCY,
+        "GENERATION_MAX_QUEUE": BENCHMARK_GENERATION_CONCURRENCY,
+        "GENERATION_QUEUE_TIMEOUT_SECONDS": "3600",
+        **{f"RATE_{budget}_{setting}": BENCHMARK_RATE_LIMIT
+           for budget in ("GENERATE", "JOBS", "AUTH", "READ", "BATCH") for setting in ("PER_MINUTE", "BURST")},
+    })
+
+
+def percentile(ordered, p: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))]
+
+
+def summarize(samples, wall_seconds: float = None, errors: int = 0) -> dict:
+    summary = {"requests": len(samples) + errors, "errors": errors}
+    if samples:
+        ordered = sorted(samples)
+        summary.update({
+            "mean": statistics.mean(samples),
+            "p50": percentile(ordered, 50),
+            "p95": percentile(ordered, 95),
+            "p99": percentile(ordered, 99),
+            "max": ordered[-1],
+        })
+    if wall_seconds:
+        summary["throughput_per_s"] = len(samples) / wall_seconds
+    return summary
+
+
+async def run_load(make_request, total: int, concurrency: int) -> dict:
+    """Issue `total` requests, at most `concurrency` in flight; latency of the successful ones"""
+    slots = asyncio.Semaphore(concurrency)
+    latencies, failures = [], []
+    rejected = 0
+
+    async def one(index: int):
+        nonlocal rejected
+        async with slots:
+            start = time.perf_counter()
+            try:
+                response = await make_request(index)
+                ok = response.status_code < 400
+            except Exception as e:
+                response, ok = e, False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            elif getattr(response, "status_code", None) in REJECTED_STATUSES:
+                rejected += 1
+            else:
+                failures.append(response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(total)))
+    summary = summarize(latencies, time.perf_counter() - start, len(failures))
+    summary["requests"] += rejected
+    summary["rejected"] = rejected
+    summary["concurrency"] = concurrency
+    if failures:
+        first = failures[0]
+        summary["first_error"] = f"{first.status_code}: {first.text[:200]}" if hasattr(first, "status_code") \
+            else repr(first)
+    return summary
+
+
+async def signup(client, name: str) -> str:
+    response = await client.post("/auth/signup", json={"username": name, "email": f"{name}@bench.local",
+                                                       "password": "benchmark-password"})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def bench_auth(client, args) -> dict:
+    from auth.routes import pwd_context
+
+    names = [f"auth_{uuid.uuid4().hex[:10]}" for _ in range(args.auth_requests)]
+    signups = await run_load(
+        lambda i: client.post("/auth/signup", json={"username": names[i], "email": f"{names[i]}@bench.local",
+                                                    "password": "benchmark-password"}),
+        args.auth_requests, args.auth_concurrency)
+    logins = await run_load(
+        lambda i: client.post("/auth/login", json={"email": f"{names[i]}@bench.local",
+                                                   "password": "benchmark-password"}),
+        args.auth_requests, args.auth_concurrency)
+    return {
+        "bcrypt_rounds": getattr(pwd_context.handler("bcrypt"), "default_rounds", None),
+        "signup": signups,
+        "login": logins,
+    }
+
+
+def seed_library(user_id: int, size: int):
+    from auth.dbmodel import Video
+    from database import SessionLocal
+
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        db.add_all([
+            Video(user_id=user_id, title=f"Benchmark video {index}", scene_plan="plan", manim_code="code",
+                  video_path=f"{user_id}/bench_{index}.mp4", quality="low",
+                  created_at=now - timedelta(seconds=index))
+            for index in range(size)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+async def bench_myvideos(client, args) -> dict:
+    from jose import jwt
+    from auth.config import SECRET_KEY, ALGORITHM
+
+    results = {}
+    for size in args.library_sizes:
+        token = await signup(client, f"lib_{size}_{uuid.uuid4().hex[:8]}")
+        headers = {"Authorization": f"Bearer {token}"}
+        seed_library(jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])["uid"], size)
+
+        first_page = await run_load(lambda i: client.get("/auth/myvideos", params={"limit": args.page_size},
+                                                         headers=headers),
+                                    args.requests, args.concurrency)
+
+        start, pages, cursor = time.perf_counter(), 0, None
+        while True:
+            params = {"limit": args.page_size, **({"cursor": cursor} if cursor else {})}
+            response = await client.get("/auth/myvideos", params=params, headers=headers)
+            response.raise_for_status()
+            pages += 1
+            cursor = response.json()["next_cursor"]
+            if not cursor:
+                break
+        results[str(size)] = {
+            "first_page": first_page,
+            "full_walk": {"pages": pages, "seconds": time.perf_counter() - start},
+        }
+    return results
+
+
+async def bench_generate(client, args) -> dict:
+    token = await signup(client, f"gen_{uuid.uuid4().hex[:8]}")
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+    for concurrency in args.generate_concurrency:
+        results[str(concurrency)] = await run_load(
+            # Unique topics so nothing is served from the topic cache
+            lambda i: client.post("/auth/generatetopic", headers=headers,
+                                  json={"topic": f"benchmark {uuid.uuid4().hex}", "quality": args.quality}),
+            args.generate_requests, concurrency)
+    return results
+
+
+def bench_render(args) -> dict:
+    from Model.langchain import execute_manim_code
+    from Model.profiles import get_render_profile
+
+    profile = get_render_profile(args.quality)
+    results = {}
+    for name, code in SAMPLE_SCENES.items():
+        timings, errors = [], 0
+        for _ in range(args.render_runs):
+            # Every run renders all sections
+            shutil.rmtree(os.environ["SECTION_CACHE_DIR"], ignore_errors=True)
+            start = time.perf_counter()
+            result = execute_manim_code(code, name, profile=profile)
+            elapsed = time.perf_counter() - start
+            if result.error or not result.video_path:
+                errors += 1
+                continue
+            timings.append(elapsed)
+            os.remove(result.video_path)
+        results[name] = summarize(timings, errors=errors)
+    return results
+
+
+async def run_api_scenarios(args) -> dict:
+    if not set(args.scenarios) & {"auth", "myvideos", "generate"}:
+        return {}
+    import httpx
+    from database import Base, get_engine
+    import auth.dbmodel  # noqa: F401  (registers the tables)
+    from main import app
+
+    Base.metadata.create_all(bind=get_engine())
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        if "auth" in args.scenarios:
+            print(" Benchmarking signup/login...")
+            results["auth"] = await bench_auth(client, args)
+        if "myvideos" in args.scenarios:
+            print(" Benchmarking /myvideos...")
+            results["myvideos"] = await bench_myvideos(client, args)
+        if "generate" in args.scenarios:
+            print(" Benchmarking /generatetopic...")
+            results["generate"] = await bench_generate(client, args)
+    return results
+
+
+def flatten(results: dict, prefix: str = ""):
+    for key, value in results.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, path)
+        else:
+            yield path, value
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list:
+    """Metrics that got worse than the baseline by more than max_regression (a fraction)"""
+    current = dict(flatten(results["scenarios"]))
+    regressions = []
+    for path, before in flatten(baseline["scenarios"]):
+        after = current.get(path)
+        metric = path.rsplit(".", 1)[-1]
+        if not isinstance(before, (int, float)) or not isinstance(after, (int, float)) or before <= 0:
+            continue
+        change = (after - before) / before
+        if metric in LATENCY_KEYS:
+            worse = change > max_regression
+        elif metric in THROUGHPUT_KEYS:
+            worse = -change > max_regression
+        else:
+            continue
+        print(f" {'REGRESSION' if worse else 'ok':10} {path}: {before:.4f} -> {after:.4f} ({change:+.1%})")
+        if worse:
+            regressions.append({"metric": path, "baseline": before, "current": after, "change": change})
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value: str):
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), default=SCENARIOS,
+                        help=f"Comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per /myvideos measurement")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrency for /myvideos")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--library-sizes", type=int_list, default=[10, 100, 1000])
+    parser.add_argument("--auth-requests", type=int, default=20)
+    parser.add_argument("--auth-concurrency", type=int, default=4)
+    parser.add_argument("--generate-requests", type=int, default=8)
+    parser.add_argument("--generate-concurrency", type=int_list, default=[1, 4])
+    parser.add_argument("--render-runs", type=int, default=3)
+    parser.add_argument("--section-parallelism", type=int, default=0,
+                        help="Render sections of a scene this many at a time (0: whole scenes, no sections)")
+    parser.add_argument("--quality", default="draft", help="Render profile for generate/render")
+    parser.add_argument("--scene", default="SampleShapes", choices=sorted(SAMPLE_SCENES),
+                        help="Scene the fake LLM answers with")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per fake LLM call")
+    parser.add_argument("--responses", help="Recorded fake LLM responses (JSON, see Model/llm.py)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against the results JSON of an earlier run")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline before exiting non-zero (fraction)")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    work_dir = tempfile.mkdtemp(prefix="manim-bench-")
+    configure_environment(work_dir, args.scene, args.llm_latency, args.responses, args.section_parallelism)
+    try:
+        scenarios = asyncio.run(run_api_scenarios(args))
+        if "render" in args.scenarios:
+            print(" Benchmarking sample scene renders...")
+            scenarios["render"] = bench_render(args)
+    finally:
+        from Model.render_pool import render_pool
+        render_pool.stop()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "keep")},
+        "scenarios": scenarios,
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n Comparing against {args.baseline} (commit {baseline.get('commit')}):")
+        results["regressions"] = compare(results, baseline, args.max_regression)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Cold `python -m manim` subprocess vs warm render pool on a fixed sample scene.
+
+    python -m benchmarks.render_pool_benchmark --runs 5 --workers 1 --output pool.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.sample_scenes import SAMPLE_SCENES
+from Model.render_pool import WarmRenderPool
+from Model.profiles import get_render_profile
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "runs": len(samples),
+        "mean": statistics.mean(samples),
+        "p50": ordered[len(ordered) // 2],
+        "min": ordered[0],
+        "max": ordered[-1],
+    }
+
+
+def cold_render(code: str, scene_class_name: str) -> float:
+    work_dir = tempfile.mkdtemp(prefix="manim-cold-")
+    try:
+        file_path = os.path.join(work_dir, f"{scene_class_name}.py")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(code)
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-m", "manim", *get_render_profile("low").cli_args(),
+             "--media_dir", os.path.join(work_dir, "media"), file_path, scene_class_name],
+            capture_output=True, text=True
+        )
+        elapsed = time.perf_counter() - start
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr)
+        return elapsed
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def warm_render(pool: WarmRenderPool, code: str, scene_class_name: str) -> float:
+    start = time.perf_counter()
+    result = pool.render(code, scene_class_name, scene_class_name, profile=get_render_profile("low"))
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(result.media_dir, ignore_errors=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scene", default="SampleShapes", choices=sorted(SAMPLE_SCENES))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    code = SAMPLE_SCENES[args.scene]
+
+    cold = [cold_render(code, args.scene) for _ in range(args.runs)]
+
+    pool = WarmRenderPool(size=args.workers)
+    start = time.perf_counter()
+    pool.start()
+    for worker in list(pool._workers):
+        worker.wait_ready()
+    pool_startup = time.perf_counter() - start
+    try:
+        # The first render also pays for font/LaTeX caches inside the worker
+        warm_render(pool, code, args.scene)
+        warm = [warm_render(pool, code, args.scene) for _ in range(args.runs)]
+    finally:
+        pool.stop()
+
+    results = {
+        "scene": args.scene,
+        "cold_seconds": summarize(cold),
+        "warm_seconds": summarize(warm),
+        "pool_startup_seconds": pool_startup,
+        "speedup_p50": summarize(cold)["p50"] / summarize(warm)["p50"],
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# Fixed Manim scenes used by the render benchmarks, written the way generate_code is
+# prompted to write them (one class, "# Scene N" sections inside construct()).
+
+SAMPLE_SCENES = {
+    "SampleShapes": '''from manim import *
+
+class SampleShapes(Scene):
+    def construct(self):
+        # Scene 1: Introduction
+        title = Text("Shapes", font_size=36).to_edge(UP)
+        self.play(Write(title))
+        # Scene 2: Circle to square
+        circle = Circle(color=BLUE)
+        square = Square(color=GREEN)
+        self.play(Create(circle))
+        self.play(Transform(circle, square))
+        # Scene 3: Summary
+        note = Text("A circle became a square", font_size=24).to_edge(DOWN)
+        self.play(FadeIn(note))
+        self.wait(0.5)
+''',
+    "SampleMotion": '''from manim import *
+
+class SampleMotion(Scene):
+    def construct(self):
+        # Scene 1: Introduction
+        title = Text("Motion", font_size=36).to_edge(UP)
+        self.play(Write(title))
+        # Scene 2: A group moving together
+        dots = VGroup(*[Dot(color=YELLOW) for _ in range(5)]).arrange(RIGHT, buff=0.5)
+        self.play(FadeIn(dots))
+        self.play(dots.animate.shift(DOWN * 2), run_time=1)
+        self.play(Rotate(dots, PI / 2))
+        # Scene 3: Summary
+        note = Text("Groups move as one", font_size=24).to_edge(DOWN)
+        self.play(FadeIn(note), FadeOut(dots))
+        self.wait(0.5)
+''',
+}
@@ -0,0 +1,140 @@
+"""
+Cold-start benchmark: each run is a fresh interpreter that imports main.py, runs the app's
+lifespan startup and answers /ready, against a throwaway SQLite database and the fake LLM.
+One extra run under `python -X importtime` reports the slowest imports.
+
+    python -m benchmarks.startup_benchmark --output startup.json
+    python -m benchmarks.startup_benchmark --baseline startup.json --max-regression 0.2
+
+Measurements (seconds):
+    process   interpreter start to the first /ready response, as seen by the parent
+    import    `import main`
+    startup   lifespan startup (render pool, job workers)
+    ready     first /ready request, including the first database connection
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.api_benchmark import compare, configure_environment, git_commit, summarize
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ["process", "import", "startup", "ready"]
+
+# Runs in the child; prints one JSON line with its phase timings
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def run():
+    import httpx
+    async with main.app.router.lifespan_context(main.app):
+        up = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            response = await client.get("/ready")
+        done = time.perf_counter()
+    return up, done, response.status_code
+
+up, done, status_code = asyncio.run(run())
+print(json.dumps({"import": imported - started, "startup": up - imported, "ready": done - up,
+                  "status": status_code}))
+"""
+
+
+def run_child(env: dict) -> dict:
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Startup run failed:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process"] = elapsed
+    return timings
+
+
+def slowest_imports(env: dict, top: int) -> list:
+    """Modules by cumulative import time (microseconds in -X importtime, reported in seconds)"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=REPO_ROOT, env=env,
+                            capture_output=True, text=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line.split(":", 1)[1].split("|")]
+        if not self_us.isdigit():
+            continue  # Header line
+        modules.append({"module": name, "self": int(self_us) / 1e6, "cumulative": int(cumulative_us) / 1e6})
+    modules.sort(key=lambda module: module["cumulative"], reverse=True)
+    return modules[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Fresh interpreters to start")
+    parser.add_argument("--top-imports", type=int, default=20, help="Slowest imports to report")
+    parser.add_argument("--warm-pool", action="store_true", help="Start the Manim warm render pool too")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against the results JSON of an earlier run")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed slowdown against the baseline before exiting non-zero (fraction)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="manim-startup-bench-")
+    try:
+        configure_environment(work_dir, "SampleShapes", 0.0)
+        env = dict(os.environ, MANIM_WARM_POOL="1" if args.warm_pool else "0", STARTUP_WARMUP="0")
+        samples = {phase: [] for phase in PHASES}
+        errors = 0
+        for run in range(args.runs):
+            timings = run_child(env)
+            print(f" Run {run + 1}/{args.runs}: " + ", ".join(f"{phase} {timings[phase]:.3f}s" for phase in PHASES))
+            if timings["status"] != 200:
+                errors += 1
+            for phase in PHASES:
+                samples[phase].append(timings[phase])
+        imports = slowest_imports(env, args.top_imports)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "started_at": datetime.utcnow().isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "scenarios": {
+            "startup": {phase: summarize(samples[phase], errors=errors if phase == "ready" else 0)
+                        for phase in PHASES},
+        },
+        "slowest_imports": imports,
+    }
+    print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n Comparing against {args.baseline} (commit {baseline.get('commit')}):")
+        results["regressions"] = compare(results, baseline, args.max_regression)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,146 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import threading
+import time
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from dotenv import load_dotenv
 import os
+from Model.metrics import registry
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+# Pool settings, shared by the sync engine (render workers) and the async engine (routes)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # Seconds; stay under server/proxy idle timeouts
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+# Async drivers for the URL schemes we use
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def _pool_options(url: str) -> dict:
+    # SQLite uses a single-file pool without size/overflow settings
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (async_database_url(DATABASE_URL) if DATABASE_URL else None)
+
+DB_QUERY_SECONDS = registry.histogram("db_query_seconds", "Statement execution time", ["engine"])
+DB_POOL_CONNECTIONS = registry.gauge("db_pool_connections", "Pool connections by state", ["engine", "state"])
+
+
+def _instrument(sync_engine, name: str):
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        DB_QUERY_SECONDS.observe(time.perf_counter() - conn.info["query_started"].pop(), engine=name)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _failed(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+# Engines are created on first use: importing the app needs neither a reachable database nor
+# the async driver stack, and processes that only use one engine never build the other
+_engines = {}
+_engines_lock = threading.Lock()
+_session_factories = {}
+_session_factories_lock = threading.Lock()  # Separate from _engines_lock, which get_engine() takes
+
+
+def get_engine():
+    with _engines_lock:
+        if "sync" not in _engines:
+            if not DATABASE_URL:
+                raise RuntimeError("DATABASE_URL is not set")
+            _engines["sync"] = create_engine(DATABASE_URL, **_pool_options(DATABASE_URL))
+            _instrument(_engines["sync"], "sync")
+        return _engines["sync"]
+
+
+def get_async_engine():
+    with _engines_lock:
+        if "async" not in _engines:
+            if not ASYNC_DATABASE_URL:
+                raise RuntimeError("DATABASE_URL is not set")
+            from sqlalchemy.ext.asyncio import create_async_engine
+            _engines["async"] = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL))
+            _instrument(_engines["async"].sync_engine, "async")
+        return _engines["async"]
+
+
+def SessionLocal() -> Session:
+    with _session_factories_lock:
+        if "sync" not in _session_factories:
+            _session_factories["sync"] = sessionmaker(bind=get_engine(), autocommit=False, autoflush=False)
+        factory = _session_factories["sync"]
+    return factory()
+
+
+def AsyncSessionLocal():
+    with _session_factories_lock:
+        if "async" not in _session_factories:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+            _session_factories["async"] = async_sessionmaker(bind=get_async_engine(), autoflush=False,
+                                                             expire_on_commit=False)
+        factory = _session_factories["async"]
+    return factory()
+
+
+def __getattr__(name: str):
+    # `engine` and `async_engine` used to be built at import time; still importable, built on access
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def check_database():
+    """Round trip to the database; raises if it isn't reachable (readiness checks)"""
+    with get_engine().connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def _collect_pool_usage():
+    with _engines_lock:
+        engines = list(_engines.items())
+    for name, current in engines:
+        pool = current.pool
+        # SQLite's pools don't track size/overflow
+        for state, attr in (("checked_out", "checkedout"), ("idle", "checkedin"), ("size", "size"),
+                            ("overflow", "overflow")):
+            if hasattr(pool, attr):
+                DB_POOL_CONNECTIONS.set(getattr(pool, attr)(), engine=name, state=state)
+
+
+registry.add_collector(_collect_pool_usage)
 
 Base = declarative_base()
 def get_db():
@@ -16,4 +148,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
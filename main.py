@@ -1,8 +1,69 @@
-from fastapi import FastAPI
+import time
+_import_started = time.perf_counter()
+
+import os
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from auth.routes import router as auth_router
+from auth.jobs import worker_pool
+from auth.storage import LocalStorage, storage
+from Model.render_pool import MANIM_WARM_POOL, render_pool
+from Model.metrics import HTTP_REQUEST_SECONDS, registry, trace
+from Model.postprocess import postprocessor
+from database import check_database
+
+# Build the LangChain prompts and LLM clients in the background after startup, so the first
+# generation doesn't pay for them; the app is ready (and serving) either way
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+
+# Seconds per startup phase, reported by /ready
+startup_profile = {"imports": time.perf_counter() - _import_started}
+startup_state = {"ready": False, "warmup": "disabled"}
+
+
+def _warm_up():
+    started = time.perf_counter()
+    try:
+        from Model.langchain import warm_up
+        warm_up()
+        startup_state["warmup"] = "done"
+    except Exception as e:
+        startup_state["warmup"] = "failed"
+        print(f" Warm-up failed: {e}")
+    startup_profile["warmup"] = time.perf_counter() - started
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    if MANIM_WARM_POOL:
+        render_pool.start()
+    startup_profile["render_pool"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    worker_pool.start()
+    startup_profile["job_workers"] = time.perf_counter() - started
+
+    if STARTUP_WARMUP:
+        startup_state["warmup"] = "running"
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+    startup_state["ready"] = True
+    print(f" Startup: {', '.join(f'{phase} {seconds:.3f}s' for phase, seconds in startup_profile.items())}")
+    try:
+        yield
+    finally:
+        startup_state["ready"] = False
+        worker_pool.stop()
+        render_pool.stop()
+        postprocessor.stop()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS Middleware
 app.add_middleware(
@@ -13,5 +74,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    with trace(f"{request.method} {request.url.path}") as current:
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            # Route templates, not raw paths, keep label cardinality bounded
+            route = request.scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                         route=route.path if route is not None else "unmatched",
+                                         status=status_code)
+    response.headers["X-Trace-Id"] = current.trace_id
+    return response
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ready", include_in_schema=False)
+async def ready():
+    """Readiness (not liveness): 503 until startup finished and while the database is unreachable"""
+    checks = {"startup": "ok" if startup_state["ready"] else "starting"}
+    try:
+        await run_in_threadpool(check_database)
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+    is_ready = all(value == "ok" for value in checks.values())
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "ready": is_ready,
+            "checks": checks,
+            "warmup": startup_state["warmup"],
+            "startup_seconds": startup_profile,
+        },
+    )
+
+
 # Include authentication router
-app.include_router(auth_router, prefix="/auth")
\ No newline at end of file
+app.include_router(auth_router, prefix="/auth")
+
+# The local storage backend serves its files itself (LOCAL_STORAGE_URL should point here)
+if isinstance(storage, LocalStorage):
+    os.makedirs(storage.root, exist_ok=True)
+    app.mount("/storage", StaticFiles(directory=storage.root), name="storage")
+
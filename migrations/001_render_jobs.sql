@@ -0,0 +1,19 @@
+-- Persistent queue for /auth/jobs render jobs
+CREATE TABLE IF NOT EXISTS render_jobs (
+    id SERIAL PRIMARY KEY,
+    topic VARCHAR NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'queued',
+    stage VARCHAR,
+    error VARCHAR,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    user_id INTEGER REFERENCES users(id),
+    video_id INTEGER REFERENCES videos(id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_render_jobs_id ON render_jobs (id);
+CREATE INDEX IF NOT EXISTS ix_render_jobs_status ON render_jobs (status);
+CREATE INDEX IF NOT EXISTS ix_render_jobs_created_at ON render_jobs (created_at);
+CREATE INDEX IF NOT EXISTS ix_render_jobs_user_id ON render_jobs (user_id);
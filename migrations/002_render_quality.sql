@@ -0,0 +1,4 @@
+-- Render quality profiles and two-phase (draft, then final quality) rendering
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS quality VARCHAR;
+ALTER TABLE render_jobs ADD COLUMN IF NOT EXISTS quality VARCHAR;
+ALTER TABLE render_jobs ADD COLUMN IF NOT EXISTS two_phase BOOLEAN NOT NULL DEFAULT FALSE;
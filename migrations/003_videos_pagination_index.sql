@@ -0,0 +1,2 @@
+-- Keyset pagination of /auth/myvideos on (created_at, id) per user
+CREATE INDEX IF NOT EXISTS ix_videos_user_created_id ON videos (user_id, created_at, id);
@@ -0,0 +1,13 @@
+-- Learned Manim error fixes replayed by Model/fixer.py
+CREATE TABLE IF NOT EXISTS error_fixes (
+    id SERIAL PRIMARY KEY,
+    signature VARCHAR NOT NULL,
+    replacements VARCHAR NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP,
+    last_used_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_error_fixes_id ON error_fixes (id);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_error_fixes_signature ON error_fixes (signature);
@@ -0,0 +1,3 @@
+-- Per-job speculative code generation settings
+ALTER TABLE render_jobs ADD COLUMN IF NOT EXISTS candidates INTEGER;
+ALTER TABLE render_jobs ADD COLUMN IF NOT EXISTS max_parallel_renders INTEGER;
@@ -0,0 +1,4 @@
+-- Poster, sprite sheet and HLS playlist produced by the post-render stage
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS poster_path VARCHAR;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS sprite_path VARCHAR;
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS hls_path VARCHAR;
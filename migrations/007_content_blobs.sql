@@ -0,0 +1,12 @@
+-- Compressed, content-addressed scene plans and generated code (auth/blobstore.py). Then run
+-- `python migrations/007_convert_video_blobs.py` to move the text of existing videos over.
+CREATE TABLE IF NOT EXISTS content_blobs (
+    hash VARCHAR(64) PRIMARY KEY,
+    codec VARCHAR NOT NULL,
+    data BYTEA NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TIMESTAMP
+);
+
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS scene_plan_hash VARCHAR(64) REFERENCES content_blobs(hash);
+ALTER TABLE videos ADD COLUMN IF NOT EXISTS manim_code_hash VARCHAR(64) REFERENCES content_blobs(hash);
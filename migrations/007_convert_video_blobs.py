@@ -0,0 +1,82 @@
+"""
+Moves videos.scene_plan / videos.manim_code into content_blobs, after 007_content_blobs.sql.
+Resumable: only rows without a hash yet are converted, a batch per transaction.
+
+    python migrations/007_convert_video_blobs.py
+    python migrations/007_convert_video_blobs.py --drop-columns
+
+--drop-columns removes the old text columns once every row is converted (on PostgreSQL the
+space comes back after a VACUUM FULL videos).
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect, text
+from auth.blobstore import content_hash, store_blobs
+from database import get_engine
+
+TEXT_COLUMNS = ("scene_plan", "manim_code")
+
+PENDING = " OR ".join(f"({column} IS NOT NULL AND {column}_hash IS NULL)" for column in TEXT_COLUMNS)
+
+
+def convert(engine, batch_size: int) -> int:
+    converted = 0
+    last_id = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(text(
+                f"SELECT id, scene_plan, manim_code FROM videos WHERE id > :last_id AND ({PENDING}) "
+                "ORDER BY id LIMIT :limit"
+            ), {"last_id": last_id, "limit": batch_size}).all()
+            if not rows:
+                return converted
+            texts = {content_hash(value): value for row in rows for value in (row.scene_plan, row.manim_code)
+                     if value is not None}
+            store_blobs(connection, texts)
+            connection.execute(
+                text("UPDATE videos SET scene_plan_hash = :scene_plan_hash, manim_code_hash = :manim_code_hash "
+                     "WHERE id = :id"),
+                [{
+                    "id": row.id,
+                    "scene_plan_hash": content_hash(row.scene_plan) if row.scene_plan is not None else None,
+                    "manim_code_hash": content_hash(row.manim_code) if row.manim_code is not None else None,
+                } for row in rows]
+            )
+        converted += len(rows)
+        last_id = rows[-1].id
+        print(f" Converted {converted} videos ({len(texts)} distinct texts in the last batch)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--drop-columns", action="store_true", help="Drop the old text columns afterwards")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    columns = {column["name"] for column in inspect(engine).get_columns("videos")}
+    if not set(TEXT_COLUMNS) <= columns:
+        print(" videos has no scene_plan / manim_code columns, nothing to convert")
+        return
+
+    print(f" Converted {convert(engine, args.batch_size)} videos in total")
+    with engine.connect() as connection:
+        remaining = connection.execute(text(f"SELECT COUNT(*) FROM videos WHERE {PENDING}")).scalar()
+    if remaining:
+        # Rows written meanwhile by an app version that still fills the text columns
+        print(f" {remaining} videos are still unconverted, run again")
+        sys.exit(1)
+
+    if args.drop_columns:
+        with engine.begin() as connection:
+            for column in TEXT_COLUMNS:
+                connection.execute(text(f"ALTER TABLE videos DROP COLUMN {column}"))
+        print(" Dropped videos.scene_plan and videos.manim_code")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+-- Leases on running render jobs, so only jobs of dead processes are requeued
+ALTER TABLE render_jobs ADD COLUMN IF NOT EXISTS worker_id VARCHAR;
+ALTER TABLE render_jobs ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS ix_render_jobs_lease_expires_at ON render_jobs (lease_expires_at);
@@ -0,0 +1,74 @@
+import importlib.util
+import os
+import pytest
+from sqlalchemy import create_engine, func, select, text
+from sqlalchemy.orm import sessionmaker
+from database import Base
+from auth import blobstore
+from auth.blobstore import compress, content_hash, decompress
+from auth.dbmodel import ContentBlob, User, Video
+
+MIGRATION = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "migrations", "007_convert_video_blobs.py")
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'a', 'a@x', 'x')"))
+    yield engine
+    engine.dispose()
+
+
+def test_compression_round_trip_and_zlib_fallback(monkeypatch):
+    text_value = "self.play(Create(circle))\n" * 200
+    codec, data = compress(text_value)
+    assert len(data) < len(text_value)
+    assert decompress(codec, data) == text_value
+
+    monkeypatch.setattr(blobstore, "BLOB_CODEC", "zlib")
+    assert compress(text_value)[0] == "zlib"
+    with pytest.raises(ValueError):
+        decompress("lz4", data)
+
+
+def test_identical_texts_share_one_blob(engine):
+    session = sessionmaker(bind=engine)()
+    plan, code = "the plan", "the code"
+    session.add_all([Video(title=f"v{i}", user_id=1, scene_plan=plan, manim_code=code) for i in range(3)])
+    session.commit()
+    assert session.scalar(select(func.count()).select_from(ContentBlob)) == 2
+    session.close()
+
+    session = sessionmaker(bind=engine)()
+    video = session.scalars(select(Video)).first()
+    assert (video.scene_plan, video.manim_code) == (plan, code)
+    video.manim_code = None
+    session.commit()
+    assert session.get(Video, video.id).manim_code is None
+    session.close()
+
+
+def test_migration_moves_text_columns_into_blobs(engine):
+    spec = importlib.util.spec_from_file_location("convert_video_blobs", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+
+    with engine.begin() as connection:
+        # The columns the migration converts, as they were before content_blobs
+        connection.execute(text("ALTER TABLE videos ADD COLUMN scene_plan TEXT"))
+        connection.execute(text("ALTER TABLE videos ADD COLUMN manim_code TEXT"))
+        for i in range(5):
+            connection.execute(text("INSERT INTO videos (id, title, user_id, scene_plan, manim_code) "
+                                    "VALUES (:id, 't', 1, 'same plan', :code)"),
+                               {"id": i + 1, "code": None if i == 4 else f"code {i % 2}"})
+
+    assert migration.convert(engine, batch_size=2) == 5
+    # Resumable: converted rows aren't touched again
+    assert migration.convert(engine, batch_size=2) == 0
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT COUNT(*) FROM content_blobs")).scalar() == 3
+        row = connection.execute(text("SELECT scene_plan_hash, manim_code_hash FROM videos WHERE id = 5")).one()
+    assert row == (content_hash("same plan"), None)
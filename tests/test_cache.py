@@ -0,0 +1,42 @@
+from Model.cache import TopicCache, normalize_topic
+
+
+def make_cache(tmp_path, **kwargs):
+    return TopicCache("test-model", "v1", directory=str(tmp_path), **kwargs)
+
+
+def test_normalize_topic_drops_filler_and_plurals():
+    assert normalize_topic("Explain the Fourier transforms!") == ["fourier", "transform"]
+    assert normalize_topic("the Fourier transform") == normalize_topic("Fourier transforms")
+    # Words ending in "ss" aren't plurals
+    assert normalize_topic("class") == ["class"]
+
+
+def test_exact_and_similar_hits(tmp_path):
+    cache = make_cache(tmp_path, similarity_threshold=0.6)
+    cache.put_plan("Fourier transform of a square wave", "plan", "FourierScene")
+
+    assert cache.get_plan("the fourier transforms of a square wave").plan == "plan"
+    # Three of four tokens shared: Jaccard 0.75
+    assert cache.get_plan("fourier transform square pulse") is not None
+    assert cache.get_plan("binary search trees") is None
+
+    tiers = cache.stats()["tiers"]["plan"]
+    assert tiers == {"hits": 1, "similar_hits": 1, "misses": 1}
+
+
+def test_new_plan_invalidates_code_and_videos(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_video("pythagoras", "videos/1.mp4", "plan", "code", "Pythagoras", "low")
+    assert cache.get_video("pythagoras", "low") is not None
+
+    cache.put_plan("pythagoras", "other plan", "Pythagoras")
+    assert cache.get_code("pythagoras") is None
+    assert cache.get_video("pythagoras", "low") is None
+
+
+def test_entries_survive_a_new_instance(tmp_path):
+    make_cache(tmp_path).put_plan("binary search", "plan", "BinarySearch")
+    assert make_cache(tmp_path).get_plan("binary search").scene_class_name == "BinarySearch"
+    # Another model or prompt version doesn't see it
+    assert TopicCache("other-model", "v1", directory=str(tmp_path)).get_plan("binary search") is None
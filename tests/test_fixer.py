@@ -0,0 +1,68 @@
+import pytest
+from Model.fixer import FixLibrary, _diff_replacements, apply_replacements, error_signatures
+
+SCENE = "DemoScene"
+CODE = """from manim import *
+
+class DemoScene(Scene):
+    def construct(self):
+        circle = Circle(color=BLUE, size=2)
+        title = Text("Hello", size=30)
+        self.play(ShowCreation(circle))
+        self.wait(1)
+"""
+
+
+def traceback_for(line: int, exception: str) -> str:
+    return (
+        "Traceback (most recent call last):\n"
+        f'  File "/tmp/job/{SCENE}.py", line {line}, in construct\n'
+        f"{exception}\n"
+    )
+
+
+@pytest.fixture
+def library():
+    library = FixLibrary()
+    library._learned = {}  # No learned fixes, and no database
+    return library
+
+
+def test_signatures_ignore_numbers_and_paths():
+    first = traceback_for(5, "ValueError: bad value 3.5 in /tmp/a/DemoScene.py")
+    second = traceback_for(9, "ValueError: bad value 12 in /tmp/b/DemoScene.py")
+    assert error_signatures(first) == error_signatures(second) == ["ValueError: bad value <n> in <file>"]
+
+
+def test_size_is_renamed_only_on_text_classes(library):
+    error = traceback_for(5, "TypeError: Mobject.__init__() got an unexpected keyword argument 'size'")
+    fixed = library.apply(CODE, error, SCENE).code
+    assert "Circle(color=BLUE)" in fixed
+    assert 'Text("Hello", size=30)' in fixed  # Not on the failing line
+
+    error = traceback_for(6, "TypeError: Text.__init__() got an unexpected keyword argument 'size'")
+    fixed = library.apply(CODE, error, SCENE).code
+    assert 'Text("Hello", font_size=30)' in fixed
+    assert "Circle(color=BLUE, size=2)" in fixed
+
+
+def test_renamed_names_and_methods(library):
+    fixed = library.apply(CODE, traceback_for(7, "NameError: name 'ShowCreation' is not defined"), SCENE)
+    assert "self.play(Create(circle))" in fixed.code
+    assert fixed.sources == ["rule:renamed_name"]
+
+    code = CODE.replace("self.wait(1)", "graph = axes.get_graph(lambda x: x)")
+    error = traceback_for(8, "AttributeError: 'Axes' object has no attribute 'get_graph'")
+    assert "axes.plot(lambda x: x)" in library.apply(code, error, SCENE).code
+
+
+def test_unrecognised_errors_are_left_to_the_model(library):
+    assert library.apply(CODE, traceback_for(5, "ZeroDivisionError: division by zero"), SCENE) is None
+
+
+def test_learned_replacements_replay_only_where_every_line_matches():
+    after = CODE.replace("self.wait(1)", "self.wait(2)")
+    replacements = _diff_replacements(CODE, after)
+    assert replacements == [["self.wait(1)", "self.wait(2)"]]
+    assert apply_replacements(CODE, replacements) == after
+    assert apply_replacements(CODE.replace("self.wait(1)", "self.wait(3)"), replacements) is None
@@ -0,0 +1,24 @@
+import signal
+from Model.limits import RENDER_TIMEOUT_SECONDS, classify_render_failure, limit_message, render_timeout
+from Model.profiles import RENDER_PROFILES, get_render_profile
+
+
+def test_time_limits_scale_with_the_profile_pixel_rate():
+    assert RENDER_PROFILES["draft"].limit_scale == 1
+    assert RENDER_PROFILES["medium"].limit_scale == 1
+    assert RENDER_PROFILES["high"].limit_scale == 4.5  # 1080p60 vs 720p30
+    assert RENDER_PROFILES["4k"].limit_scale == 18
+    assert render_timeout(RENDER_PROFILES["4k"].limit_scale) == 18 * RENDER_TIMEOUT_SECONDS
+
+
+def test_limit_message_quotes_the_scaled_limit():
+    message = limit_message("timeout", get_render_profile("high").limit_scale)
+    assert f"wall-clock limit of {RENDER_TIMEOUT_SECONDS * 4.5:.0f}s" in message
+
+
+def test_failures_are_classified_by_the_limit_hit():
+    assert classify_render_failure(0, "") is None
+    assert classify_render_failure(-9, "", timed_out=True) == "timeout"
+    assert classify_render_failure(-signal.SIGXCPU, "") == "cpu_limit"
+    assert classify_render_failure(1, "numpy.core._exceptions.MemoryError: Unable to allocate") == "memory_limit"
+    assert classify_render_failure(1, "NameError: name 'Foo' is not defined") == "render_error"
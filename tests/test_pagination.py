@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+
+# auth.generation needs the async SQLAlchemy stack
+pytest.importorskip("greenlet")
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from database import Base  # noqa: E402
+from auth.dbmodel import User, Video  # noqa: E402
+from auth.generation import decode_video_cursor, encode_video_cursor, list_user_videos  # noqa: E402
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    assert decode_video_cursor(encode_video_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(ValueError):
+        decode_video_cursor("not-a-cursor")
+
+
+async def _pages(limit: int):
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    started = datetime(2024, 1, 1)
+    async with sessions() as db:
+        db.add_all([User(id=1, username="a", email="a@example.com", hashed_password="x"),
+                    User(id=2, username="b", email="b@example.com", hashed_password="x")])
+        # Pairs of videos share a timestamp, so pages must break ties on id
+        db.add_all([Video(id=i, title=f"video {i}", user_id=1, video_path=f"1/{i}.mp4",
+                          created_at=started + timedelta(minutes=i // 2)) for i in range(1, 8)])
+        db.add(Video(id=100, title="other user", user_id=2, video_path="2/100.mp4", created_at=started))
+        await db.commit()
+
+        pages, cursor = [], None
+        while True:
+            items, cursor = await list_user_videos(db, 1, limit=limit, cursor=cursor)
+            pages.append([item["id"] for item in items])
+            if cursor is None:
+                break
+    await engine.dispose()
+    return pages
+
+
+def test_keyset_pages_are_newest_first_without_gaps_or_repeats():
+    pages = asyncio.run(_pages(limit=3))
+    assert pages == [[7, 6, 5], [4, 3, 2], [1]]
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import pytest
+
+# auth.ratelimit depends on the auth dependencies, which need the async SQLAlchemy stack
+pytest.importorskip("greenlet")
+
+from auth import ratelimit  # noqa: E402
+from auth.ratelimit import GenerationGovernor, Overloaded, TokenBucketLimiter  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    limiter = TokenBucketLimiter("test", per_minute=6, burst=2)
+    assert limiter.acquire("user") == 0
+    assert limiter.acquire("user") == 0
+    # One token every 10 s
+    assert limiter.acquire("user") == pytest.approx(10)
+    clock[0] += 5
+    assert limiter.acquire("user") == pytest.approx(5)
+    clock[0] += 5
+    assert limiter.acquire("user") == 0
+    # Buckets are per key
+    assert limiter.acquire("other") == 0
+    assert limiter.stats()["rejected"] == 2
+
+
+def test_least_recently_used_keys_are_dropped(clock):
+    limiter = TokenBucketLimiter("test", per_minute=1, burst=1, max_keys=2)
+    for key in ("a", "b", "c"):
+        limiter.acquire(key)
+    assert limiter.stats()["keys"] == 2
+    # "a" was dropped, so it starts over with a full bucket
+    assert limiter.acquire("a") == 0
+
+
+def test_governor_sheds_past_its_queue():
+    async def scenario():
+        governor = GenerationGovernor(max_concurrent=1, max_queue=1, queue_timeout=5)
+        release = asyncio.Event()
+
+        async def generation():
+            async with governor.slot():
+                await release.wait()
+
+        running = asyncio.create_task(generation())
+        queued = asyncio.create_task(generation())
+        while governor.in_flight == 0:
+            await asyncio.sleep(0)
+        assert governor.queued == 1
+        with pytest.raises(Overloaded) as shed:
+            async with governor.slot():
+                pass
+        assert shed.value.reason == "queue_full" and shed.value.retry_after > 0
+        release.set()
+        await asyncio.gather(running, queued)
+        assert (governor.in_flight, governor.admitted, governor.shed) == (0, 2, 1)
+
+    asyncio.run(scenario())
+
+
+def test_governor_sheds_after_queue_timeout():
+    async def scenario():
+        governor = GenerationGovernor(max_concurrent=1, max_queue=1, queue_timeout=0.05)
+        async with governor.slot():
+            with pytest.raises(Overloaded) as shed:
+                async with governor.slot():
+                    pass
+        assert shed.value.reason == "queue_timeout"
+        assert governor.queued == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelling_queued_generations_finishes():
+    # What asyncio.run() and server shutdown do: cancel every task while generations are queued.
+    # asyncio.wait_for() could keep a cancelled waiter's slot here, and the loop never finished
+    async def scenario():
+        governor = GenerationGovernor(max_concurrent=1, max_queue=2, queue_timeout=5)
+
+        async def generation():
+            async with governor.slot():
+                await asyncio.Event().wait()
+
+        for _ in range(2):
+            asyncio.create_task(generation())
+        await asyncio.sleep(0)
+        raise RuntimeError("shutting down")
+
+    def run():
+        with pytest.raises(RuntimeError):
+            asyncio.run(scenario())
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
@@ -0,0 +1,84 @@
+import ast
+import pytest
+from Model.sections import SECTION_SEED, SectionCache, build_section_program, replayable, section_cache_key, \
+    split_scene_sections
+
+CODE = """from manim import *
+
+class Demo(Scene):
+    def construct(self):
+        title = Text("Demo")
+        # Scene 1: Introduction
+        self.play(Write(title))
+        # Scene 2: Circle
+        circle = Circle(
+            radius=2,
+        )
+        self.play(Create(circle))
+        # Scene 3: Outro
+        self.play(FadeOut(circle, title))
+"""
+
+
+def test_split_at_scene_markers():
+    split = split_scene_sections(CODE, "Demo")
+    assert len(split.sections) == 3
+    assert split.prefix_first_statement
+    assert split.sections[1][0].strip() == "# Scene 2: Circle"
+    # Fewer than two markers, or another class name: rendered whole
+    assert split_scene_sections(CODE.replace("# Scene 3: Outro", ""), "Demo") is not None
+    assert split_scene_sections(CODE.replace("# Scene 2: Circle", "").replace("# Scene 3: Outro", ""),
+                                "Demo") is None
+    assert split_scene_sections(CODE, "Other") is None
+
+
+def test_section_program_keeps_line_numbers_and_seeds_once():
+    split = split_scene_sections(CODE, "Demo")
+    program = build_section_program(split, 1)
+    compile(program, "section.py", "exec")
+    original, built = CODE.splitlines(), program.splitlines()
+    assert built[7].endswith(original[7].strip())  # "# Scene 2" line, now with next_section()
+    assert built[11] == original[11]
+    assert program.count(SECTION_SEED) == 1
+    assert 'self.next_section("section_1", skip_animations=True)' in program
+    assert 'self.next_section("section_2", skip_animations=False)' in program
+    assert "Scene 3" not in program
+
+
+@pytest.mark.parametrize("call", [
+    "time.time()", "datetime.now()", "datetime.datetime.now()", "datetime.date.today()", "now()",
+    "uuid.uuid4()", "random.SystemRandom()", "os.urandom(4)", "np.random.default_rng()",
+])
+def test_clock_and_os_randomness_are_not_replayable(call):
+    assert not replayable(ast.parse(f"x = {call}"))
+
+
+@pytest.mark.parametrize("call", ["random.uniform(0, 1)", "np.random.rand(3)", "np.random.default_rng(7)"])
+def test_seeded_randomness_is_replayable(call):
+    assert replayable(ast.parse(f"x = {call}"))
+
+
+def test_cache_keys_depend_on_earlier_sections_only():
+    split = split_scene_sections(CODE, "Demo")
+    changed = split_scene_sections(CODE.replace("FadeOut(circle, title)", "FadeOut(circle)"), "Demo")
+    assert section_cache_key(split, 1, "low") == section_cache_key(changed, 1, "low")
+    assert section_cache_key(split, 2, "low") != section_cache_key(changed, 2, "low")
+    assert section_cache_key(split, 1, "low") != section_cache_key(split, 1, "high")
+
+
+def test_pinned_sections_survive_eviction(tmp_path):
+    cache = SectionCache(str(tmp_path / "cache"), max_entries=1)
+    source = tmp_path / "render.mp4"
+    source.write_bytes(b"movie")
+    pin_dir = tmp_path / "join"
+    pin_dir.mkdir()
+
+    pinned = cache.put("first", str(source), pin_dir=str(pin_dir))
+    cache.put("second", str(source))
+    assert cache.get("first") is None  # Evicted
+    assert open(pinned, "rb").read() == b"movie"
+
+    assert cache.put("empty", None) == ""
+    assert cache.get("empty") == ""
+    # Empty sections have no movie to pin
+    assert cache.get("empty", pin_dir=str(pin_dir)) == ""
@@ -0,0 +1,78 @@
+import pytest
+from auth import storage as storage_module
+from auth.storage import STORAGE_UPLOAD_RETRIES, HotVideoCache, LocalStorage, StorageBackend, StorageError
+
+
+class FlakyStorage(StorageBackend):
+    """Remote-like backend (no local copy) whose first `failures` puts fail"""
+
+    name = "flaky"
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+        self.attempts = []
+        self.stored = {}
+
+    def _put(self, key, path, content_type, resume):
+        self.attempts.append(dict(resume))
+        resume["offset"] = resume.get("offset", 0) + 1
+        if len(self.attempts) <= self.failures:
+            raise OSError("connection reset")
+        with open(path, "rb") as f:
+            self.stored[key] = f.read()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(storage_module.time, "sleep", lambda seconds: None)
+
+
+@pytest.fixture
+def hot_videos(tmp_path, monkeypatch):
+    cache = HotVideoCache(str(tmp_path / "hot"), 1024 * 1024)
+    monkeypatch.setattr(storage_module, "hot_videos", cache)
+    return cache
+
+
+@pytest.fixture
+def render(tmp_path):
+    path = tmp_path / "render.mp4"
+    path.write_bytes(b"video bytes")
+    return path
+
+
+def test_local_upload_copies_and_removes_the_render(tmp_path, render, hot_videos):
+    backend = LocalStorage(str(tmp_path / "store"), "http://localhost/storage")
+    backend.upload("1/render.mp4", str(render), delete_local=True, cache_hot=True)
+    assert open(backend.local_path("1/render.mp4"), "rb").read() == b"video bytes"
+    # Already on local disk, so it isn't copied into the hot cache
+    assert not render.exists() and hot_videos.get("1/render.mp4") is None
+    with pytest.raises(StorageError):
+        backend.path_for("../outside.mp4")
+
+
+def test_retries_share_resume_state_within_one_budget(render, hot_videos):
+    backend = FlakyStorage(failures=STORAGE_UPLOAD_RETRIES)
+    backend.upload("1/render.mp4", str(render), delete_local=False)
+    assert backend.stored["1/render.mp4"] == b"video bytes"
+    assert [attempt.get("offset", 0) for attempt in backend.attempts] == list(range(STORAGE_UPLOAD_RETRIES + 1))
+
+    backend = FlakyStorage(failures=STORAGE_UPLOAD_RETRIES + 1)
+    with pytest.raises(StorageError):
+        backend.upload("1/render.mp4", str(render), delete_local=False)
+    assert len(backend.attempts) == STORAGE_UPLOAD_RETRIES + 1
+    assert backend.stats.snapshot()["failures"] == 1
+
+
+def test_only_the_video_moves_into_the_hot_cache(tmp_path, hot_videos):
+    backend = FlakyStorage(failures=0)
+    video, poster = tmp_path / "v.mp4", tmp_path / "v.poster.jpg"
+    video.write_bytes(b"video")
+    poster.write_bytes(b"poster")
+
+    backend.upload("1/v.mp4", str(video), delete_local=True, cache_hot=True)
+    backend.upload("1/v.poster.jpg", str(poster), "image/jpeg", delete_local=True)
+    assert open(hot_videos.get("1/v.mp4"), "rb").read() == b"video"
+    assert hot_videos.get("1/v.poster.jpg") is None
+    assert not video.exists() and not poster.exists()